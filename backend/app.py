@@ -2,14 +2,31 @@
 
 from sanic import Sanic, response
 from sanic.request import Request
-from paddleocr import PaddleOCR
 import numpy as np
 import cv2
 import logging
 import asyncio
+import json
 import re
+import time
 from datetime import datetime, timedelta
+import threading
 from concurrent.futures import ThreadPoolExecutor
+from batch_ocr_module import BatchedOCR
+from ocr_engine_module import engine_registry, lazy_ocr_engine, warm_up_ocr_engines, get_engine_params
+from ocr_worker_pool import OCRWorkerPool
+from result_cache_module import ResultCache, compute_fingerprint
+from image_context_module import ImageContext, as_context, probe_image_size
+from document_router_module import route_document
+from job_queue_module import JobManager, JobQueueFullError, validate_callback_url
+from upload_spool_module import UploadSpool, UploadError, PixelBudget, UploadLease, open_upload, bind_to_upload
+import resolution_module
+from resolution_module import plan_resolution, ocr_with_plan
+from keyword_matcher_module import KeywordMatcher, keyword_matcher
+from metrics_module import (
+    time_stage, timed, render_metrics,
+    DOCUMENT_SECONDS, EXTRACT_SECONDS, SECONDARY_FALLBACKS, CACHE_LOOKUPS,
+)
 
 # 初始化日志
 logger = logging.getLogger("enhanced_ocr")
@@ -20,42 +37,47 @@ handler.setFormatter(formatter)
 if not logger.handlers:
     logger.addHandler(handler)
 
-# 初始化多个OCR引擎
+# 批处理配置：把并发请求的图片聚合成小批次统一识别
+ENABLE_OCR_BATCHING = True
+OCR_BATCH_MAX_SIZE = 8        # 单批最多图片数
+OCR_BATCH_MAX_WAIT_MS = 10    # 凑批最长等待时间（毫秒）
+
+# 多进程工作池配置：大于0时OCR推理放到独立工作进程中执行，
+# 每个进程独占一套引擎和一组CPU核；为0时在本进程内直接推理
+OCR_WORKER_PROCESSES = 0
+
+# 识别结果缓存配置：相同图片重复提交时直接返回上次的OCR和猪耳标结果
+ENABLE_RESULT_CACHE = True
+RESULT_CACHE_MEMORY_MB = 64   # 内存层上限（MB），超出后淘汰最久未使用的结果
+RESULT_CACHE_DIR = None       # 磁盘层目录（如 "cache/results"），为None时只用内存层
+RESULT_CACHE_VERSION = 1      # 识别流程逻辑变化时递增，使旧缓存失效
+
+# 引擎预热：服务启动后在后台加载这些引擎并在合成图像上推理一次，完成前 /ready 返回503
+WARMUP_ENGINES = ["primary", "secondary", "eartag"]
+
+# 初始化多个OCR引擎（模型在首次使用或预热时才加载）
 logger.info("🔧 开始初始化OCR引擎...")
 try:
-    logger.info("🔧 初始化主OCR引擎...")
-    primary_ocr = PaddleOCR(
-        use_angle_cls=False,
-        lang="ch",
-        use_gpu=False,
-        rec_batch_num=10,
-        cpu_threads=6,
-        use_mkldnn=True,
-        det_limit_side_len=1280,
-        drop_score=0.1,
-        show_log=False
-    )
-    logger.info("✅ 主OCR引擎初始化成功")
-    
-    logger.info("🔧 初始化次OCR引擎...")
-    secondary_ocr = PaddleOCR(
-        use_angle_cls=False,
-        lang="ch",
-        use_gpu=False,
-        rec_batch_num=10,
-        cpu_threads=6,
-        use_mkldnn=True,
-        det_limit_side_len=960,
-        drop_score=0.05,
-        show_log=False
-    )
-    logger.info("✅ 次OCR引擎初始化成功")
-    
-    ocr_engines = {
-        "primary": primary_ocr,
-        "secondary": secondary_ocr
-    }
-    logger.info("✅ 所有OCR引擎初始化完成")
+    if OCR_WORKER_PROCESSES > 0:
+        logger.info(f"🔧 使用OCR工作池: {OCR_WORKER_PROCESSES} 个进程")
+        worker_pool = OCRWorkerPool(OCR_WORKER_PROCESSES, warmup_engines=WARMUP_ENGINES)
+        ocr_engines = {
+            "primary": worker_pool.engine("primary"),
+            "secondary": worker_pool.engine("secondary")
+        }
+    else:
+        worker_pool = None
+
+        ocr_engines = {
+            "primary": lazy_ocr_engine("primary"),
+            "secondary": lazy_ocr_engine("secondary")
+        }
+        if ENABLE_OCR_BATCHING:
+            ocr_engines = {
+                name: BatchedOCR(engine, max_batch_size=OCR_BATCH_MAX_SIZE, max_wait_ms=OCR_BATCH_MAX_WAIT_MS, name=name)
+                for name, engine in ocr_engines.items()
+            }
+    logger.info("✅ 所有OCR引擎已注册（按需加载）")
     
 except Exception as e:
     logger.error(f"❌ OCR引擎初始化失败: {e}")
@@ -83,8 +105,83 @@ except ImportError:
         except Exception:
             pass
 
+# 并发配置
+OCR_EXECUTOR_WORKERS = max(4, OCR_WORKER_PROCESSES)  # OCR线程池大小（使用工作池时不少于进程数）
+PARSE_DOCS_CONCURRENCY = 4    # 单个请求内同时处理的文件数上限
+
+# 推测执行：线程池有空闲时主次引擎同时启动，主引擎结果足够时忽略次引擎；
+# 线程池繁忙时退回先主后次的顺序执行
+ENABLE_SPECULATIVE_OCR = True
+SPECULATIVE_OCR_MIN_IDLE = 2  # 线程池至少有这么多空闲线程时才并行启动两个引擎
+MIN_PRIMARY_TEXT_BLOCKS = 3   # 主引擎识别到的文本块少于该数时需要次引擎补充
+
+# 文档类型预判：通用OCR之前用图像特征识别猪耳标照片，直接进入猪耳标识别（默认关闭）
+# 预判阈值只在猪耳标样例上调过，误判的证件/截图要多跑一遍耳标识别再回退通用OCR，比不预判更慢；
+# 在 测试/ 的身份证、银行卡、截图样例上运行 benchmark_ocr.py --router-only 并记录误判率后再开启
+ENABLE_DOC_ROUTER = False
+
+# 异步识别任务配置：大批量上传走 /jobs，排队处理，队列满时返回503
+JOB_STORAGE_DIR = "jobs"          # 上传文件和任务状态的落盘目录
+JOB_MAX_QUEUED = 20               # 最多排队的任务数
+JOB_WORKERS = 1                   # 同时处理的任务数（每个任务内部仍按 PARSE_DOCS_CONCURRENCY 并发）
+JOB_RETENTION_SECONDS = 24 * 3600 # 已结束任务的保留时间
+
+# 上传与内存预算：上传文件边接收边落盘，识别时以内存映射方式解码；
+# 按文件头中的宽高估算像素数，在途像素超过预算时后续文件排队等待（单张超限的大图独占预算）
+UPLOAD_SPOOL_DIR = None                      # 上传落盘目录，为None时使用系统临时目录
+MAX_UPLOAD_FILES = 50                        # 单个请求最多上传的文件数
+MAX_UPLOAD_FILE_MB = 30                      # 单个文件大小上限（MB）
+GLOBAL_PIXEL_BUDGET = 96 * 1000 * 1000       # 所有请求同时识别的像素上限（约8张1200万像素照片）
+REQUEST_PIXEL_BUDGET = 48 * 1000 * 1000      # 单个请求同时识别的像素上限
+UNKNOWN_IMAGE_PIXELS = 12 * 1000 * 1000      # 无法从文件头读取尺寸时按该像素数估算
+
 # 线程池
-executor = ThreadPoolExecutor(max_workers=4)
+executor = ThreadPoolExecutor(max_workers=OCR_EXECUTOR_WORKERS)
+
+
+class OCRLoadTracker:
+    """统计OCR线程池中已提交但未结束的调用数，用于判断是否有空闲线程"""
+
+    def __init__(self, executor, capacity):
+        self.executor = executor
+        self.capacity = capacity
+        self.inflight = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        """提交到线程池，返回可 await 的 asyncio Future"""
+        with self._lock:
+            self.inflight += 1
+        # 登记到当前文件的上传内容：文件被取消时等该调用结束后才释放内存映射
+        future = self.executor.submit(bind_to_upload(fn), *args)
+        # 在线程池的 Future 上计数，被忽略的调用实际结束后才释放
+        future.add_done_callback(self._release)
+        return asyncio.wrap_future(future)
+
+    def _release(self, _future):
+        with self._lock:
+            self.inflight -= 1
+
+    def idle_workers(self):
+        with self._lock:
+            return self.capacity - self.inflight
+
+
+ocr_load = OCRLoadTracker(executor, OCR_EXECUTOR_WORKERS)
+
+# 主次引擎共享同一套模型（ocr_engine_module.OCR_SHARE_MODELS，默认开启）时检测和识别各自串行，推测执行没有收益
+SPECULATIVE_OCR_USEFUL = ENABLE_SPECULATIVE_OCR and (
+    worker_pool is not None or not engine_registry.shares_model("primary", "secondary")
+)
+
+# 全局在途像素预算
+pixel_budget = PixelBudget(GLOBAL_PIXEL_BUDGET)
+
+# 识别结果缓存
+result_cache = ResultCache(
+    max_memory_bytes=RESULT_CACHE_MEMORY_MB * 1024 * 1024,
+    disk_dir=RESULT_CACHE_DIR,
+) if ENABLE_RESULT_CACHE else None
 
 # 智能身份证检测函数
 def detect_id_card_number(text):
@@ -160,25 +257,44 @@ def find_luhn_cards_with_positions(texts_with_boxes):
     return candidates
 
 
-def compute_keyword_proximity_score(texts_with_boxes, target_words):
-    """根据文本块与关键词的邻近度给分，命中越近分越高"""
-    keyword_positions = []
-    for item in texts_with_boxes:
-        t = item["text"].lower()
-        if any(w.lower() in t for w in target_words):
-            keyword_positions.append((item.get("center_x", 0.0), item.get("center_y", 0.0)))
-    if not keyword_positions:
+# 文档分类关键词（忽略大小写）
+ID_CLASSIFY_KEYWORDS = ["身份证", "公民身份号码", "姓名", "民族", "住址"]
+BANK_CLASSIFY_KEYWORDS = ["银行", "银行卡", "借记卡", "信用卡", "卡号", "农信", "信用社", "发卡行", "银行名称", "银联", "UNIONPAY", "VALID THRU", "CREDIT", "DEBIT"]
+SS_CLASSIFY_KEYWORDS = ["保单号", "报案号", "系统"]
+EARTAG_CLASSIFY_KEYWORDS = ["耳标", "猪耳标", "拍摄人", "查勘地点", "拍摄地点", "经纬度"]
+EARTAG_SCENE_KEYWORDS = ["拍摄人", "查勘地点", "拍摄地点"]   # 与耳标数字同时出现时额外加分
+
+# 全部分类关键词预编译为一个 Aho–Corasick 自动机，每个文件只匹配一遍
+CLASSIFY_MATCHER = KeywordMatcher(
+    ID_CLASSIFY_KEYWORDS + BANK_CLASSIFY_KEYWORDS + SS_CLASSIFY_KEYWORDS + EARTAG_CLASSIFY_KEYWORDS
+)
+
+
+def compute_keyword_proximity_score(texts_with_boxes, target_words, hits=None):
+    """根据文本块与关键词的邻近度给分，命中越近分越高
+
+    hits: 调用方已得到的关键词命中（keyword_matcher_module.KeywordHits），需包含 target_words
+    """
+    if hits is None:
+        hits = keyword_matcher(tuple(target_words)).scan(texts_with_boxes)
+    if not hits.blocks(*target_words):
         return 0.0
     # 简单评分：有关键词就+1
     return 1.0
 
+def brighten_image(img):
+    """轻微对比度增强"""
+    return cv2.convertScaleAbs(img, alpha=1.2, beta=10)
+
 # 图像预处理函数
-def preprocess_image(image_bytes):
-    """图像预处理 - 身份证优化版，最小化预处理"""
+def preprocess_image(image):
+    """图像预处理 - 身份证优化版，最小化预处理
+
+    image: 图片字节、已解码的BGR数组或 ImageContext（不会被原地修改）
+    """
     try:
-        # 转换为numpy数组
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        context = as_context(image)
+        img = context.bgr
         
         if img is None:
             return None
@@ -188,11 +304,10 @@ def preprocess_image(image_bytes):
         
         # 1. 轻微对比度增强（仅当图像过暗时）
         # 计算图像平均亮度
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        mean_brightness = np.mean(gray)
+        mean_brightness = np.mean(context.gray)
         
         if mean_brightness < 100:  # 图像较暗时才增强
-            img = cv2.convertScaleAbs(img, alpha=1.2, beta=10)
+            img = brighten_image(img)
         
         # 2. 轻微去噪（仅当图像噪点较多时）
         # 这里暂时跳过去噪，因为可能影响文字识别
@@ -204,19 +319,44 @@ def preprocess_image(image_bytes):
         logger.error(f"图像预处理错误: {e}")
         return None
 
+def timed_ocr_with_plan(engine_name, plan, img, adjust):
+    """按分辨率规划用指定引擎识别，耗时记入 ocr_stage_seconds{stage="ocr_<引擎名>"}"""
+    with time_stage(f"ocr_{engine_name}"):
+        return ocr_with_plan(ocr_engines[engine_name], plan, img, True, adjust)
+
 # 增强OCR函数
-async def enhanced_ocr_image(image_bytes):
-    """增强OCR识别"""
+async def enhanced_ocr_image(image):
+    """增强OCR识别（image 可以是图片字节、已解码的BGR数组或 ImageContext）
+
+    预处理和检测在缩小后的工作图像上进行，文本框映射回原图坐标，
+    低置信度的文本区域再从原图裁剪重新识别
+    """
     try:
-        # 预处理图像
-        processed_img = preprocess_image(image_bytes)
+        context = as_context(image)
+        with time_stage("preprocess"):
+            plan = plan_resolution(context, "general")
+            if plan.image is None:
+                return []
+
+            # 预处理图像
+            processed_img = preprocess_image(plan.context)
         if processed_img is None:
             return []
+        # 工作图像做过亮度增强时，从原图裁剪的区域也做同样的增强
+        adjust = brighten_image if processed_img is not plan.image else None
         
+        # 线程池有空闲时次引擎与主引擎同时启动（推测执行），否则等主引擎结果不足时再启动
+        secondary_future = None
+        if SPECULATIVE_OCR_USEFUL and ocr_load.idle_workers() >= SPECULATIVE_OCR_MIN_IDLE:
+            secondary_future = ocr_load.submit(timed_ocr_with_plan, "secondary", plan, processed_img, adjust)
+
         # 使用主引擎识别
-        primary_results = await asyncio.get_event_loop().run_in_executor(
-            executor, ocr_engines["primary"].ocr, processed_img
-        )
+        try:
+            primary_results = await ocr_load.submit(timed_ocr_with_plan, "primary", plan, processed_img, adjust)
+        except BaseException:
+            if secondary_future is not None:
+                secondary_future.cancel()
+            raise
         
         # 处理主引擎结果
         texts_with_boxes = []
@@ -240,10 +380,18 @@ async def enhanced_ocr_image(image_bytes):
                     })
         
         # 如果主引擎结果不够好，使用次引擎
-        if len(texts_with_boxes) < 3:
-            secondary_results = await asyncio.get_event_loop().run_in_executor(
-                executor, ocr_engines["secondary"].ocr, processed_img
-            )
+        if len(texts_with_boxes) >= MIN_PRIMARY_TEXT_BLOCKS:
+            if secondary_future is not None:
+                # 主引擎结果足够：未开始的次引擎调用直接取消，已开始的忽略其结果
+                secondary_future.cancel()
+        else:
+            if secondary_future is None:
+                secondary_future = ocr_load.submit(timed_ocr_with_plan, "secondary", plan, processed_img, adjust)
+                SECONDARY_FALLBACKS.inc(mode="sequential")
+            else:
+                logger.info("⚡ 次引擎已推测执行，直接取用结果")
+                SECONDARY_FALLBACKS.inc(mode="speculative")
+            secondary_results = await secondary_future
             
             if secondary_results and secondary_results[0]:
                 for line in secondary_results[0]:
@@ -284,6 +432,113 @@ from eartag_ocr_module import recognize_pig_ear_tag
 from idcard_ocr_module import recognize_id_card
 from bankcard_ocr_module import recognize_bank_card
 from screenshot_ocr_module import recognize_system_screenshot
+import eartag_ocr_module
+
+# 缓存指纹：引擎参数或识别流程配置变化时自动使用新的缓存键
+OCR_CACHE_FINGERPRINT = compute_fingerprint(
+    RESULT_CACHE_VERSION, get_engine_params("primary"), get_engine_params("secondary"),
+    resolution_module.RESOLUTION_PROFILES,
+    resolution_module.REFINE_CONFIDENCE,
+    resolution_module.REFINE_MIN_TEXT_HEIGHT,
+)
+EARTAG_CACHE_FINGERPRINT = compute_fingerprint(
+    RESULT_CACHE_VERSION, OCR_CACHE_FINGERPRINT, get_engine_params("eartag"),
+    eartag_ocr_module.EARTAG_LAYER_ORDER,
+    eartag_ocr_module.EARTAG_EARLY_EXIT,
+    eartag_ocr_module.EARTAG_EARLY_EXIT_CONFIDENCE,
+    eartag_ocr_module.EARTAG_ORIENTATION_MODE,
+    eartag_ocr_module.EARTAG_ROI_FIRST,
+    eartag_ocr_module.EARTAG_ROI_DETECTORS,
+)
+
+def run_eartag_recognition(context, first_pass=None, with_confidence=False):
+    """猪耳标识别：复用图像上下文和主引擎首轮结果；启用工作池时在工作进程中执行
+
+    with_confidence: 为 True 时返回 (结果, 是否有可信耳标号码)（文档预判路由使用）
+    """
+    cache_key = None
+    if result_cache is not None:
+        # 有无首轮结果时识别流程不同（返回值形式也不同），分开缓存
+        namespace = "eartag" if first_pass is not None else "eartag_routed"
+        cache_key = ResultCache.make_key(namespace, context.digest, EARTAG_CACHE_FINGERPRINT)
+        cached = result_cache.get(cache_key)
+        CACHE_LOOKUPS.inc(namespace=namespace, result="hit" if cached is not None else "miss")
+        if cached is not None:
+            logger.info("⚡ 猪耳标结果命中缓存")
+            return cached
+
+    with time_stage("eartag"):
+        if worker_pool is not None:
+            # 跨进程只传压缩后的字节，避免序列化整张解码图像
+            result = worker_pool.recognize_eartag(
+                bytes(context.image_bytes), first_pass=first_pass, with_confidence=with_confidence
+            )
+        else:
+            result = recognize_pig_ear_tag(context=context, first_pass=first_pass, with_confidence=with_confidence)
+
+    if cache_key is not None and result:
+        result_cache.put(cache_key, result)
+    return result
+
+
+def timed_route_document(context):
+    """文档类型预判，耗时记入 ocr_stage_seconds{stage="route"}"""
+    with time_stage("route"):
+        return route_document(context)
+
+
+def eartag_found(data):
+    """猪耳标识别结果中是否有任一耳标号码"""
+    return bool(data) and (data.get("ear_tag_7digit") != "未识别" or data.get("ear_tag_8digit") != "未识别")
+
+
+# 服务就绪状态：引擎预热完成后才对外就绪
+engines_ready = False
+
+
+async def warm_up_engines():
+    """后台预热引擎，完成后标记就绪"""
+    global engines_ready
+    try:
+        if worker_pool is None:
+            await asyncio.get_event_loop().run_in_executor(None, warm_up_ocr_engines, WARMUP_ENGINES)
+        else:
+            # 工作进程在启动时各自预热，全部就绪即可
+            while not worker_pool.all_ready():
+                await asyncio.sleep(0.5)
+        engines_ready = True
+        logger.info("✅ OCR引擎预热完成，服务就绪")
+    except Exception as e:
+        logger.error(f"❌ OCR引擎预热失败: {e}")
+
+
+@app.listener("before_server_start")
+async def start_ocr_worker_pool(app, loop):
+    if worker_pool is not None:
+        worker_pool.start()
+    app.add_task(warm_up_engines())
+
+
+# 就绪探针：引擎预热完成前返回503
+@app.get("/ready")
+async def readiness(request: Request):
+    body = {
+        "ready": engines_ready,
+        "engines": engine_registry.status() if worker_pool is None else {"worker_pool": worker_pool.num_workers},
+    }
+    return response.json(body, status=200 if engines_ready else 503)
+
+
+# 运行指标（Prometheus 文本格式）
+@app.get("/metrics")
+async def metrics_endpoint(request: Request):
+    return response.text(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.listener("after_server_stop")
+async def stop_ocr_worker_pool(app, loop):
+    if worker_pool is not None:
+        worker_pool.shutdown()
 
 # 处理预检请求
 @app.options("/parse-docs")
@@ -295,16 +550,218 @@ async def options_parse_docs(request: Request):
         "Access-Control-Allow-Headers": request.headers.get("Access-Control-Request-Headers", "Content-Type, Authorization"),
     })
 
-# 主接口
-@app.post("/parse-docs")
-async def parse_docs(request: Request):
-    if not request.files:
-        return response.json({"error": "No files uploaded"}, status=400)
+def classify_document(texts_with_boxes):
+    """按识别文本混合打分分类，返回 "id"/"bank"/"ss"/"eartag"，都没有得分时为 None"""
+    # 合并所有文本用于分类
+    all_text = ' '.join([item["text"] for item in texts_with_boxes])
+
+    # 混合打分分类：同时考虑关键词、号码有效性
+    # 四类关键词一次匹配全部文本块
+    hits = CLASSIFY_MATCHER.scan(texts_with_boxes)
+
+    # 身份证分数
+    id_score = 0.0
+    if detect_id_card_number(all_text):
+        id_score += 1.0
+    id_score += compute_keyword_proximity_score(texts_with_boxes, ID_CLASSIFY_KEYWORDS, hits)
+
+    # 银行卡分数（提高权重）
+    bank_score = 0.0
+    luhn_cards = find_luhn_cards_with_positions(texts_with_boxes)
+    if luhn_cards:
+        bank_score += 2.0  # 银行卡号权重更高
+    bank_score += compute_keyword_proximity_score(texts_with_boxes, BANK_CLASSIFY_KEYWORDS, hits)
+
+    # 系统截图分数
+    ss_score = 0.0
+    if re.search(r'\bP[0-9A-Z]{2,}N\d{2,}\b', all_text, re.I) or re.search(r'\bR[0-9A-Z]{2,}N\d{2,}\b', all_text, re.I):
+        ss_score += 1.0
+    ss_score += compute_keyword_proximity_score(texts_with_boxes, SS_CLASSIFY_KEYWORDS, hits)
+
+    # 猪耳标分数（新增）- 大幅提高权重
+    eartag_score = 0.0
+    # 检测7位或8位数字（耳标特征）
+    eartag_numbers = re.findall(r'\b\d{7,8}\b', all_text)
+    if eartag_numbers:
+        eartag_score += len(eartag_numbers) * 3.0  # 每个耳标数字加3.0分（进一步提高权重）
+    eartag_score += compute_keyword_proximity_score(texts_with_boxes, EARTAG_CLASSIFY_KEYWORDS, hits)
+
+    # 如果同时包含耳标数字和猪耳标关键词，额外加分
+    if eartag_numbers and hits.found(*EARTAG_SCENE_KEYWORDS):
+        eartag_score += 3.0  # 额外加分进一步提高
+
+    # 特殊处理：如果包含"拍摄人"关键词，说明是猪耳标照片，大幅加分
+    if hits.found("拍摄人"):
+        eartag_score += 2.0  # 拍摄人是猪耳标的强特征
+
+    logger.info(f"🧮 打分: 身份证={id_score:.1f}, 银行卡={bank_score:.1f}, 系统截图={ss_score:.1f}, 猪耳标={eartag_score:.1f}")
+
+    # 选择分最高的类别；分数相等时按 身份证 > 银行卡 > 系统截图 > 猪耳标
+    scores = [("id", id_score), ("bank", bank_score), ("ss", ss_score), ("eartag", eartag_score)]
+    scores.sort(key=lambda x: x[1], reverse=True)
+
+    chosen = scores[0][0] if scores and scores[0][1] > 0 else None
+    if chosen == "id":
+        logger.info("📌 打分最高 -> 身份证")
+    elif chosen == "bank":
+        logger.info("💳 打分最高 -> 银行卡")
+    elif chosen == "ss":
+        logger.info("📱 打分最高 -> 系统截图")
+    return chosen
+
+
+# 按文本提取字段的文档类型（猪耳标还需要图像，见 run_eartag_recognition）
+DOCUMENT_EXTRACTORS = {
+    "id": recognize_id_card,
+    "bank": recognize_bank_card,
+    "ss": recognize_system_screenshot,
+}
+
+
+def extract_document_fields(doc_type, texts_with_boxes):
+    """身份证/银行卡/系统截图的字段提取，耗时记入 ocr_extract_seconds"""
+    with timed(EXTRACT_SECONDS, doc_type=doc_type):
+        return DOCUMENT_EXTRACTORS[doc_type](texts_with_boxes)
+
+
+# 单个文件识别：OCR -> 打分分类 -> 字段提取
+async def process_uploaded_file(name, content):
+    """识别单个上传文件，返回该文件的分类和提取结果（不修改任何共享状态）"""
+    start = time.perf_counter()
+    file_result = await _process_uploaded_file(name, content)
+    DOCUMENT_SECONDS.observe(time.perf_counter() - start, doc_type=file_result["doc_type"] or "unknown")
+    return file_result
+
+
+async def _process_uploaded_file(name, content):
+    logger.info(f"处理文件: {name}, 大小: {len(content)} bytes")
+
+    file_result = {
+        "name": name,
+        "doc_type": None,
+        "texts_with_boxes": [],
+        "data": None,
+    }
+
+    # 图像上下文：按需解码一次，灰度图、缩小图等中间结果在后续各阶段共用
+    context = ImageContext(image_bytes=content)
+
+    # 相同图片重复提交时直接复用缓存的OCR结果，无需解码
+    ocr_cache_key = ResultCache.make_key("ocr", context.digest, OCR_CACHE_FINGERPRINT) if result_cache is not None else None
+    texts_with_boxes = result_cache.get(ocr_cache_key) if ocr_cache_key else None
+    if ocr_cache_key:
+        CACHE_LOOKUPS.inc(namespace="ocr", result="hit" if texts_with_boxes is not None else "miss")
+    routed_eartag_data = None
+
+    if texts_with_boxes is not None:
+        logger.info(f"⚡ 文件 {name} OCR结果命中缓存")
+    else:
+        # 能读到文件头尺寸时不在这里完整解码，后续按各流程的工作分辨率缩小解码
+        if context.size is None and context.bgr is None:
+            logger.warning(f"文件 {name} 无法解码")
+            return file_result
+
+        # 预判为猪耳标照片时跳过通用OCR，直接进入猪耳标识别
+        if ENABLE_DOC_ROUTER:
+            loop = asyncio.get_event_loop()
+            if await loop.run_in_executor(None, bind_to_upload(timed_route_document), context) == "eartag":
+                logger.info(f"🐷 文件 {name} 预判为猪耳标，跳过通用OCR")
+                routed_eartag_data, confident = await loop.run_in_executor(
+                    None, bind_to_upload(run_eartag_recognition), context, None, True
+                )
+                # 预判阈值只在猪耳标样例上调过：没有可信耳标号码时不直接采信，回退通用OCR按文本分类
+                if confident:
+                    file_result["doc_type"] = "eartag"
+                    file_result["data"] = routed_eartag_data
+                    return file_result
+                logger.info(f"🔄 文件 {name} 未识别到可信耳标号码，回退通用OCR和文本分类")
+
+        # 执行OCR识别
+        texts_with_boxes = await enhanced_ocr_image(context)
+        # 识别为空可能是临时错误，不缓存
+        if texts_with_boxes and ocr_cache_key:
+            result_cache.put(ocr_cache_key, texts_with_boxes)
+
+    if not texts_with_boxes:
+        logger.warning(f"文件 {name} 未识别到文本")
+        return file_result
+
+    file_result["texts_with_boxes"] = texts_with_boxes
+
+    chosen = classify_document(texts_with_boxes)
+    if chosen in DOCUMENT_EXTRACTORS:
+        file_result["doc_type"] = chosen
+        file_result["data"] = extract_document_fields(chosen, texts_with_boxes)
+    else:
+        # 按照用户逻辑：系统截图就是系统截图，不需要再识别猪耳标
+        if chosen == "eartag":
+            logger.info("🐷 打分最高 -> 猪耳标")
+        else:
+            logger.info("🐷 识别为猪耳标 (其他情况)")
+        file_result["doc_type"] = "eartag"
+        if routed_eartag_data is not None:
+            # 预判阶段已完整识别过，不再重复
+            file_result["data"] = routed_eartag_data
+        else:
+            file_result["data"] = await asyncio.get_event_loop().run_in_executor(
+                None, bind_to_upload(run_eartag_recognition), context, texts_with_boxes
+            )
+
+    return file_result
+
+
+def estimate_pixels(content):
+    """按文件头中的宽高估算解码后的像素数"""
+    size = probe_image_size(content)
+    return size[0] * size[1] if size else UNKNOWN_IMAGE_PIXELS
+
+
+async def iter_file_results(files, concurrency=PARSE_DOCS_CONCURRENCY):
+    """并发识别一个请求内的所有文件，按完成先后逐个产出 (上传序号, 文件结果)
+
+    已落盘的文件以内存映射方式读取；每个文件先按估算像素数占用单请求和全局预算，预算不足时排队等待。
+    文件被取消（客户端断开）时，等已在线程中运行的识别调用结束后才释放内存映射和预算
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    request_budget = PixelBudget(REQUEST_PIXEL_BUDGET)
+
+    async def run_one(index, file):
+        async with semaphore:
+            lease = None
+            try:
+                lease = UploadLease(open_upload(file))
+                pixels = estimate_pixels(lease.content)
+                async with request_budget.reserve(pixels):
+                    async with pixel_budget.reserve(pixels):
+                        async with lease as content:
+                            return index, await process_uploaded_file(file.name, content)
+            except Exception as e:
+                logger.error(f"文件 {file.name} 识别失败: {e}")
+                return index, {"name": file.name, "doc_type": None, "texts_with_boxes": [], "data": None}
+            finally:
+                if lease is not None:
+                    await lease.release()
+
+    tasks = [asyncio.ensure_future(run_one(index, file)) for index, file in enumerate(files)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # 客户端断开等提前结束时取消尚未开始的文件
+        for task in tasks:
+            task.cancel()
 
-    files = request.files.getlist("files")
-    if len(files) > 50:
-        return response.json({"error": "最多上传 50 张图片"}, status=400)
 
+async def process_files_concurrently(files, concurrency=PARSE_DOCS_CONCURRENCY):
+    """并发识别一个请求内的所有文件，结果按上传顺序返回"""
+    file_results = [None] * len(files)
+    async for index, file_result in iter_file_results(files, concurrency):
+        file_results[index] = file_result
+    return file_results
+
+
+def merge_file_results(file_results):
+    """按上传顺序合并各文件结果：每类证件取第一张，猪耳标全部保留"""
     results = {
         "id_card": None,
         "bank_card": None,
@@ -313,95 +770,30 @@ async def parse_docs(request: Request):
         "debug_texts": []
     }
 
-    for file in files:
-        content = file.body
-        logger.info(f"处理文件: {file.name}, 大小: {len(content)} bytes")
+    for file_result in file_results:
+        if file_result["texts_with_boxes"]:
+            # 保存调试信息（与逐个处理时一致：保留最后一个有文本的文件）
+            results["debug_texts"] = file_result["texts_with_boxes"]
 
-        # 执行OCR识别
-        texts_with_boxes = await enhanced_ocr_image(content)
-        
-        if not texts_with_boxes:
-            logger.warning(f"文件 {file.name} 未识别到文本")
+        doc_type = file_result["doc_type"]
+        data = file_result["data"]
+        if not data:
             continue
+        if doc_type == "id" and not results["id_card"]:
+            results["id_card"] = data
+        elif doc_type == "bank" and not results["bank_card"]:
+            results["bank_card"] = data
+        elif doc_type == "ss" and not results["system_screenshot"]:
+            results["system_screenshot"] = data
+        elif doc_type == "eartag":
+            if eartag_found(data):
+                results["pig_ear_tags"].append(data)
 
-        # 合并所有文本用于分类
-        all_text = ' '.join([item["text"] for item in texts_with_boxes])
-        text_str = all_text.lower()
-        
-        # 保存调试信息
-        results["debug_texts"] = texts_with_boxes
-
-        # 混合打分分类：同时考虑关键词、号码有效性
-        id_kw = ["身份证", "公民身份号码", "姓名", "民族", "住址"]
-        bank_kw = ["银行", "银行卡", "借记卡", "信用卡", "卡号", "农信", "信用社", "发卡行", "银行名称", "银联", "UNIONPAY", "VALID THRU", "CREDIT", "DEBIT"]
-        ss_kw = ["保单号", "报案号", "系统"]
-        eartag_kw = ["耳标", "猪耳标", "拍摄人", "查勘地点", "拍摄地点", "经纬度"]
-
-        # 身份证分数
-        id_score = 0.0
-        if detect_id_card_number(all_text):
-            id_score += 1.0
-        id_score += compute_keyword_proximity_score(texts_with_boxes, id_kw)
-
-        # 银行卡分数（提高权重）
-        bank_score = 0.0
-        luhn_cards = find_luhn_cards_with_positions(texts_with_boxes)
-        if luhn_cards:
-            bank_score += 2.0  # 银行卡号权重更高
-        bank_score += compute_keyword_proximity_score(texts_with_boxes, bank_kw)
-
-        # 系统截图分数
-        ss_score = 0.0
-        if re.search(r'\bP[0-9A-Z]{2,}N\d{2,}\b', all_text, re.I) or re.search(r'\bR[0-9A-Z]{2,}N\d{2,}\b', all_text, re.I):
-            ss_score += 1.0
-        ss_score += compute_keyword_proximity_score(texts_with_boxes, ss_kw)
-
-        # 猪耳标分数（新增）- 大幅提高权重
-        eartag_score = 0.0
-        # 检测7位或8位数字（耳标特征）
-        eartag_numbers = re.findall(r'\b\d{7,8}\b', all_text)
-        if eartag_numbers:
-            eartag_score += len(eartag_numbers) * 3.0  # 每个耳标数字加3.0分（进一步提高权重）
-        eartag_score += compute_keyword_proximity_score(texts_with_boxes, eartag_kw)
-        
-        # 如果同时包含耳标数字和猪耳标关键词，额外加分
-        if eartag_numbers and any(kw in all_text for kw in ["拍摄人", "查勘地点", "拍摄地点"]):
-            eartag_score += 3.0  # 额外加分进一步提高
-        
-        # 特殊处理：如果包含"拍摄人"关键词，说明是猪耳标照片，大幅加分
-        if "拍摄人" in all_text:
-            eartag_score += 2.0  # 拍摄人是猪耳标的强特征
-
-        logger.info(f"🧮 打分: 身份证={id_score:.1f}, 银行卡={bank_score:.1f}, 系统截图={ss_score:.1f}, 猪耳标={eartag_score:.1f}")
-
-        # 选择分最高的类别；分数相等时按 身份证 > 银行卡 > 系统截图 > 猪耳标
-        scores = [("id", id_score), ("bank", bank_score), ("ss", ss_score), ("eartag", eartag_score)]
-        scores.sort(key=lambda x: x[1], reverse=True)
-
-        chosen = scores[0][0] if scores and scores[0][1] > 0 else None
-        if chosen == "id" and not results["id_card"]:
-            logger.info("📌 打分最高 -> 身份证")
-            results["id_card"] = recognize_id_card(texts_with_boxes)
-        elif chosen == "bank" and not results["bank_card"]:
-            logger.info("💳 打分最高 -> 银行卡")
-            results["bank_card"] = recognize_bank_card(texts_with_boxes)
-        elif chosen == "ss" and not results["system_screenshot"]:
-            logger.info("📱 打分最高 -> 系统截图")
-            results["system_screenshot"] = recognize_system_screenshot(texts_with_boxes)
-        elif chosen == "eartag":
-            logger.info("🐷 打分最高 -> 猪耳标")
-            eartag_result = await asyncio.get_event_loop().run_in_executor(None, recognize_pig_ear_tag, content)
-            if eartag_result.get("ear_tag_7digit") != "未识别" or eartag_result.get("ear_tag_8digit") != "未识别":
-                results["pig_ear_tags"].append(eartag_result)
-        else:
-            logger.info("🐷 识别为猪耳标 (其他情况)")
-            eartag_result = await asyncio.get_event_loop().run_in_executor(None, recognize_pig_ear_tag, content)
-            if eartag_result.get("ear_tag_7digit") != "未识别" or eartag_result.get("ear_tag_8digit") != "未识别":
-                results["pig_ear_tags"].append(eartag_result)
+    return results
 
-        # 按照用户逻辑：系统截图就是系统截图，不需要再识别猪耳标
 
-    # 构建响应
+def build_form_data(results):
+    """将合并后的识别结果转换为前端表单字段"""
     form_data = {
         # 身份证信息
         "name": results["id_card"].get("name", "未识别") if results["id_card"] else "未识别",
@@ -429,8 +821,158 @@ async def parse_docs(request: Request):
         # 调试信息
         "debug_ocr_texts": [item["text"] for item in results.get("debug_texts", [])],
     }
+    return form_data
+
+
+async def receive_uploaded_files(request):
+    """边接收边落盘并校验上传文件，返回 (UploadSpool, 错误响应)；调用方用完后需调用 spool.cleanup()
+
+    路由需声明 stream=True，请求体不会整体读入内存
+    """
+    spool = UploadSpool(UPLOAD_SPOOL_DIR)
+    try:
+        await spool.receive(request, max_files=MAX_UPLOAD_FILES, max_file_bytes=MAX_UPLOAD_FILE_MB * 1024 * 1024)
+    except UploadError as e:
+        spool.cleanup()
+        return None, response.json({"error": str(e)}, status=400)
+    except BaseException:
+        spool.cleanup()
+        raise
 
-    return response.json(form_data)
+    if not spool.files:
+        spool.cleanup()
+        return None, response.json({"error": "No files uploaded"}, status=400)
+    return spool, None
+
+
+# 主接口
+@app.post("/parse-docs", stream=True)
+async def parse_docs(request: Request):
+    spool, error = await receive_uploaded_files(request)
+    if error:
+        return error
+
+    try:
+        # 并发处理所有文件，按上传顺序合并
+        file_results = await process_files_concurrently(spool.files)
+    finally:
+        spool.cleanup()
+    results = merge_file_results(file_results)
+
+    # 构建响应
+    return response.json(build_form_data(results))
+
+
+# 流式接口：每个文件识别完成后立即推送一行JSON（NDJSON），最后推送合并后的表单
+@app.options("/parse-docs/stream")
+async def options_parse_docs_stream(request: Request):
+    return await options_parse_docs(request)
+
+
+@app.post("/parse-docs/stream", stream=True)
+async def parse_docs_stream(request: Request):
+    spool, error = await receive_uploaded_files(request)
+    if error:
+        return error
+
+    try:
+        await stream_file_results(request, spool.files)
+    finally:
+        spool.cleanup()
+
+
+async def stream_file_results(request, files):
+    """逐个推送文件结果（NDJSON），最后推送合并后的表单"""
+    stream = await request.respond(content_type="application/x-ndjson; charset=utf-8")
+
+    async def send(message):
+        await stream.send(json.dumps(message, ensure_ascii=False, default=float) + "\n")
+
+    # 已完成的文件按上传顺序合并，保证每次推送的表单与最终结果的合并规则一致
+    file_results = [None] * len(files)
+    completed = 0
+    async for index, file_result in iter_file_results(files):
+        file_results[index] = file_result
+        completed += 1
+        partial = merge_file_results([r for r in file_results if r is not None])
+        await send({
+            "type": "file",
+            "index": index,
+            "name": file_result["name"],
+            "doc_type": file_result["doc_type"],
+            "data": file_result["data"],
+            "completed": completed,
+            "total": len(files),
+            "form": build_form_data(partial),
+        })
+
+    await send({"type": "result", "form": build_form_data(merge_file_results(file_results))})
+    await stream.eof()
+
+# 异步任务接口：提交后立即返回任务ID，后台排队识别
+async def run_recognition_job(job):
+    """识别任务处理函数：逐个记录文件结果，最后生成合并表单"""
+    file_results = [None] * len(job.files)
+    async for index, file_result in iter_file_results(job.files):
+        file_results[index] = file_result
+        job.record_file(index, file_result)
+    job.form = build_form_data(merge_file_results(file_results))
+
+
+job_manager = JobManager(
+    run_recognition_job,
+    storage_dir=JOB_STORAGE_DIR,
+    max_queued=JOB_MAX_QUEUED,
+    workers=JOB_WORKERS,
+    retention_seconds=JOB_RETENTION_SECONDS,
+)
+
+
+@app.listener("before_server_start")
+async def start_job_manager(app, loop):
+    job_manager.start()
+
+
+@app.listener("before_server_stop")
+async def stop_job_manager(app, loop):
+    await job_manager.stop()
+
+
+@app.post("/jobs", stream=True)
+async def create_job(request: Request):
+    spool, error = await receive_uploaded_files(request)
+    if error:
+        return error
+
+    try:
+        callback_url = spool.form.get("callback_url")
+        if callback_url:
+            try:
+                validate_callback_url(callback_url)
+            except ValueError as e:
+                return response.json({"error": str(e)}, status=400)
+
+        try:
+            # 已落盘的上传文件直接移入任务目录
+            job = job_manager.submit([(file.name, file) for file in spool.files], callback_url=callback_url)
+        except JobQueueFullError:
+            return response.json({"error": "识别任务队列已满，请稍后重试"}, status=503, headers={"Retry-After": "30"})
+    finally:
+        spool.cleanup()
+
+    return response.json({
+        "job_id": job.job_id,
+        "status": job.status,
+        "queued": job_manager.queued_count(),
+    }, status=202)
+
+
+@app.get("/jobs/<job_id>")
+async def get_job(request: Request, job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        return response.json({"error": "任务不存在"}, status=404)
+    return response.json(job.to_dict())
 
 # 启动服务
 if __name__ == "__main__":
@@ -6,10 +6,65 @@
 
 import logging
 import re
+from keyword_matcher_module import KeywordMatcher
+from layout_module import LayoutIndex
 
 # 设置日志
 logger = logging.getLogger(__name__)
 
+# 预编译的卡号模式：16-19位数字，允许空格/短横线/点等分隔符
+CARD_NUMBER_PATTERN = re.compile(r'(?:\d[\s\-\.]?){16,19}')
+NON_DIGIT_PATTERN = re.compile(r'[^0-9]')
+# 卡号字段名（卡号在其同一行右侧或正下方时加分）
+CARD_NUMBER_LABELS = ("卡号", "CARD NO", "CARD NUMBER")
+UNIONPAY_KEYWORDS = ("UNIONPAY", "UNION PAY")
+RCCU_KEYWORDS = ("农村信用社", "农信", "信用社")
+
+# 文本中的银行名称关键词（中文名称和英文缩写，忽略大小写），按优先级排列，命中的第一条生效
+BANK_NAME_RULES = [
+    ("贵州农信", ("贵州农信", "贵州农村信用社")),
+    ("农村信用社", RCCU_KEYWORDS),
+    ("农村商业银行", ("农商银行", "农村商业银行")),
+    ("中国工商银行", ("工商银行", "ICBC")),
+    ("中国建设银行", ("建设银行", "CCB")),
+    ("中国农业银行", ("农业银行", "ABC")),
+    ("中国银行", ("中国银行", "BOC")),
+    ("招商银行", ("招商银行", "CMB")),
+    ("中信银行", ("中信银行", "CITIC")),
+    ("中国民生银行", ("民生银行", "CMBC")),
+    ("上海浦东发展银行", ("浦发银行", "SPDB")),
+    ("兴业银行", ("兴业银行", "CIB")),
+    ("平安银行", ("平安银行", "PAB")),
+    ("中国光大银行", ("光大银行", "CEB")),
+    ("华夏银行", ("华夏银行", "HXB")),
+    ("广发银行", ("广发银行", "GDB")),
+    ("交通银行", ("交通银行", "BOCOM")),
+    ("中国邮政储蓄银行", ("邮储银行", "PSBC")),
+    # 国际品牌关键词
+    ("中国银联", UNIONPAY_KEYWORDS),
+    ("Visa", ("VISA",)),
+    ("MasterCard", ("MASTERCARD",)),
+]
+
+# 银行卡文本的全部关键词预编译为一个 Aho–Corasick 自动机
+BANK_KEYWORD_MATCHER = KeywordMatcher(
+    [keyword for _, keywords in BANK_NAME_RULES for keyword in keywords] + ["DISCOVER", *CARD_NUMBER_LABELS]
+)
+
+
+def luhn_ok(num: str) -> bool:
+    """Luhn 校验"""
+    s = 0
+    rev = num[::-1]
+    for i, ch in enumerate(rev):
+        n = int(ch)
+        if i % 2 == 1:
+            n *= 2
+            if n > 9:
+                n -= 9
+        s += n
+    return s % 10 == 0
+
 class BankCardOCR:
     """银行卡OCR识别类"""
     
@@ -40,20 +95,34 @@ class BankCardOCR:
         
         # 提取全部候选银行卡号（容错：去除空格/短横线/点等分隔符），并打分选择最佳
         candidates = []
-        joined_upper = " ".join([b["text"] for b in texts_with_boxes]).upper()
-        has_unionpay = ("UNIONPAY" in joined_upper) or ("UNION PAY" in joined_upper)
-        has_rccu = ("农村信用社" in joined_upper) or ("农信" in joined_upper) or ("信用社" in joined_upper)
+        # 银行名称、品牌和字段名关键词一次匹配全部文本块
+        hits = BANK_KEYWORD_MATCHER.scan(texts_with_boxes)
+        has_unionpay = hits.found(*UNIONPAY_KEYWORDS)
+        has_rccu = hits.found(*RCCU_KEYWORDS)
         candidate_6217 = None
+        block_numbers = []
         for b in texts_with_boxes:
             text = b["text"].strip()
+            numbers = []
             # 所有16-19位序列（允许分隔符）
-            for m in re.finditer(r'(?:\d[\s\-\.]?){16,19}', text):
+            for m in CARD_NUMBER_PATTERN.finditer(text):
                 raw = m.group(0)
-                digits = re.sub(r'[^0-9]', '', raw)
+                digits = NON_DIGIT_PATTERN.sub('', raw)
                 if 16 <= len(digits) <= 19:
-                    candidates.append(digits)
+                    numbers.append(digits)
                     if digits.startswith('6217') and candidate_6217 is None:
                         candidate_6217 = digits
+            candidates.extend(numbers)
+            block_numbers.append(numbers)
+        # 版面上与"卡号"字段名配对（同一行右侧或正下方）的卡号
+        labelled = set()
+        layout = LayoutIndex(texts_with_boxes)
+        if layout.has_geometry and candidates:
+            for i in hits.blocks(*CARD_NUMBER_LABELS):
+                labelled.update(block_numbers[i])
+                paired = layout.value_of(i, lambda j: bool(block_numbers[j]))
+                if paired is not None:
+                    labelled.update(block_numbers[paired])
         # 去重
         candidates = list(dict.fromkeys(candidates))
         # 打分选择
@@ -61,17 +130,6 @@ class BankCardOCR:
         best_score = -1
         best_62 = None
         best_62_score = -1
-        def luhn_ok(num: str) -> bool:
-            s = 0
-            rev = num[::-1]
-            for i, ch in enumerate(rev):
-                n = int(ch)
-                if i % 2 == 1:
-                    n *= 2
-                    if n > 9:
-                        n -= 9
-                s += n
-            return s % 10 == 0
         for num in candidates:
             score = 0
             if luhn_ok(num):
@@ -84,6 +142,8 @@ class BankCardOCR:
                 score += 2
             if len(num) == 19:
                 score += 1
+            if num in labelled:
+                score += 2
             if score > best_score:
                 best_score = score
                 best = num
@@ -136,61 +196,19 @@ class BankCardOCR:
                 bank_name = "Discover"
         
         # 从文本中识别银行名称
-        text_str = " ".join([b["text"] for b in texts_with_boxes])
-        text_upper = text_str.upper()
         # BIN 反推若命中，优先使用
         if inferred_from_bin:
             bank_name = inferred_from_bin
 
-        # 中文银行关键词优先覆盖
-        if "贵州农信" in text_str or "贵州农村信用社" in text_str:
-            bank_name = "贵州农信"
-        elif "农村信用社" in text_str or "农信" in text_str or "信用社" in text_str:
-            bank_name = "农村信用社"
-        elif "农商银行" in text_str or "农村商业银行" in text_str:
-            bank_name = "农村商业银行"
-        elif "工商银行" in text_str or "ICBC" in text_upper:
-            bank_name = "中国工商银行"
-        elif "建设银行" in text_str or "CCB" in text_upper:
-            bank_name = "中国建设银行"
-        elif "农业银行" in text_str or "ABC" in text_upper:
-            bank_name = "中国农业银行"
-        elif "中国银行" in text_str or "BOC" in text_upper:
-            bank_name = "中国银行"
-        elif "招商银行" in text_str or "CMB" in text_upper:
-            bank_name = "招商银行"
-        elif "中信银行" in text_str or "CITIC" in text_upper:
-            bank_name = "中信银行"
-        elif "民生银行" in text_str or "CMBC" in text_upper:
-            bank_name = "中国民生银行"
-        elif "浦发银行" in text_str or "SPDB" in text_upper:
-            bank_name = "上海浦东发展银行"
-        elif "兴业银行" in text_str or "CIB" in text_upper:
-            bank_name = "兴业银行"
-        elif "平安银行" in text_str or "PAB" in text_upper:
-            bank_name = "平安银行"
-        elif "光大银行" in text_str or "CEB" in text_upper:
-            bank_name = "中国光大银行"
-        elif "华夏银行" in text_str or "HXB" in text_upper:
-            bank_name = "华夏银行"
-        elif "广发银行" in text_str or "GDB" in text_upper:
-            bank_name = "广发银行"
-        elif "交通银行" in text_str or "BOCOM" in text_upper:
-            bank_name = "交通银行"
-        elif "邮储银行" in text_str or "PSBC" in text_upper:
-            bank_name = "中国邮政储蓄银行"
-        # 国际品牌关键词覆盖
-        elif "UNIONPAY" in text_upper or "UNION PAY" in text_upper:
-            bank_name = "中国银联"
-        elif "VISA" in text_upper:
-            bank_name = "Visa"
-        elif "MASTERCARD" in text_upper:
-            bank_name = "MasterCard"
-        elif "DISCOVER" in text_upper and bank_name == "未识别":
+        # 中文银行关键词优先覆盖，其次国际品牌关键词（按 BANK_NAME_RULES 的优先级）
+        matched_bank = hits.first_found(BANK_NAME_RULES)
+        if matched_bank:
+            bank_name = matched_bank
+        elif hits.found("DISCOVER") and bank_name == "未识别":
             bank_name = "Discover"
 
         # 如果仍未识别中文银行，但存在 UnionPay 且卡号以62开头，倾向标记为 农村信用社（若 BIN 匹配）或 中国银联
-        if bank_name == "未识别" and ("UNIONPAY" in text_upper or "UNION PAY" in text_upper):
+        if bank_name == "未识别" and has_unionpay:
             if card_number.startswith('6217'):
                 bank_name = "农村信用社"
             elif card_number.startswith('62'):
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+批量OCR模块 - 独立模块
+把并发请求中的待识别图片在短时间窗口内聚合成小批次，
+逐图检测后将所有文本区域合并为一次识别调用，再把结果分发回各调用方
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from ocr_utils import ensure_bgr, sort_text_boxes, crop_text_region, recognize_crops
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+
+class _OCRRequest:
+    """单个待识别请求"""
+
+    def __init__(self, img, det, rec, cls, kwargs, call=None):
+        self.img = img
+        self.det = det
+        self.rec = rec
+        self.cls = cls
+        self.kwargs = kwargs
+        self.call = call          # 非 ocr 的引擎调用（如方向分类器），在调度线程中执行
+        self.future = Future()
+
+    @property
+    def batchable(self):
+        # 只有对内存图像做完整检测+识别的请求才参与批处理
+        return self.call is None and self.det and self.rec and not self.kwargs and isinstance(self.img, np.ndarray)
+
+
+class BatchedOCR:
+    """PaddleOCR批处理包装类，接口与 PaddleOCR.ocr 保持一致"""
+
+    def __init__(self, engine, max_batch_size=8, max_wait_ms=10, name="ocr"):
+        """初始化批处理调度线程
+
+        engine: PaddleOCR 实例
+        max_batch_size: 单个批次最多聚合的图片数
+        max_wait_ms: 批次从第一张图片到达起最多等待的毫秒数
+        """
+        self.engine = engine
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0, max_wait_ms) / 1000.0
+        self.name = name
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._dispatch_loop, name=f"batched-{name}", daemon=True)
+        self._thread.start()
+
+    def __getattr__(self, item):
+        # drop_score、text_classifier 等属性直接取自底层引擎
+        if item == "engine":
+            raise AttributeError(item)
+        return getattr(self.engine, item)
+
+    def ocr(self, img, det=True, rec=True, cls=True, **kwargs):
+        """提交识别请求并阻塞等待本请求自己的结果"""
+        if self._closed:
+            raise RuntimeError(f"批处理OCR引擎 {self.name} 已关闭")
+        request = _OCRRequest(img, det, rec, cls, kwargs)
+        self._queue.put(request)
+        return request.future.result()
+
+    def run_exclusive(self, fn, *args, **kwargs):
+        """在调度线程中执行任意引擎调用（如 text_classifier），保证与批量识别串行"""
+        if self._closed:
+            raise RuntimeError(f"批处理OCR引擎 {self.name} 已关闭")
+        request = _OCRRequest(args, False, False, False, kwargs, call=fn)
+        self._queue.put(request)
+        return request.future.result()
+
+    def close(self):
+        """停止调度线程"""
+        self._closed = True
+        self._queue.put(None)
+
+    def _collect_batch(self):
+        """阻塞取第一个请求，再在等待窗口内尽量凑满一个批次"""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                self._queue.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _dispatch_loop(self):
+        while True:
+            batch = self._collect_batch()
+            if batch is None:
+                return
+
+            batchable = [r for r in batch if r.batchable]
+            others = [r for r in batch if not r.batchable]
+
+            # 非批处理请求逐个直接执行
+            for request in others:
+                self._run_single(request)
+
+            # 方向分类开关不同的请求不能合并识别，按 cls 分组
+            for cls in (True, False):
+                group = [r for r in batchable if bool(r.cls) == cls]
+                if len(group) == 1:
+                    self._run_single(group[0])
+                elif group:
+                    try:
+                        self._run_batch(group, cls)
+                    except Exception as e:
+                        # 批处理失败时退回逐个识别，避免一张坏图拖累整个批次
+                        logger.warning(f"⚠️ 批量OCR失败，退回逐个识别: {e}")
+                        for request in group:
+                            if not request.future.done():
+                                self._run_single(request)
+
+    def _run_single(self, request):
+        try:
+            if request.call is not None:
+                request.future.set_result(request.call(*request.img, **request.kwargs))
+                return
+            result = self.engine.ocr(request.img, det=request.det, rec=request.rec, cls=request.cls, **request.kwargs)
+            request.future.set_result(result)
+        except Exception as e:
+            request.future.set_exception(e)
+
+    def _run_batch(self, requests, cls):
+        """逐图检测，所有文本区域合并成一次识别调用"""
+        all_crops = []
+        per_request_boxes = []
+        for request in requests:
+            img = ensure_bgr(request.img)
+            try:
+                det_result = self.engine.ocr(img, det=True, rec=False)
+                boxes = det_result[0] if det_result and det_result[0] else []
+            except Exception as e:
+                request.future.set_exception(e)
+                per_request_boxes.append(None)
+                continue
+            boxes = sort_text_boxes(boxes)
+            per_request_boxes.append(boxes)
+            all_crops.extend(crop_text_region(img, box) for box in boxes)
+
+        rec_results = recognize_crops(self.engine, all_crops, cls=cls)
+        drop_score = getattr(self.engine, "drop_score", 0.5)
+
+        offset = 0
+        for request, boxes in zip(requests, per_request_boxes):
+            if boxes is None:
+                continue
+            lines = []
+            for box, rec_res in zip(boxes, rec_results[offset:offset + len(boxes)]):
+                text, score = rec_res[0], rec_res[1]
+                if score >= drop_score:
+                    lines.append([box, (text, score)])
+            offset += len(boxes)
+            # 与 PaddleOCR.ocr 的返回格式一致：无结果时为 [None]
+            request.future.set_result([lines if lines else None])
+        logger.info(f"📦 {self.name} 批量识别 {len(requests)} 张图片, {len(all_crops)} 个文本区域")
@@ -0,0 +1,510 @@
+# -*- coding: utf-8 -*-
+"""
+识别性能基准模块 - 独立模块
+在 测试/ 下的样例图片上运行与服务相同的识别流程，统计各阶段耗时（p50/p95/p99）、
+N个并发客户端下的吞吐量、进程峰值内存和（提供标注文件时的）准确率，输出JSON用于版本间对比
+
+用法:
+    python benchmark_ocr.py                                  # 测试/ 下全部样例，串行 + 4并发
+    python benchmark_ocr.py --clients 1,4,8 --repeat 3 --output bench.json
+    python benchmark_ocr.py --baseline bench_prev.json       # 与上一版本对比，退化时退出码为1
+    python benchmark_ocr.py --router-only                    # 只检查文档预判（不加载OCR模型）
+    python benchmark_ocr.py --only 猪耳标 --eartag-option early_exit=false   # 对比耳标识别开关
+
+文档预判检查：猪耳标目录为正样例，其余目录（身份证、银行卡、系统截图等）为负样例，
+统计预判为猪耳标的比例——正样例上为召回率，负样例上为误判率（误判的图片会多跑一次耳标识别）
+
+标注文件（--labels，默认 测试/labels.json，不存在时不统计准确率）格式:
+    {"猪耳标/pig1.JPG": {"ear_tag_7digit": "...", "ear_tag_8digit": "..."}, ...}
+键为相对 测试/ 的路径，值为期望的提取字段（只比较标注中出现的字段）
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import document_router_module
+from document_router_module import route_document
+from eartag_ocr_module import eartag_ocr
+from image_context_module import ImageContext
+from ocr_engine_module import engine_registry, warm_up_ocr_engines, get_engine_params
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+FIXTURE_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "测试")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+# 样例目录 -> 识别流程：猪耳标目录直接走耳标流程，其余目录走服务的通用识别流程（需要 app.py 的依赖）
+FIXTURE_PIPELINES = {"猪耳标": "eartag"}
+STAGES = ["decode", "preprocess", "det", "rec", "cls", "extract", "total"]
+PERCENTILES = (50, 95, 99)
+# 可用 --eartag-option 覆盖的耳标识别开关（EartagOCR 的属性）
+EARTAG_OPTIONS = ("early_exit", "early_exit_confidence", "orientation_mode", "roi_first", "rescore")
+
+
+class StageRecorder:
+    """模型调用耗时记录（检测/识别/方向分类在批处理调度线程中执行，按阶段累计）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._totals = {}
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self._totals[stage] = self._totals.get(stage, 0.0) + seconds
+
+    def take(self):
+        """取出并清零累计值"""
+        with self._lock:
+            totals, self._totals = self._totals, {}
+        return totals
+
+
+class _TimedPredictor:
+    """PaddleOCR 预测器的计时包装，其余属性透传"""
+
+    def __init__(self, predictor, stage, recorder):
+        self.predictor = predictor
+        self.stage = stage
+        self.recorder = recorder
+
+    def __getattr__(self, item):
+        if item in ("predictor", "stage", "recorder"):
+            raise AttributeError(item)
+        return getattr(self.predictor, item)
+
+    def __call__(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.predictor(*args, **kwargs)
+        finally:
+            self.recorder.add(self.stage, time.perf_counter() - start)
+
+
+def instrument_engines(names, recorder):
+    """给已加载引擎的检测器、识别器、方向分类器加上计时包装
+
+    共享模型时包在各场景预测器的锁内，只统计推理耗时、不含等锁时间
+    """
+    for name in names:
+        engine = engine_registry.get(name).engine
+        for attr, stage in (("text_detector", "det"), ("text_recognizer", "rec"), ("text_classifier", "cls")):
+            holder = getattr(engine, attr, None)
+            if holder is None:
+                continue
+            # 共享模型时是带锁的调用代理，计时包装替换其中的预测器
+            target, field = (holder, "predictor") if hasattr(holder, "lock") else (engine, attr)
+            predictor = getattr(target, field)
+            if not isinstance(predictor, _TimedPredictor):
+                setattr(target, field, _TimedPredictor(predictor, stage, recorder))
+
+
+def discover_fixtures(root=FIXTURE_ROOT):
+    """列出 root 下各子目录中的样例图片，返回 [{"path", "key", "pipeline"}]"""
+    fixtures = []
+    for folder in sorted(os.listdir(root)):
+        folder_path = os.path.join(root, folder)
+        if not os.path.isdir(folder_path):
+            continue
+        for file_name in sorted(os.listdir(folder_path)):
+            if file_name.lower().endswith(IMAGE_EXTENSIONS):
+                fixtures.append({
+                    "path": os.path.join(folder_path, file_name),
+                    "key": f"{folder}/{file_name}",
+                    "pipeline": FIXTURE_PIPELINES.get(folder, "general"),
+                })
+    return fixtures
+
+
+def load_labels(path):
+    """读取标注文件，不存在时返回空字典"""
+    if not path or not os.path.isfile(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def parse_eartag_options(values):
+    """解析 --eartag-option KEY=VALUE（布尔值写 true/false，数字按浮点数），返回 dict"""
+    options = {}
+    for value in values:
+        key, sep, raw = value.partition("=")
+        if not sep or key not in EARTAG_OPTIONS:
+            raise ValueError(f"无效的耳标识别开关: {value}（可用: {', '.join(EARTAG_OPTIONS)}）")
+        if raw.lower() in ("true", "false"):
+            options[key] = raw.lower() == "true"
+        else:
+            try:
+                options[key] = float(raw)
+            except ValueError:
+                options[key] = raw
+    return options
+
+
+def eartag_settings():
+    """当前耳标识别开关的取值（写入报告，便于对比不同配置）"""
+    return {key: getattr(eartag_ocr, key) for key in EARTAG_OPTIONS}
+
+
+def run_eartag_pipeline(name, content):
+    """猪耳标流程（与 recognize_eartag 一致），分别计时解码、识别和提取"""
+    stages = {}
+    start = time.perf_counter()
+    context = ImageContext(image_bytes=content)
+    context.bgr
+    stages["decode"] = time.perf_counter() - start
+
+    ocr_start = time.perf_counter()
+    texts_with_boxes = eartag_ocr.enhanced_ocr_image_for_eartag(context=context)
+    stages["ocr"] = time.perf_counter() - ocr_start
+
+    extract_start = time.perf_counter()
+    if texts_with_boxes:
+        data = eartag_ocr.extract_pig_ear_tag_enhanced(texts_with_boxes)
+    else:
+        data = {"ear_tag_7digit": "未识别", "ear_tag_8digit": "未识别"}
+    stages["extract"] = time.perf_counter() - extract_start
+    return "eartag", data, stages
+
+
+# 服务模块（app.py），有通用样例时由 load_service() 加载一次
+service = None
+
+
+def load_service():
+    """加载服务模块并关闭结果缓存（只在准备阶段调用一次，不计入识别耗时）"""
+    global service
+    if service is None:
+        import app
+        app.result_cache = None
+        service = app
+    return service
+
+
+def run_general_pipeline(name, content):
+    """服务的通用识别流程（与 process_uploaded_file 一致：通用OCR -> 打分分类 -> 字段提取），分别计时
+
+    猪耳标分支的耳标识别计入识别阶段；文档预判按服务配置（ENABLE_DOC_ROUTER）执行并计入识别阶段
+    """
+    stages = {}
+    start = time.perf_counter()
+    context = ImageContext(image_bytes=content)
+    context.bgr
+    stages["decode"] = time.perf_counter() - start
+
+    ocr_start = time.perf_counter()
+    doc_type = data = None
+    if service.ENABLE_DOC_ROUTER and route_document(context) == "eartag":
+        data, confident = service.run_eartag_recognition(context, None, True)
+        if confident:
+            doc_type = "eartag"
+    texts_with_boxes = asyncio.run(service.enhanced_ocr_image(context)) if doc_type is None else None
+    stages["ocr"] = time.perf_counter() - ocr_start
+
+    if texts_with_boxes:
+        extract_start = time.perf_counter()
+        doc_type = service.classify_document(texts_with_boxes)
+        if doc_type in service.DOCUMENT_EXTRACTORS:
+            data = service.extract_document_fields(doc_type, texts_with_boxes)
+            stages["extract"] = time.perf_counter() - extract_start
+        else:
+            stages["extract"] = time.perf_counter() - extract_start
+            eartag_start = time.perf_counter()
+            doc_type = "eartag"
+            if data is None:
+                data = service.run_eartag_recognition(context, texts_with_boxes)
+            stages["ocr"] += time.perf_counter() - eartag_start
+    return doc_type, data, stages
+
+
+PIPELINES = {
+    "eartag": run_eartag_pipeline,
+    "general": run_general_pipeline,
+}
+
+
+def run_fixture(fixture, content):
+    """识别单个样例，返回 (doc_type, data, stages, 总耗时)"""
+    start = time.perf_counter()
+    doc_type, data, stages = PIPELINES[fixture["pipeline"]](fixture["key"], content)
+    return doc_type, data, stages, time.perf_counter() - start
+
+
+def summarize(values):
+    """耗时列表（秒） -> 毫秒统计"""
+    if not values:
+        return None
+    ms = np.array(values, dtype=np.float64) * 1000.0
+    summary = {f"p{p}": round(float(np.percentile(ms, p)), 2) for p in PERCENTILES}
+    summary["mean"] = round(float(ms.mean()), 2)
+    summary["count"] = len(values)
+    return summary
+
+
+def score_accuracy(results, labels):
+    """按标注比较提取字段，只统计有标注的样例"""
+    labelled = [r for r in results if r["key"] in labels]
+    if not labelled:
+        return None
+    fields_total = fields_correct = exact = 0
+    for result in labelled:
+        expected = labels[result["key"]]
+        data = result["data"] or {}
+        matched = [str(data.get(field)) == str(value) for field, value in expected.items()]
+        result["correct"] = all(matched)
+        fields_total += len(matched)
+        fields_correct += sum(matched)
+        exact += result["correct"]
+    return {
+        "labelled": len(labelled),
+        "exact_match": round(exact / len(labelled), 4),
+        "field_accuracy": round(fields_correct / fields_total, 4) if fields_total else None,
+    }
+
+
+def stage_pass(fixtures, contents, repeat, recorder):
+    """串行逐张识别（同一时刻只有一张图在识别），模型耗时可准确归属到单张图片"""
+    per_stage = {stage: [] for stage in STAGES}
+    results = []
+    for round_index in range(repeat):
+        for fixture in fixtures:
+            recorder.take()
+            doc_type, data, stages, total = run_fixture(fixture, contents[fixture["key"]])
+            model = recorder.take()
+            stages.update({stage: model.get(stage, 0.0) for stage in ("det", "rec", "cls")})
+            if "ocr" in stages:
+                # 识别阶段中模型推理以外的时间：预处理、裁剪、区域检测等
+                stages["preprocess"] = max(0.0, stages.pop("ocr") - stages["det"] - stages["rec"] - stages["cls"])
+            stages["total"] = total
+            for stage, seconds in stages.items():
+                per_stage[stage].append(seconds)
+            if round_index == 0:
+                results.append({
+                    "key": fixture["key"],
+                    "doc_type": doc_type,
+                    "data": data,
+                    "total_ms": round(total * 1000.0, 2),
+                })
+    return {stage: summarize(values) for stage, values in per_stage.items()}, results
+
+
+def throughput_pass(fixtures, contents, repeat, clients):
+    """clients 个并发客户端识别全部样例，返回吞吐量和端到端延迟"""
+    jobs = [fixture for _ in range(repeat) for fixture in fixtures]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        latencies = list(pool.map(lambda f: run_fixture(f, contents[f["key"]])[3], jobs))
+    elapsed = time.perf_counter() - start
+    return {
+        "clients": clients,
+        "images": len(jobs),
+        "seconds": round(elapsed, 3),
+        "images_per_second": round(len(jobs) / elapsed, 3) if elapsed > 0 else None,
+        "latency_ms": summarize(latencies),
+    }
+
+
+def peak_rss_mb():
+    """本进程（及已结束子进程）的峰值常驻内存，Linux 下 ru_maxrss 单位为KB"""
+    divisor = 1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / divisor
+    return {"self": round(own, 1), "children": round(children, 1)}
+
+
+def router_pass(fixtures, contents):
+    """文档预判检查：正样例（猪耳标目录）的召回率和负样例（其余目录）的误判率"""
+    positives = [f for f in fixtures if f["pipeline"] == "eartag"]
+    negatives = [f for f in fixtures if f["pipeline"] != "eartag"]
+    routed = {f["key"]: route_document(ImageContext(image_bytes=contents[f["key"]])) == "eartag" for f in fixtures}
+    missed = [f["key"] for f in positives if not routed[f["key"]]]
+    false_positives = [f["key"] for f in negatives if routed[f["key"]]]
+    return {
+        "thresholds": {
+            "doc_white_ratio": document_router_module.ROUTER_DOC_WHITE_RATIO,
+            "tag_color_min": document_router_module.ROUTER_TAG_COLOR_MIN,
+            "tag_color_strong": document_router_module.ROUTER_TAG_COLOR_STRONG,
+        },
+        "positives": len(positives),
+        "recall": round(1.0 - len(missed) / len(positives), 4) if positives else None,
+        "missed": missed,
+        "negatives": len(negatives),
+        "false_positive_rate": round(len(false_positives) / len(negatives), 4) if negatives else None,
+        "false_positives": false_positives,
+    }
+
+
+def compare_with_baseline(report, baseline, tolerance):
+    """与基线报告对比，返回退化项列表"""
+    regressions = []
+    for stage in ("total", "det", "rec"):
+        old = (baseline.get("stages") or {}).get(stage)
+        new = report["stages"].get(stage)
+        if old and new and new["p95"] > old["p95"] * (1.0 + tolerance):
+            regressions.append(f"{stage} p95 {old['p95']}ms -> {new['p95']}ms")
+    old_runs = {run["clients"]: run for run in baseline.get("throughput") or []}
+    for run in report["throughput"]:
+        old = old_runs.get(run["clients"])
+        if old and old.get("images_per_second") and run["images_per_second"] is not None:
+            if run["images_per_second"] < old["images_per_second"] * (1.0 - tolerance):
+                regressions.append(
+                    f"{run['clients']}并发吞吐 {old['images_per_second']} -> {run['images_per_second']} 张/秒"
+                )
+    old_router = baseline.get("router") or {}
+    new_router = report.get("router") or {}
+    if old_router.get("false_positive_rate") is not None and new_router.get("false_positive_rate") is not None:
+        if new_router["false_positive_rate"] > old_router["false_positive_rate"]:
+            regressions.append(f"预判误判率 {old_router['false_positive_rate']} -> {new_router['false_positive_rate']}")
+    old_acc = baseline.get("accuracy") or {}
+    new_acc = report.get("accuracy") or {}
+    if old_acc.get("exact_match") is not None and new_acc.get("exact_match") is not None:
+        if new_acc["exact_match"] < old_acc["exact_match"]:
+            regressions.append(f"准确率 {old_acc['exact_match']} -> {new_acc['exact_match']}")
+    return regressions
+
+
+def read_fixtures(fixtures):
+    contents = {}
+    for fixture in fixtures:
+        with open(fixture["path"], "rb") as f:
+            contents[fixture["key"]] = f.read()
+    return contents
+
+
+def run_benchmark(fixtures, labels, repeat=1, clients=(1, 4), warmup=True):
+    """运行基准测试并返回报告（dict）"""
+    contents = read_fixtures(fixtures)
+
+    engine_names = ["eartag"]
+    if any(fixture["pipeline"] == "general" for fixture in fixtures):
+        engine_names += ["primary", "secondary"]
+        load_service()
+    load_start = time.perf_counter()
+    if warmup:
+        warm_up_ocr_engines(engine_names)
+    else:
+        for name in engine_names:
+            engine_registry.get(name)
+    load_seconds = time.perf_counter() - load_start
+
+    recorder = StageRecorder()
+    instrument_engines(engine_names, recorder)
+
+    stages, results = stage_pass(fixtures, contents, repeat, recorder)
+    throughput = [throughput_pass(fixtures, contents, repeat, n) for n in clients]
+
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "engines": {name: get_engine_params(name) for name in engine_names},
+            "eartag": eartag_settings(),
+        },
+        "fixtures": len(fixtures),
+        "repeat": repeat,
+        "engine_load_seconds": round(load_seconds, 3),
+        "stages": stages,
+        "throughput": throughput,
+        "peak_rss_mb": peak_rss_mb(),
+        "accuracy": score_accuracy(results, labels),
+        "router": router_pass(fixtures, contents),
+        "results": results,
+    }
+
+
+def print_router_summary(router):
+    print(f"📊 文档预判: 召回率={router['recall']} ({router['positives']} 张猪耳标), "
+          f"误判率={router['false_positive_rate']} ({router['negatives']} 张其他文档)", file=sys.stderr)
+    if not router["negatives"]:
+        print("⚠️ 没有负样例，无法统计预判误判率：把身份证/银行卡/截图样例放到 测试/ 的其他子目录", file=sys.stderr)
+    for key in router["false_positives"]:
+        print(f"❌ 误判为猪耳标: {key}", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OCR识别性能基准测试")
+    parser.add_argument("--fixtures", default=FIXTURE_ROOT, help="样例根目录（其下每个子目录为一类样例）")
+    parser.add_argument("--labels", default=os.path.join(FIXTURE_ROOT, "labels.json"), help="标注文件")
+    parser.add_argument("--only", default=None, help="只测试某个子目录，如 猪耳标")
+    parser.add_argument("--repeat", type=int, default=1, help="每张样例的识别轮数")
+    parser.add_argument("--clients", default="1,4", help="吞吐测试的并发客户端数，逗号分隔")
+    parser.add_argument("--no-warmup", action="store_true", help="不预热引擎（首张图片计入模型初始化）")
+    parser.add_argument("--output", default=None, help="JSON报告输出路径（默认输出到标准输出）")
+    parser.add_argument("--baseline", default=None, help="基线JSON报告，出现退化时退出码为1")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的耗时/吞吐波动比例")
+    parser.add_argument("--router-only", action="store_true", help="只检查文档预判的召回率和误判率")
+    parser.add_argument("--eartag-option", action="append", default=[], metavar="KEY=VALUE",
+                        help=f"覆盖耳标识别开关，可重复（{', '.join(EARTAG_OPTIONS)}）")
+    parser.add_argument("--verbose", action="store_true", help="输出识别流程日志")
+    args = parser.parse_args(argv)
+    try:
+        for key, value in parse_eartag_options(args.eartag_option).items():
+            setattr(eartag_ocr, key, value)
+    except ValueError as e:
+        parser.error(str(e))
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.ERROR)
+
+    fixtures = discover_fixtures(args.fixtures)
+    if args.only:
+        fixtures = [f for f in fixtures if f["key"].split("/", 1)[0] == args.only]
+    if not fixtures:
+        parser.error(f"{args.fixtures} 下没有样例图片")
+
+    if args.router_only:
+        with contextlib.redirect_stdout(sys.stderr if args.verbose else open(os.devnull, "w")):
+            router = router_pass(fixtures, read_fixtures(fixtures))
+        print(json.dumps(router, ensure_ascii=False, indent=2))
+        print_router_summary(router)
+        return 0
+
+    clients = [int(n) for n in args.clients.split(",") if n.strip()]
+    # 识别模块的调试输出写到标准输出，改到标准错误，避免混入JSON报告
+    with contextlib.redirect_stdout(sys.stderr if args.verbose else open(os.devnull, "w")):
+        report = run_benchmark(
+            fixtures, load_labels(args.labels), repeat=max(1, args.repeat), clients=clients, warmup=not args.no_warmup
+        )
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare_with_baseline(report, json.load(f), args.tolerance)
+        report["regressions"] = regressions
+        if regressions:
+            exit_code = 1
+
+    text = json.dumps(report, ensure_ascii=False, indent=2, default=float)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+
+    total = report["stages"]["total"]
+    print(f"📊 {report['fixtures']} 张样例, 端到端 p50={total['p50']}ms p95={total['p95']}ms p99={total['p99']}ms",
+          file=sys.stderr)
+    for run in report["throughput"]:
+        print(f"📊 {run['clients']} 并发: {run['images_per_second']} 张/秒", file=sys.stderr)
+    if report["accuracy"]:
+        print(f"📊 准确率: {report['accuracy']}", file=sys.stderr)
+    print_router_summary(report["router"])
+    for item in report.get("regressions", []):
+        print(f"❌ 性能退化: {item}", file=sys.stderr)
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
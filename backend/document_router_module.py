@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+文档类型预判模块 - 独立模块
+在通用OCR之前用缩略图的廉价图像特征（白底占比、耳标常见颜色占比、圆形耳标区域）
+判断是否为猪耳标照片，是则直接进入猪耳标识别流程，省去一次整图通用OCR
+"""
+
+import logging
+
+import cv2
+import numpy as np
+
+from image_context_module import as_context
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+ROUTER_THUMB_SIDE = 320          # 特征计算所用缩略图最长边（与耳标区域检测共用同一金字塔层）
+ROUTER_DOC_WHITE_RATIO = 0.35    # 低饱和高亮（白底）像素占比超过该值视为证件/截图
+ROUTER_TAG_COLOR_MIN = 0.01      # 检测到圆形区域时，耳标颜色像素占比下限
+ROUTER_TAG_COLOR_STRONG = 0.08   # 未检测到圆形区域时，耳标颜色像素占比下限
+
+# 耳标常见颜色（OpenCV HSV，H取值0-180）：黄/橙色、粉红色
+TAG_HUE_RANGES = [(10, 35), (145, 175)]
+TAG_MIN_SATURATION = 100
+TAG_MIN_VALUE = 100
+
+
+class DocumentRouter:
+    """通用OCR之前的文档类型预判"""
+
+    def __init__(self, region_detector=None):
+        """region_detector: 圆形耳标区域检测函数 fn(context) -> [region]，默认使用猪耳标模块的霍夫圆检测"""
+        self.region_detector = region_detector
+
+    def _detect_regions(self, context):
+        if self.region_detector is None:
+            # 延迟导入，避免与猪耳标模块循环依赖
+            from eartag_ocr_module import eartag_ocr
+            return eartag_ocr.detect_tag_regions(context, detectors=["hough"])
+        return self.region_detector(context)
+
+    def image_features(self, context):
+        """计算缩略图上的廉价特征"""
+        thumb = context.resized(ROUTER_THUMB_SIDE)
+        img = thumb.bgr
+        h, w = img.shape[:2]
+        hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+        hue, sat, val = hsv[:, :, 0], hsv[:, :, 1], hsv[:, :, 2]
+        total = float(h * w)
+
+        white_ratio = np.count_nonzero((sat < 40) & (val > 180)) / total
+        colored = (sat >= TAG_MIN_SATURATION) & (val >= TAG_MIN_VALUE)
+        hue_mask = np.zeros_like(colored)
+        for low, high in TAG_HUE_RANGES:
+            hue_mask |= (hue >= low) & (hue <= high)
+        tag_color_ratio = np.count_nonzero(colored & hue_mask) / total
+
+        return {
+            "aspect": max(h, w) / float(min(h, w)),
+            "white_ratio": white_ratio,
+            "tag_color_ratio": tag_color_ratio,
+        }
+
+    def route(self, image):
+        """返回 "eartag"（直接进入猪耳标识别）或 None（走通用OCR后按文本分类）"""
+        try:
+            context = as_context(image)
+            if context.size is None and context.bgr is None:
+                return None
+            features = self.image_features(context)
+            # 白底占比高的是证件或系统截图，需要通用OCR按文本分类
+            if features["white_ratio"] >= ROUTER_DOC_WHITE_RATIO:
+                return None
+
+            has_circle = False
+            if features["tag_color_ratio"] >= ROUTER_TAG_COLOR_MIN:
+                has_circle = bool(self._detect_regions(context))
+
+            is_eartag = has_circle or features["tag_color_ratio"] >= ROUTER_TAG_COLOR_STRONG
+            logger.info(
+                f"🧭 文档预判: 白底={features['white_ratio']:.2f}, 耳标色={features['tag_color_ratio']:.3f}, "
+                f"圆形区域={has_circle} -> {'猪耳标' if is_eartag else '通用'}"
+            )
+            return "eartag" if is_eartag else None
+        except Exception as e:
+            logger.warning(f"⚠️ 文档预判失败，走通用OCR: {e}")
+            return None
+
+
+# 创建全局实例
+document_router = DocumentRouter()
+
+
+def route_document(image):
+    """文档类型预判接口函数"""
+    return document_router.route(image)
@@ -9,27 +9,56 @@ import logging
 import cv2
 import numpy as np
 import re
-from paddleocr import PaddleOCR
+from batch_ocr_module import BatchedOCR
+from ocr_engine_module import lazy_ocr_engine
+from image_context_module import ImageContext, as_context
+from ocr_utils import ensure_bgr, crop_text_region, recognize_crops
+from resolution_module import RESOLUTION_PROFILES, plan_resolution, refine_ocr_result
+from metrics_module import time_stage, timed, EARTAG_LAYER_SECONDS, EXTRACT_SECONDS
 
 # 设置日志
 logger = logging.getLogger(__name__)
 
+# 识别层顺序：原图、基础预处理图、三个旋转角度
+EARTAG_LAYER_ORDER = ["original", "processed", "rotate_90", "rotate_180", "rotate_270"]
+EARTAG_LAYER_NAMES = {
+    "original": "原图识别",
+    "processed": "预处理图像识别",
+    "rotate_90": "旋转90度识别",
+    "rotate_180": "旋转180度识别",
+    "rotate_270": "旋转270度识别",
+}
+# 提前结束：7位和8位号码置信度都达到阈值后不再执行后续识别层
+EARTAG_EARLY_EXIT = True
+EARTAG_EARLY_EXIT_CONFIDENCE = 0.9
+# 方向预测："brute_force" 识别全部旋转角度（默认）；"classifier" 先在缩略图上预测方向，只识别预测出的旋转角度
+EARTAG_ORIENTATION_MODE = "brute_force"
+EARTAG_ORIENTATION_THUMB_SIDE = 960    # 方向预测缩略图最长边
+EARTAG_ORIENTATION_MAX_BOXES = 20      # 参与方向投票的最大文本框数
+EARTAG_ORIENTATION_MIN_RATIO = 0.5     # 票数达到最高票该比例的方向也会被识别
+# 耳标区域优先（默认关闭）：先检测耳标区域，只在裁剪区域上执行各识别层，未找到区域时才整图识别
+EARTAG_ROI_FIRST = False
+EARTAG_ROI_DETECTORS = ["hough", "contour"]   # 霍夫圆检测 / 轮廓圆形度检测（demo_eartag_ocr.py）
+EARTAG_ROI_DETECT_SIDE = 320                  # 区域检测在该尺寸的缩略灰度图上进行（霍夫圆检测耗时随分辨率急剧增长）
+EARTAG_ROI_MAX_REGIONS = 4
+# 仅识别重打分（默认关闭）：每张图只检测一次文本框，预处理层和旋转层把文本框映射到各自的变换后裁剪，
+# 合并为一次仅识别（det=False）调用；未检测到文本框时退回逐层完整检测+识别
+EARTAG_RESCORE = False
+
 class EartagOCR:
     """猪耳标OCR识别类"""
     
-    def __init__(self):
+    def __init__(self, layer_order=None, early_exit=EARTAG_EARLY_EXIT, early_exit_confidence=EARTAG_EARLY_EXIT_CONFIDENCE,
+                 orientation_mode=EARTAG_ORIENTATION_MODE, roi_first=EARTAG_ROI_FIRST, rescore=EARTAG_RESCORE):
         """初始化OCR引擎 - 基于demo_eartag_ocr.py的优化参数"""
-        self.ocr = PaddleOCR(
-            use_angle_cls=True,      # 文本方向分类
-            lang='ch',               # 中文+数字
-            use_gpu=False,           # CPU 模式
-            det_db_thresh=0.05,      # 进一步降低检测阈值，提高检测敏感度
-            det_db_box_thresh=0.2,   # 进一步降低框阈值
-            det_db_unclip_ratio=3.0, # 进一步增加未裁剪比例
-            drop_score=0.05,         # 进一步降低置信度阈值
-            max_text_length=50,      # 增加最大文本长度
-            show_log=False
-        )
+        # 通过批处理包装，多个并发请求的同一层识别可合并为一次调用；模型在首次识别（或启动预热）时才加载
+        self.ocr = BatchedOCR(lazy_ocr_engine("eartag"), name="eartag")
+        self.layer_order = list(layer_order or EARTAG_LAYER_ORDER)
+        self.early_exit = early_exit
+        self.early_exit_confidence = early_exit_confidence
+        self.orientation_mode = orientation_mode
+        self.roi_first = roi_first
+        self.rescore = rescore
     
     def is_valid_eartag_number(self, text):
         """判断是否为有效的耳标数字（基于demo_eartag_ocr.py的验证逻辑）"""
@@ -79,60 +108,143 @@ class EartagOCR:
         numbers = re.findall(r'\d{4,}', text)
         return numbers
     
-    def extract_circular_rois(self, img):
-        """检测并提取圆形耳标区域，返回裁剪后的ROI列表。
-        优先只对这些圆形区域进行OCR，过滤其他区域干扰。
+    def _hough_circles(self, gray):
+        """在灰度图上做霍夫圆检测，返回半径最大的最多3个圆 [(cx, cy, r)]"""
+        blur = cv2.GaussianBlur(gray, (7, 7), 1.5)
+        h, w = gray.shape[:2]
+        # Hough 圆检测 - 简化参数以提高性能
+        param_sets = [
+            (1.2, 50, 60, 20),  # 只保留一组参数
+        ]
+        for dp, minDist, param1, param2 in param_sets:
+            circles = cv2.HoughCircles(
+                blur,
+                cv2.HOUGH_GRADIENT,
+                dp=dp,
+                minDist=min(h, w) // 8,
+                param1=param1,
+                param2=param2,
+                minRadius=min(h, w) // 12,
+                maxRadius=min(h, w) // 2,
+            )
+            if circles is not None:
+                circles = np.uint16(np.around(circles))
+                # 只保留最多3个半径较大的圆以避免超时
+                sorted_circles = sorted(circles[0, :], key=lambda x: x[2], reverse=True)[:3]
+                return [(int(c[0]), int(c[1]), int(c[2])) for c in sorted_circles]
+        return []
+    
+    def _contour_regions(self, context, min_area=1000):
+        """轮廓圆形度检测（demo_eartag_ocr.detect_eartag_regions），返回 [(x, y, w, h)]"""
+        enhanced = context.clahe(4.0, (8, 8))
+        edges = cv2.Canny(enhanced, 50, 150)
+        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        regions = []
+        for contour in contours:
+            area = cv2.contourArea(contour)
+            if area > min_area:  # 过滤太小的区域
+                perimeter = cv2.arcLength(contour, True)
+                if perimeter > 0:
+                    circularity = 4 * np.pi * area / (perimeter * perimeter)
+                    if circularity > 0.5:  # 圆形度阈值
+                        regions.append((area, cv2.boundingRect(contour)))
+        regions.sort(key=lambda x: x[0], reverse=True)
+        return [rect for area, rect in regions[:3]]
+    
+    def detect_tag_regions(self, img, detectors=None):
+        """检测可能的耳标区域，返回原图坐标 [(x1, y1, x2, y2, circle)]，circle 为 (cx, cy, r) 或 None
+
+        img: numpy 数组或 ImageContext
         """
         try:
-            if img is None:
+            context = as_context(img)
+            detectors = detectors or EARTAG_ROI_DETECTORS
+            # 在缩略灰度图上检测，再映射回原图坐标（整图未解码时缩略图来自JPEG缩小解码）
+            small = context.resized(EARTAG_ROI_DETECT_SIDE)
+            if small.bgr is None or context.size is None:
                 return []
-            # 转灰度与降噪
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if len(img.shape) == 3 else img.copy()
-            blur = cv2.GaussianBlur(gray, (7, 7), 1.5)
-            # Hough 圆检测 - 简化参数以提高性能
-            param_sets = [
-                (1.2, 50, 60, 20),  # 只保留一组参数
-            ]
-            rois = []
-            h, w = gray.shape[:2]
-            for dp, minDist, param1, param2 in param_sets:
-                circles = cv2.HoughCircles(
-                    blur,
-                    cv2.HOUGH_GRADIENT,
-                    dp=dp,
-                    minDist=min(h, w) // 8,
-                    param1=param1,
-                    param2=param2,
-                    minRadius=min(h, w) // 12,
-                    maxRadius=min(h, w) // 2,
-                )
-                if circles is not None:
-                    circles = np.uint16(np.around(circles))
-                    # 只保留最多3个半径较大的圆以避免超时
-                    sorted_circles = sorted(circles[0, :], key=lambda x: x[2], reverse=True)[:3]
-                    for c in sorted_circles:
-                        cx, cy, r = int(c[0]), int(c[1]), int(c[2])
-                        # 创建圆形掩膜
-                        mask = np.zeros_like(gray)
-                        cv2.circle(mask, (cx, cy), r, 255, -1)
-                        masked = cv2.bitwise_and(img, img, mask=mask)
-                        # 以圆为中心裁剪正方形ROI，带边距
-                        margin = int(r * 0.2)
-                        x1 = max(0, cx - r - margin)
-                        y1 = max(0, cy - r - margin)
-                        x2 = min(w, cx + r + margin)
-                        y2 = min(h, cy + r + margin)
-                        roi = masked[y1:y2, x1:x2]
-                        # 过滤极小区域
-                        if roi is not None and roi.size > 0 and roi.shape[0] > 20 and roi.shape[1] > 20:
-                            rois.append(roi)
-                if rois:
+            w, h = context.size
+            scale = small.scale / context.scale
+            gray = small.gray
+            
+            regions = []
+            if "hough" in detectors:
+                for cx, cy, r in self._hough_circles(gray):
+                    cx, cy, r = int(cx / scale), int(cy / scale), int(r / scale)
+                    # 以圆为中心裁剪正方形ROI，带边距
+                    margin = int(r * 0.2)
+                    regions.append((max(0, cx - r - margin), max(0, cy - r - margin),
+                                    min(w, cx + r + margin), min(h, cy + r + margin), (cx, cy, r)))
+            if "contour" in detectors:
+                for x, y, rw, rh in self._contour_regions(small, min_area=1000 * scale * scale):
+                    # 扩大边界框以包含完整区域
+                    margin = 20
+                    x1 = max(0, int(x / scale) - margin)
+                    y1 = max(0, int(y / scale) - margin)
+                    x2 = min(w, int((x + rw) / scale) + margin)
+                    y2 = min(h, int((y + rh) / scale) + margin)
+                    regions.append((x1, y1, x2, y2, None))
+            
+            # 过滤极小区域（与霍夫圆最小半径一致），并去掉与已选区域高度重叠的区域
+            min_side = max(20, min(h, w) // 12)
+            selected = []
+            for region in sorted(regions, key=lambda r: (r[2] - r[0]) * (r[3] - r[1]), reverse=True):
+                x1, y1, x2, y2, _ = region
+                if x2 - x1 <= min_side or y2 - y1 <= min_side:
+                    continue
+                if any(self._overlap_ratio(region, other) > 0.5 for other in selected):
+                    continue
+                selected.append(region)
+                if len(selected) >= EARTAG_ROI_MAX_REGIONS:
                     break
-            return rois
+            return selected
         except Exception as e:
-            logger.error(f"圆形ROI提取错误: {e}")
+            logger.error(f"耳标区域检测错误: {e}")
             return []
     
+    @staticmethod
+    def _overlap_ratio(a, b):
+        """两个矩形的交集占较小矩形面积的比例"""
+        ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+        iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+        smaller = min((a[2] - a[0]) * (a[3] - a[1]), (b[2] - b[0]) * (b[3] - b[1]))
+        return ix * iy / float(smaller) if smaller > 0 else 0.0
+    
+    def crop_tag_region(self, img, region):
+        """裁剪耳标区域；圆形区域只在裁剪块内做圆形掩膜，不再分配整图大小的掩膜"""
+        x1, y1, x2, y2, circle = region
+        roi = img[y1:y2, x1:x2]
+        if circle is None:
+            return roi
+        cx, cy, r = circle
+        mask = np.zeros(roi.shape[:2], dtype=np.uint8)
+        cv2.circle(mask, (cx - x1, cy - y1), r, 255, -1)
+        return cv2.bitwise_and(roi, roi, mask=mask)
+    
+    def tag_region_context(self, context, region):
+        """在仍满足区域工作分辨率的JPEG缩小解码层上裁剪耳标区域，返回带原图比例的 ImageContext
+
+        区域在原图中的边长是 eartag_roi 工作分辨率的2倍以上时无需原图细节，
+        在缩小层上裁剪即可，整图不必完整解码
+        """
+        x1, y1, x2, y2, circle = region
+        need = min(1.0, RESOLUTION_PROFILES["eartag_roi"] / float(max(x2 - x1, y2 - y1, 1)))
+        level = context.detail_level(int(np.ceil(max(context.size) * need)))
+        s = level.scale / context.scale
+        if s >= 1.0:
+            return ImageContext(img=self.crop_tag_region(context.bgr, region), scale=context.scale)
+        if circle is not None:
+            circle = (int(circle[0] * s), int(circle[1] * s), max(1, int(circle[2] * s)))
+        scaled = (int(x1 * s), int(y1 * s), int(np.ceil(x2 * s)), int(np.ceil(y2 * s)), circle)
+        return ImageContext(img=self.crop_tag_region(level.bgr, scaled), scale=level.scale)
+    
+    def extract_circular_rois(self, img):
+        """检测并提取圆形耳标区域，返回裁剪后的ROI列表。
+        优先只对这些圆形区域进行OCR，过滤其他区域干扰。
+        """
+        context = as_context(img)
+        return [self.crop_tag_region(context.bgr, region) for region in self.detect_tag_regions(context, detectors=["hough"])]
+    
     def extract_numbers_from_mixed_text(self, text):
         """从混合文本中提取7位和8位数字"""
         import re
@@ -182,13 +294,12 @@ class EartagOCR:
         return processed_numbers
     
     def detect_and_correct_rotation(self, img):
-        """检测并校正图像旋转"""
+        """检测并校正图像旋转（img: numpy 数组或 ImageContext）"""
+        context = as_context(img)
+        img = context.bgr
         try:
-            # 转换为灰度图
-            if len(img.shape) == 3:
-                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            else:
-                gray = img.copy()
+            # 灰度图取自图像上下文
+            gray = context.gray
             
             # 边缘检测
             edges = cv2.Canny(gray, 50, 150, apertureSize=3)
@@ -231,13 +342,15 @@ class EartagOCR:
             return img
     
     def preprocess_image_for_eartag(self, img):
-        """专门针对猪耳标的图像预处理 - 增强版"""
+        """专门针对猪耳标的图像预处理 - 增强版（img: numpy 数组或 ImageContext）"""
+        context = as_context(img)
+        img = context.bgr
         try:
             # 首先进行旋转检测和校正
-            corrected_img = self.detect_and_correct_rotation(img)
+            corrected_img = self.detect_and_correct_rotation(context)
             
-            # 转换为灰度图
-            gray = cv2.cvtColor(corrected_img, cv2.COLOR_BGR2GRAY)
+            # 未校正时直接复用上下文中的灰度图
+            gray = context.gray if corrected_img is img else cv2.cvtColor(corrected_img, cv2.COLOR_BGR2GRAY)
             
             # 多种预处理方案，提高8位数字识别率
             preprocessed_images = []
@@ -326,17 +439,12 @@ class EartagOCR:
         return rotated_images
     
     def enhance_image_for_blur_detection(self, img):
-        """专门针对模糊图像的增强处理"""
+        """专门针对模糊图像的增强处理（img: numpy 数组或 ImageContext）"""
+        context = as_context(img)
+        img = context.bgr
         try:
-            # 转换为灰度图
-            if len(img.shape) == 3:
-                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            else:
-                gray = img.copy()
-            
-            # 1. 应用CLAHE增强对比度（更强）
-            clahe = cv2.createCLAHE(clipLimit=5.0, tileGridSize=(8,8))
-            enhanced = clahe.apply(gray)
+            # 1. 应用CLAHE增强对比度（更强），灰度图和CLAHE结果取自图像上下文
+            enhanced = context.clahe(5.0, (8, 8))
             
             # 2. 高斯模糊去噪
             denoised = cv2.GaussianBlur(enhanced, (3, 3), 0)
@@ -366,85 +474,303 @@ class EartagOCR:
             logger.error(f"模糊图像增强错误: {e}")
             return img
     
-    def enhanced_ocr_image_for_eartag(self, image_bytes):
-        """增强版猪耳标OCR识别 - 基于demo_eartag_ocr.py的多角度策略"""
+    def basic_preprocess_for_eartag(self, img):
+        """基础预处理（demo_eartag_ocr.py的方法）：CLAHE + 去噪 + 自适应二值化 + 开运算"""
+        enhanced = as_context(img).clahe(3.0, (8, 8))
+        denoised = cv2.GaussianBlur(enhanced, (3, 3), 0)
+        binary = cv2.adaptiveThreshold(denoised, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
+        return cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel)
+    
+    def build_layer_image(self, img, layer):
+        """生成指定识别层的输入图像（img: numpy 数组或 ImageContext）"""
+        context = as_context(img)
+        if layer == "original":
+            return context.bgr
+        if layer == "processed":
+            return self.basic_preprocess_for_eartag(context)
+        if layer.startswith("rotate_"):
+            angle = int(layer.split("_", 1)[1])
+            return self.create_rotated_images(context.bgr, [angle])[0]
+        raise ValueError(f"未知的识别层: {layer}")
+    
+    def merge_ocr_lines(self, ocr_result, unique_results, seen_texts):
+        """把一次OCR结果按清理后的文本去重合并到 unique_results"""
+        for result in ocr_result:
+            if result and len(result) > 0:
+                for line in result:
+                    if len(line) >= 2:
+                        text = line[1][0] if isinstance(line[1], (list, tuple)) else str(line[1])
+                        confidence = line[1][1] if isinstance(line[1], (list, tuple)) and len(line[1]) > 1 else 0.5
+                        bbox = line[0] if len(line) > 0 else None
+                        
+                        # 清理文本用于去重
+                        clean_text = ''.join(c for c in text if c.isalnum())
+                        
+                        if clean_text not in seen_texts:
+                            unique_results.append({
+                                "text": text,
+                                "confidence": confidence,
+                                "bbox": bbox
+                            })
+                            seen_texts.add(clean_text)
+    
+    def collect_eartag_candidates(self, texts_with_boxes):
+        """收集有效耳标号码候选并做后处理，返回 [(number, confidence, original)]"""
+        candidates = []
+        for item in texts_with_boxes:
+            text = item["text"]
+            confidence = item.get("confidence", 0.0)
+            clean_text = ''.join(c for c in text if c.isalnum())
+            if self.is_valid_eartag_number(clean_text):
+                candidates.append((clean_text, confidence))
+            elif any(c.isdigit() for c in text):
+                for num in self.extract_eartag_numbers(text):
+                    if self.is_valid_eartag_number(num):
+                        candidates.append((num, confidence))
+        
+        return self.post_process_eartag_numbers(candidates)
+    
+    def has_confident_eartag(self, texts_with_boxes):
+        """判断当前结果中是否已有可信的7位和8位耳标号码（用于提前结束识别层）"""
+        processed = self.collect_eartag_candidates(texts_with_boxes)
+        confident = [num for num, conf, orig in processed if conf >= self.early_exit_confidence]
+        return any(len(num) == 7 for num in confident) and any(len(num) == 8 for num in confident)
+    
+    def has_eartag_candidate(self, texts_with_boxes):
+        """判断结果中是否有置信度达到提前结束阈值的有效耳标号码（用于确认文档预判确为猪耳标）"""
+        processed = self.collect_eartag_candidates(texts_with_boxes)
+        return any(conf >= self.early_exit_confidence for num, conf, orig in processed)
+    
+    def estimate_orientations(self, img, boxes=None):
+        """在缩略图上预测耳标文字方向，返回需要识别的逆时针旋转角度列表（按可能性排序）
+
+        先做一次仅检测（det-only）得到文本框：框的长宽比区分横排/竖排，
+        再用方向分类器判断 0/180 度，竖排文本先逆时针转90度后再判断。
+        无法判断时返回全部角度，退回穷举。
+        boxes: 已在 img 上检测到的文本框，提供时直接在 img 上投票，不再重复检测
+        """
+        all_angles = [0, 90, 180, 270]
         try:
-            # 解码图像
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            if img is None:
-                logger.error("❌ 无法解码图像")
-                return []
+            if boxes is not None:
+                thumb = as_context(img).bgr
+            else:
+                thumb = as_context(img).resized(EARTAG_ORIENTATION_THUMB_SIDE).bgr
+                det_result = self.ocr.ocr(thumb, det=True, rec=False)
+                boxes = det_result[0] if det_result and det_result[0] else []
+            if not boxes:
+                logger.info("🧭 缩略图未检测到文本框，无法预测方向")
+                return all_angles
+            
+            # 取面积最大的若干个文本框参与投票
+            def box_size(box):
+                pts = np.array(box, dtype=np.float32)
+                box_w = max(np.linalg.norm(pts[0] - pts[1]), np.linalg.norm(pts[2] - pts[3]))
+                box_h = max(np.linalg.norm(pts[0] - pts[3]), np.linalg.norm(pts[1] - pts[2]))
+                return box_w, box_h
+            sized = [(box, box_size(box)) for box in boxes]
+            sized = [(box, bw, bh) for box, (bw, bh) in sized if bw >= 4 and bh >= 4]
+            sized.sort(key=lambda x: x[1] * x[2], reverse=True)
+            sized = sized[:EARTAG_ORIENTATION_MAX_BOXES]
+            if not sized:
+                return all_angles
+            
+            crops = [crop_text_region(thumb, box) for box, bw, bh in sized]
+            # 与 crop_text_region 一致：高宽比>=1.5 的竖排框已被逆时针转90度
+            vertical = [bh / bw >= 1.5 for box, bw, bh in sized]
+            
+            classifier = getattr(self.ocr, "text_classifier", None)
+            if classifier is not None:
+                run = getattr(self.ocr, "run_exclusive", None)
+                _, cls_res, _ = run(classifier, crops) if run else classifier(crops)
+            else:
+                cls_res = [("0", 0.5)] * len(crops)
             
-            all_results = []
+            votes = {angle: 0.0 for angle in all_angles}
+            for (box, bw, bh), is_vertical, (label, score) in zip(sized, vertical, cls_res):
+                flipped = str(label) == "180"
+                if is_vertical:
+                    angle = 270 if flipped else 90
+                else:
+                    angle = 180 if flipped else 0
+                votes[angle] += float(score) * bw * bh
             
-            # === 第一层：原图识别 ===
-            logger.info("🐷 【第一层】原图识别...")
-            try:
-                result_original = self.ocr.ocr(img, det=True, rec=True)
-                if result_original:
-                    all_results.extend(result_original)
-            except Exception as e:
-                logger.warning(f"原图OCR失败: {e}")
+            best = max(votes.values())
+            if best <= 0:
+                return all_angles
+            ranked = sorted((a for a in all_angles if votes[a] >= best * EARTAG_ORIENTATION_MIN_RATIO),
+                            key=lambda a: votes[a], reverse=True)
+            logger.info(f"🧭 方向预测: {ranked} (票数: { {a: round(v, 1) for a, v in votes.items()} })")
+            return ranked
             
-            # === 第二层：预处理图像识别 ===
-            logger.info("🐷 【第二层】预处理图像识别...")
-            try:
-                # 使用demo_eartag_ocr.py的预处理方法
-                gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-                clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8,8))
-                enhanced = clahe.apply(gray)
-                denoised = cv2.GaussianBlur(enhanced, (3, 3), 0)
-                binary = cv2.adaptiveThreshold(denoised, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
-                kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
-                cleaned = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel)
-                
-                result_processed = self.ocr.ocr(cleaned, det=True, rec=True)
-                if result_processed:
-                    all_results.extend(result_processed)
-            except Exception as e:
-                logger.warning(f"预处理OCR失败: {e}")
+        except Exception as e:
+            logger.warning(f"方向预测失败，退回全部角度: {e}")
+            return all_angles
+    
+    def _layer_wanted(self, plan, layer, state):
+        """旋转层按方向预测过滤；首次遇到旋转层时才预测方向（结果保存在 state 中）"""
+        if layer.startswith("rotate_") and self.orientation_mode == "classifier":
+            if state.get("angles") is None:
+                with time_stage("eartag_orientation"):
+                    state["angles"] = self.estimate_orientations(plan.context, boxes=state.get("boxes"))
+            if int(layer.split("_", 1)[1]) not in state["angles"]:
+                logger.info(f"🧭 跳过{EARTAG_LAYER_NAMES.get(layer, layer)}（方向预测未命中）")
+                return False
+        return True
+    
+    def _detect_boxes(self, plan):
+        """在工作图像上只做一次文本检测，返回工作图像坐标的文本框"""
+        try:
+            det_result = self.ocr.ocr(plan.image, det=True, rec=False)
+            boxes = det_result[0] if det_result and det_result[0] else []
+            return [np.array(box, dtype=np.float32).tolist() for box in boxes]
+        except Exception as e:
+            logger.warning(f"文本检测失败，退回逐层检测: {e}")
+            return []
+    
+    def _rescore_layer(self, plan, layer, boxes):
+        """仅识别模式：把已检测的文本框映射到该层的变换后批量裁剪识别，返回 PaddleOCR 格式的结果
+
+        各层都在工作图像（或预处理后的工作图像）上裁剪，与检测逐像素对齐；
+        逆时针旋转 k*90 度等价于把文本框四个顶点的起点后移 k 位，无需旋转整图。
+        原图层只对低置信度或过小的文本区域重新识别（优先从已解码的缩小层裁剪），
+        整图因此通常不需要完整解码。
+        """
+        try:
+            if layer == "processed":
+                source = ensure_bgr(self.build_layer_image(plan.context, layer))
+            else:
+                source = plan.image
+            shift = int(layer.split("_", 1)[1]) // 90 if layer.startswith("rotate_") else 0
+            crops = [crop_text_region(source, box[shift:] + box[:shift]) for box in boxes]
+            # 旋转层的裁剪图已是旋转后的方向，不能再经方向分类器翻转
+            rec_results = recognize_crops(self.ocr, crops, cls=not layer.startswith("rotate_"))
+            drop_score = getattr(self.ocr, "drop_score", 0.5)
+            lines = [
+                [box, (rec_res[0], rec_res[1])]
+                for box, rec_res in zip(boxes, rec_results)
+                if rec_res[0] and rec_res[1] >= drop_score
+            ]
+            if layer == "original":
+                return refine_ocr_result(self.ocr, plan, [lines], cls=True)
+            return [[[plan.to_original(box), text_info] for box, text_info in lines]]
+        except Exception as e:
+            logger.warning(f"{EARTAG_LAYER_NAMES.get(layer, layer)}仅识别失败: {e}")
+            return None
+    
+    def _ocr_layer(self, plan, layer, boxes=None):
+        """识别单个层，返回 PaddleOCR 格式的结果，失败返回 None
+
+        boxes: 仅识别模式下已检测的文本框（工作图像坐标），为空时做完整检测+识别
+        """
+        with timed(EARTAG_LAYER_SECONDS, layer=layer):
+            if boxes:
+                return self._rescore_layer(plan, layer, boxes)
+            return self._detect_and_recognize_layer(plan, layer)
+    
+    def _detect_and_recognize_layer(self, plan, layer):
+        """完整检测+识别单个层"""
+        try:
+            layer_img = self.build_layer_image(plan.context, layer)
+            result_layer = self.ocr.ocr(layer_img, det=True, rec=True)
+            if result_layer and not layer.startswith("rotate_"):
+                # 旋转层的文本框位于旋转后的坐标系，不做映射
+                adjust = (lambda crop: self.build_layer_image(crop, layer)) if layer != "original" else None
+                result_layer = refine_ocr_result(self.ocr, plan, result_layer, cls=True, adjust=adjust)
+            return result_layer
+        except Exception as e:
+            logger.warning(f"{EARTAG_LAYER_NAMES.get(layer, layer)}OCR失败: {e}")
+            return None
+    
+    def _merge_layer(self, result_layer, index, total, unique_results, seen_texts):
+        """合并一层的结果；7位和8位都已可信时返回 True（跳过剩余识别层）"""
+        if result_layer:
+            self.merge_ocr_lines(result_layer, unique_results, seen_texts)
+        if self.early_exit and self.has_confident_eartag(unique_results):
+            if index < total:
+                logger.info(f"⚡ 第{index}层已得到可信的7位和8位耳标号码，跳过剩余 {total - index} 层")
+            return True
+        return False
+    
+    def run_layers(self, plan, layer_order, unique_results, seen_texts):
+        """对一张图像按层递进识别，结果合并到 unique_results；已得到可信号码时返回 True
+
+        plan: 分辨率规划（resolution_module.ResolutionPlan），各层在其工作图像上识别，
+        非旋转层的文本框映射回原图坐标，低置信度区域从原分辨率图像重新识别。
+        各层共用同一个耳标引擎（引擎锁逐个执行推理），按层顺序识别，方向只在需要旋转层时才估计。
+        仅识别重打分模式下只检测一次，各层把文本框映射到自己的变换后裁剪识别。
+        """
+        total = len(layer_order)
+        state = {}
+        if self.rescore:
+            with timed(EARTAG_LAYER_SECONDS, layer="detect"):
+                state["boxes"] = self._detect_boxes(plan)
+            logger.info(f"🔁 仅识别重打分: 检测到 {len(state['boxes'])} 个文本框，各层只做裁剪识别")
+        for index, layer in enumerate(layer_order, 1):
+            if not self._layer_wanted(plan, layer, state):
+                continue
+            logger.info(f"🐷 【第{index}层】{EARTAG_LAYER_NAMES.get(layer, layer)}...")
+            if self._merge_layer(self._ocr_layer(plan, layer, state.get("boxes")), index, total, unique_results, seen_texts):
+                return True
+        return False
+    
+    def enhanced_ocr_image_for_eartag(self, image_bytes=None, context=None, first_pass=None):
+        """增强版猪耳标OCR识别 - 基于demo_eartag_ocr.py的多角度策略，按层递进识别
+
+        context: 调用方的图像上下文（ImageContext），提供时复用其中已解码的图像和中间结果
+        first_pass: 调用方已对原图得到的识别结果（texts_with_boxes），作为原图层结果直接复用
+        """
+        try:
+            context = context or as_context(image_bytes)
             
-            # === 第三层：多角度旋转识别（demo_eartag_ocr.py的核心优势）===
-            logger.info("🐷 【第三层】多角度旋转识别...")
-            try:
-                rotated_images = self.create_rotated_images(img, [90, 180, 270])
-                
-                for rotated_img in rotated_images:
-                    try:
-                        result_rotated = self.ocr.ocr(rotated_img, det=True, rec=True)
-                        if result_rotated:
-                            all_results.extend(result_rotated)
-                    except Exception as e:
-                        logger.warning(f"旋转图像OCR失败: {e}")
-                
-                logger.info("🐷 多角度旋转识别完成")
-            except Exception as e:
-                logger.warning(f"多角度旋转识别失败: {e}")
+            # 只读文件头判断，整图按各层的工作分辨率缩小解码
+            if context.size is None and context.bgr is None:
+                logger.error("❌ 无法解码图像")
+                return []
             
-            # 处理识别结果
             unique_results = []
             seen_texts = set()
+            layer_order = self.layer_order
+            
+            if first_pass is not None:
+                # 复用首轮结果作为原图层，省去一次完整的检测+识别
+                logger.info(f"🐷 复用首轮识别结果 ({len(first_pass)} 个文本块) 作为原图层")
+                for item in first_pass:
+                    clean_text = ''.join(c for c in item["text"] if c.isalnum())
+                    if clean_text not in seen_texts:
+                        unique_results.append({
+                            "text": item["text"],
+                            "confidence": item.get("confidence", 0.0),
+                            "bbox": item.get("bbox")
+                        })
+                        seen_texts.add(clean_text)
+                layer_order = [layer for layer in layer_order if layer != "original"]
+                if self.early_exit and self.has_confident_eartag(unique_results):
+                    logger.info("⚡ 首轮结果已得到可信的7位和8位耳标号码，跳过全部识别层")
+                    return unique_results
+            
+            if self.roi_first:
+                # 先只在耳标区域上识别，区域很小，检测和各种变换的开销远低于整图
+                with time_stage("eartag_regions"):
+                    regions = self.detect_tag_regions(context)
+                if regions:
+                    logger.info(f"🎯 检测到 {len(regions)} 个耳标区域，优先识别区域")
+                    # unique_results 中可能已有首轮结果的号码，只有区域识别新增了有效号码才算区域识别成功
+                    known_numbers = {num for num, _, _ in self.collect_eartag_candidates(unique_results)}
+                    for region in regions:
+                        roi_plan = plan_resolution(self.tag_region_context(context, region), "eartag_roi", offset=region[:2])
+                        if self.run_layers(roi_plan, self.layer_order, unique_results, seen_texts):
+                            break
+                    roi_numbers = {num for num, _, _ in self.collect_eartag_candidates(unique_results)} - known_numbers
+                    if roi_numbers or self.has_confident_eartag(unique_results):
+                        logger.info(f"✅ 猪耳标区域OCR识别到 {len(unique_results)} 个文本块")
+                        return unique_results
+                    logger.info("🔄 耳标区域未识别到耳标号码，回退整图识别")
+                else:
+                    logger.info("🔄 未检测到耳标区域，整图识别")
             
-            for result in all_results:
-                if result and len(result) > 0:
-                    for line in result:
-                        if len(line) >= 2:
-                            text = line[1][0] if isinstance(line[1], (list, tuple)) else str(line[1])
-                            confidence = line[1][1] if isinstance(line[1], (list, tuple)) and len(line[1]) > 1 else 0.5
-                            bbox = line[0] if len(line) > 0 else None
-                            
-                            # 清理文本用于去重
-                            clean_text = ''.join(c for c in text if c.isalnum())
-                            
-                            if clean_text not in seen_texts:
-                                unique_results.append({
-                                    "text": text,
-                                    "confidence": confidence,
-                                    "bbox": bbox
-                                })
-                                seen_texts.add(clean_text)
+            # 整图在缩小后的工作分辨率上预处理和检测
+            self.run_layers(plan_resolution(context, "eartag"), layer_order, unique_results, seen_texts)
             
             logger.info(f"✅ 猪耳标多角度OCR识别到 {len(unique_results)} 个文本块")
             return unique_results
@@ -644,33 +970,39 @@ class EartagOCR:
         print(f"🔍 DEBUG: 最终结果 - 7位: {result['ear_tag_7digit']}, 8位: {result['ear_tag_8digit']}")
         return result
     
-    def recognize_eartag(self, image_bytes):
-        """猪耳标识别主函数"""
+    def recognize_eartag(self, image_bytes=None, context=None, first_pass=None, with_confidence=False):
+        """猪耳标识别主函数
+
+        with_confidence: 为 True 时返回 (结果, 是否有可信耳标号码)，供文档预判路由确认确为猪耳标；
+        提取结果中的号码可能来自任意7/8位数字（证件号片段、日期等），不能单独作为判断依据
+        """
+        not_found = {
+            "ear_tag_7digit": "未识别",
+            "ear_tag_8digit": "未识别"
+        }
+        confident = False
         try:
             # 执行增强OCR识别
-            texts_with_boxes = self.enhanced_ocr_image_for_eartag(image_bytes)
+            texts_with_boxes = self.enhanced_ocr_image_for_eartag(image_bytes, context=context, first_pass=first_pass)
             
             if not texts_with_boxes:
                 logger.warning("⚠️ 未识别到任何文本")
-                return {
-                    "ear_tag_7digit": "未识别",
-                    "ear_tag_8digit": "未识别"
-                }
-            
-            # 提取耳标数字
-            result = self.extract_pig_ear_tag_enhanced(texts_with_boxes)
-            return result
+                result = not_found
+            else:
+                # 提取耳标数字
+                with timed(EXTRACT_SECONDS, doc_type="eartag"):
+                    result = self.extract_pig_ear_tag_enhanced(texts_with_boxes)
+                confident = self.has_eartag_candidate(texts_with_boxes)
             
         except Exception as e:
             logger.error(f"猪耳标识别错误: {e}")
-            return {
-                "ear_tag_7digit": "未识别",
-                "ear_tag_8digit": "未识别"
-            }
+            result = not_found
+        return (result, confident) if with_confidence else result
 
 # 创建全局实例
 eartag_ocr = EartagOCR()
 
-def recognize_pig_ear_tag(image_bytes):
-    """猪耳标识别接口函数"""
-    return eartag_ocr.recognize_eartag(image_bytes)
+def recognize_pig_ear_tag(image_bytes=None, context=None, first_pass=None, with_confidence=False):
+    """猪耳标识别接口函数（可传入图像上下文和首轮识别结果以避免重复解码和识别）"""
+    return eartag_ocr.recognize_eartag(image_bytes, context=context, first_pass=first_pass,
+                                       with_confidence=with_confidence)
@@ -6,10 +6,19 @@
 
 import logging
 import re
+from layout_module import LayoutIndex
 
 # 设置日志
 logger = logging.getLogger(__name__)
 
+# 预编译的字段模式
+NAME_LABEL_PATTERN = re.compile(r'姓名[：:]?\s*([^\s]+)')
+NAME_LABEL_FALLBACK_PATTERN = re.compile(r'姓名([^\s]+)')
+NAME_AFTER_MING_PATTERN = re.compile(r'名([\u4e00-\u9fa5]{2,4})')
+CHINESE_NAME_PATTERN = re.compile(r'^[\u4e00-\u9fa5]{2,4}$')
+ID_NUMBER_PATTERN = re.compile(r'\b\d{18}\b')
+ID_NUMBER_FALLBACK_PATTERN = re.compile(r'\d{18}')
+
 class IDCardOCR:
     """身份证OCR识别类"""
     
@@ -21,27 +30,35 @@ class IDCardOCR:
         """提取身份证中的关键信息"""
         name = None
         id_number = None
+        layout = LayoutIndex(texts_with_boxes)
         
         # 提取姓名
-        for b in texts_with_boxes:
+        for i, b in enumerate(texts_with_boxes):
             text = b["text"].strip()
             # 姓名通常在"姓名"后面，或者包含中文姓名特征
             if "姓名" in text:
                 # 提取"姓名"后面的内容 - 改进正则表达式
-                name_match = re.search(r'姓名[：:]?\s*([^\s]+)', text)
+                name_match = NAME_LABEL_PATTERN.search(text)
                 if name_match:
                     name = name_match.group(1).strip()
                 else:
                     # 如果没有找到冒号，直接提取"姓名"后面的内容
-                    name_match = re.search(r'姓名([^\s]+)', text)
+                    name_match = NAME_LABEL_FALLBACK_PATTERN.search(text)
                     if name_match:
                         name = name_match.group(1).strip()
+                    elif layout.has_geometry:
+                        # "姓名"单独成块时取同一行右侧（或正下方）的中文姓名块
+                        paired = layout.value_of(
+                            i, lambda j: CHINESE_NAME_PATTERN.match(texts_with_boxes[j]["text"].strip()) is not None
+                        )
+                        if paired is not None:
+                            name = texts_with_boxes[paired]["text"].strip()
             elif "名" in text and len(text) <= 10:
                 # 处理类似"08名杨春兰"的情况
-                name_match = re.search(r'名([\u4e00-\u9fa5]{2,4})', text)
+                name_match = NAME_AFTER_MING_PATTERN.search(text)
                 if name_match:
                     name = name_match.group(1).strip()
-            elif re.match(r'^[\u4e00-\u9fa5]{2,4}$', text) and len(text) <= 4:
+            elif CHINESE_NAME_PATTERN.match(text) and len(text) <= 4:
                 # 纯中文，2-4个字符，可能是姓名
                 if not name:
                     name = text
@@ -50,13 +67,13 @@ class IDCardOCR:
         for b in texts_with_boxes:
             text = b["text"].strip()
             # 查找18位身份证号码 - 改进正则表达式
-            id_match = re.search(r'\b\d{18}\b', text)
+            id_match = ID_NUMBER_PATTERN.search(text)
             if id_match:
                 id_number = id_match.group(0)
                 break
             else:
                 # 如果没有单词边界，直接查找18位数字
-                id_match = re.search(r'\d{18}', text)
+                id_match = ID_NUMBER_FALLBACK_PATTERN.search(text)
                 if id_match:
                     id_number = id_match.group(0)
                     break
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+"""
+图像上下文模块 - 独立模块
+一张上传图片在预处理、分类、提取各阶段共用的上下文：
+按需解码并缓存BGR图像、灰度图、缩小后的金字塔层和CLAHE增强结果，
+避免各模块重复解码整图和重复做颜色转换；
+整图尚未解码时，金字塔层按文件头中的尺寸选择JPEG的缩小解码（1/2、1/4、1/8），
+只有需要原分辨率细节时才完整解码
+"""
+
+import hashlib
+import logging
+import struct
+import threading
+
+import cv2
+import numpy as np
+
+from metrics_module import time_stage
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+# JPEG 在DCT域缩小解码的比例及对应的 imdecode 标志
+REDUCED_DECODE_FLAGS = [
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+]
+
+
+class ImageContext:
+    """单张图像的惰性计算上下文（线程安全）"""
+
+    def __init__(self, image_bytes=None, img=None, scale=1.0):
+        """image_bytes: 上传的图片字节；img: 已解码的图像（BGR或灰度）
+        scale: 相对原图的缩放比例（金字塔层使用）
+        """
+        self.image_bytes = image_bytes
+        self.scale = scale
+        self._img = img
+        self._decoded = img is not None
+        self._lock = threading.RLock()
+        self._memo = {}
+
+    def _cached(self, key, compute):
+        with self._lock:
+            if key not in self._memo:
+                self._memo[key] = compute()
+            return self._memo[key]
+
+    @property
+    def digest(self):
+        """图片字节的内容哈希（无字节时为 None）"""
+        if self.image_bytes is None:
+            return None
+        return self._cached("digest", lambda: hashlib.sha256(self.image_bytes).hexdigest())
+
+    @property
+    def bgr(self):
+        """解码后的图像，解码失败为 None"""
+        with self._lock:
+            if not self._decoded:
+                self._decoded = True
+                try:
+                    nparr = np.frombuffer(self.image_bytes, np.uint8)
+                    with time_stage("decode"):
+                        self._img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+                except Exception as e:
+                    logger.error(f"图像解码错误: {e}")
+                    self._img = None
+            return self._img
+
+    @property
+    def shape(self):
+        img = self.bgr
+        return img.shape if img is not None else None
+
+    @property
+    def size(self):
+        """原图宽高 (width, height)，不触发完整解码：
+        已解码时取实际尺寸，否则读文件头（有缩小解码层时按其方向校正横竖）；无法得到时为 None
+        """
+        with self._lock:
+            if self._decoded:
+                return (self._img.shape[1], self._img.shape[0]) if self._img is not None else None
+            reduced = [(key[1], img) for key, img in self._memo.items()
+                       if isinstance(key, tuple) and key[0] == "reduced" and img is not None]
+        header = probe_image_size(self.image_bytes) if self.image_bytes is not None else None
+        if header and reduced:
+            # 文件头中的尺寸未应用 EXIF 方向，横竖以（已应用方向的）缩小解码结果为准
+            img = reduced[0][1]
+            long_side, short_side = max(header), min(header)
+            return (long_side, short_side) if img.shape[1] >= img.shape[0] else (short_side, long_side)
+        return header
+
+    def _reduced_decode(self, max_side):
+        """整图尚未解码时，按文件头尺寸选择仍不小于 max_side 的最小JPEG缩小解码，返回 (图像, 缩小比例)；
+        不适用（非JPEG、尺寸未知、已解码或无需缩小）时返回 None
+        """
+        if self._decoded or self.image_bytes is None or self.image_bytes[:2] != b"\xff\xd8":
+            return None
+        size = probe_image_size(self.image_bytes)
+        if size is None:
+            return None
+        for factor, flag in REDUCED_DECODE_FLAGS:
+            if max(size) // factor >= max_side:
+                def compute():
+                    try:
+                        nparr = np.frombuffer(self.image_bytes, np.uint8)
+                        with time_stage("decode_reduced"):
+                            return cv2.imdecode(nparr, flag)
+                    except Exception as e:
+                        logger.warning(f"缩小解码失败，改为完整解码: {e}")
+                        return None
+                img = self._cached(("reduced", factor), compute)
+                return (img, factor) if img is not None else None
+        return None
+
+    @property
+    def gray(self):
+        """灰度图"""
+        def compute():
+            img = self.bgr
+            if img is None:
+                return None
+            return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if len(img.shape) == 3 else img
+        return self._cached("gray", compute)
+
+    def resized(self, max_side):
+        """最长边不超过 max_side 的金字塔层（ImageContext），原图不超过该尺寸时返回自身
+
+        整图尚未解码时优先用JPEG缩小解码得到不小于 max_side 的图像再缩放，不完整解码原图
+        """
+        if not max_side:
+            return self
+        size = self.size
+        if size is None:
+            # 文件头无法识别：完整解码后再判断
+            img = self.bgr
+            if img is None:
+                return self
+            size = (img.shape[1], img.shape[0])
+        full_side = max(size)
+        if full_side <= max_side:
+            return self
+
+        def compute():
+            reduced = self._reduced_decode(max_side)
+            source = reduced[0] if reduced else self.bgr
+            if source is None:
+                return None
+            h, w = source.shape[:2]
+            scale = max_side / float(max(h, w))
+            if scale < 1.0:
+                target = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+                small = cv2.resize(source, target, interpolation=cv2.INTER_AREA)
+            else:
+                small = source
+            return ImageContext(img=small, scale=self.scale * max(small.shape[:2]) / float(full_side))
+        level = self._cached(("resized", max_side), compute)
+        return level if level is not None else self
+
+    def detail_level(self, min_side):
+        """最长边不小于 min_side 的最小JPEG缩小解码层（ImageContext，不再缩放），用于局部裁剪；
+        整图已解码、非JPEG或无法再缩小时返回自身（直接在原图上裁剪比缩放整图更省）
+        """
+        reduced = self._reduced_decode(min_side)
+        if reduced is None:
+            return self
+        img, factor = reduced
+        full_side = max(self.size)
+        return self._cached(("detail", factor),
+                            lambda: ImageContext(img=img, scale=self.scale * max(img.shape[:2]) / float(full_side)))
+
+    def largest_decoded(self):
+        """已解码的最大一层（ImageContext，不触发解码）：整图已解码时为自身，
+        否则为已缓存的最大JPEG缩小解码层；都没有时返回 None
+        """
+        with self._lock:
+            if self._decoded:
+                return self if self._img is not None else None
+            reduced = [(key[1], img) for key, img in self._memo.items()
+                       if isinstance(key, tuple) and key[0] == "reduced" and img is not None]
+        if not reduced:
+            return None
+        factor, img = min(reduced, key=lambda item: item[0])
+        full_side = max(self.size)
+        return self._cached(("detail", factor),
+                            lambda: ImageContext(img=img, scale=self.scale * max(img.shape[:2]) / float(full_side)))
+
+    def clahe(self, clip_limit=3.0, tile_grid_size=(8, 8)):
+        """灰度图的CLAHE增强结果"""
+        def compute():
+            gray = self.gray
+            if gray is None:
+                return None
+            return cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tuple(tile_grid_size)).apply(gray)
+        return self._cached(("clahe", clip_limit, tuple(tile_grid_size)), compute)
+
+
+def as_context(image):
+    """把图片字节、numpy数组或 ImageContext 统一为 ImageContext"""
+    if isinstance(image, ImageContext):
+        return image
+    if isinstance(image, np.ndarray):
+        return ImageContext(img=image)
+    return ImageContext(image_bytes=image)
+
+
+# JPEG 中携带图像尺寸的帧头标记（SOF0-SOF15，除去 DHT/JPG/DAC）
+_JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def probe_image_size(data):
+    """只读取文件头得到图像宽高 (width, height)，不解码像素；无法识别时返回 None
+
+    data: bytes、mmap 等支持切片的缓冲区（支持 JPEG 和 PNG）
+    """
+    try:
+        if data[:8] == b"\x89PNG\r\n\x1a\n":
+            width, height = struct.unpack(">II", data[16:24])
+            return width, height
+        if data[:2] != b"\xff\xd8":
+            return None
+        offset, size = 2, len(data)
+        while offset + 4 <= size:
+            if data[offset] != 0xFF:
+                return None
+            marker = data[offset + 1]
+            if marker == 0xFF:
+                # 填充字节
+                offset += 1
+                continue
+            if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+                offset += 2
+                continue
+            length = struct.unpack(">H", data[offset + 2:offset + 4])[0]
+            if marker in _JPEG_SOF_MARKERS:
+                height, width = struct.unpack(">HH", data[offset + 5:offset + 9])
+                return width, height
+            offset += 2 + length
+        return None
+    except (struct.error, IndexError, TypeError):
+        return None
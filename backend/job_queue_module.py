@@ -0,0 +1,289 @@
+# -*- coding: utf-8 -*-
+"""
+异步识别任务模块 - 独立模块
+大批量上传先落盘并立即返回任务ID，由有界队列中的后台协程逐个识别；
+队列满时拒绝新任务（由接口返回503），客户端轮询进度或通过本机回调地址接收结果
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import urllib.request
+import uuid
+from urllib.parse import urlparse
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+# 回调地址只允许本机，避免服务被用来向任意地址发请求
+LOCAL_CALLBACK_HOSTS = {"localhost", "127.0.0.1", "::1"}
+# 过期任务的清理间隔（秒），空闲的服务也会按时清理
+CLEANUP_INTERVAL_SECONDS = 600
+
+
+class JobQueueFullError(Exception):
+    """任务队列已满"""
+
+
+class JobFile:
+    """已落盘的上传文件，接口与 Sanic 的上传文件对象一致（name/body）"""
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+
+    @property
+    def body(self):
+        # 识别时才读入内存，排队中的任务不占用内存
+        with open(self.path, "rb") as f:
+            return f.read()
+
+
+class Job:
+    """单个识别任务"""
+
+    def __init__(self, job_id, job_dir, files, callback_url=None, created_at=None):
+        self.job_id = job_id
+        self.job_dir = job_dir
+        self.files = files
+        self.callback_url = callback_url
+        self.created_at = created_at or time.time()
+        self.status = "queued"      # queued / running / done / failed
+        self.error = None
+        self.file_results = [None] * len(files)
+        self.completed = 0
+        self.form = None
+        self.finished_at = None
+
+    def record_file(self, index, file_result):
+        """记录单个文件的识别结果（部分结果）"""
+        self.file_results[index] = {
+            "name": file_result["name"],
+            "doc_type": file_result["doc_type"],
+            "data": file_result["data"],
+        }
+        self.completed += 1
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "error": self.error,
+            "total": len(self.files),
+            "completed": self.completed,
+            "files": [r for r in self.file_results if r is not None],
+            "form": self.form,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class _RejectRedirectHandler(urllib.request.HTTPRedirectHandler):
+    """不跟随重定向：本机回调地址返回的 3xx 可能指向任意地址，绕过回调地址校验"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+# 回调专用的 opener：不跟随重定向（3xx 按失败处理），也不经过环境变量中配置的代理
+_callback_opener = urllib.request.build_opener(urllib.request.ProxyHandler({}), _RejectRedirectHandler)
+
+
+def validate_callback_url(url):
+    """校验回调地址（只允许本机 http/https），不合法时抛出 ValueError"""
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or parsed.hostname not in LOCAL_CALLBACK_HOSTS:
+        raise ValueError("回调地址只允许本机 http(s) 地址")
+    return url
+
+
+class JobManager:
+    """有界队列 + 后台协程的识别任务管理器"""
+
+    def __init__(self, handler, storage_dir="jobs", max_queued=20, workers=1, retention_seconds=24 * 3600,
+                 cleanup_interval=CLEANUP_INTERVAL_SECONDS):
+        """初始化任务管理器（调用 start() 后开始处理）
+
+        handler: async handler(job)，负责识别 job.files 并填充 job 的结果
+        storage_dir: 上传文件和任务状态的落盘目录
+        max_queued: 排队中的最大任务数，超过时拒绝新任务
+        workers: 同时处理的任务数
+        retention_seconds: 已结束任务的保留时间
+        cleanup_interval: 过期任务的定时清理间隔（秒）
+        """
+        self.handler = handler
+        self.storage_dir = storage_dir
+        self.max_queued = max_queued
+        self.workers = max(1, workers)
+        self.retention_seconds = retention_seconds
+        self.cleanup_interval = cleanup_interval
+        self.jobs = {}
+        self._queue = None
+        self._tasks = []
+
+    def start(self):
+        """在当前事件循环中启动后台协程，并恢复上次未完成的任务"""
+        os.makedirs(self.storage_dir, exist_ok=True)
+        self._queue = asyncio.Queue(maxsize=self.max_queued)
+        self._restore_jobs()
+        self._cleanup_expired()
+        self._tasks = [asyncio.ensure_future(self._worker_loop()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.ensure_future(self._cleanup_loop()))
+        logger.info(f"✅ 识别任务队列已启动: {self.workers} 个处理协程, 最多排队 {self.max_queued} 个任务")
+
+    async def stop(self):
+        """停止后台协程（未完成的任务保留在磁盘上，下次启动时恢复）"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, uploads, callback_url=None):
+        """提交任务：uploads 为 [(文件名, 字节或已落盘的上传文件)]，落盘后入队并返回 Job
+
+        已落盘的上传文件（带 path 属性）直接移动到任务目录，不经过内存
+
+        队列已满时抛出 JobQueueFullError
+        """
+        if self._queue is None:
+            raise RuntimeError("识别任务队列未启动")
+        if self._queue.full():
+            raise JobQueueFullError("识别任务队列已满")
+        self._cleanup_expired()
+
+        job_id = uuid.uuid4().hex
+        job_dir = os.path.join(self.storage_dir, job_id)
+        os.makedirs(job_dir)
+        files = []
+        for index, (name, body) in enumerate(uploads):
+            safe_name = re.sub(r'[^\w.\-]', '_', os.path.basename(name or "")) or "upload"
+            path = os.path.join(job_dir, f"{index:03d}_{safe_name}")
+            if isinstance(body, (bytes, bytearray)):
+                with open(path, "wb") as f:
+                    f.write(body)
+            else:
+                shutil.move(body.path, path)
+            files.append(JobFile(name, path))
+
+        job = Job(job_id, job_dir, files, callback_url=callback_url)
+        self._save(job)
+        self.jobs[job_id] = job
+        self._queue.put_nowait(job)
+        logger.info(f"📥 识别任务 {job_id} 已入队: {len(files)} 个文件")
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def queued_count(self):
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _worker_loop(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run_job(job)
+            finally:
+                self._queue.task_done()
+
+    async def _cleanup_loop(self):
+        """定时清理过期任务（不依赖新任务提交）"""
+        while True:
+            await asyncio.sleep(self.cleanup_interval)
+            self._cleanup_expired()
+
+    async def _run_job(self, job):
+        job.status = "running"
+        self._save(job)
+        logger.info(f"🚀 开始处理识别任务 {job.job_id}")
+        try:
+            await self.handler(job)
+            job.status = "done"
+        except asyncio.CancelledError:
+            # 服务停止：保留为排队状态，下次启动时重新处理
+            job.status = "queued"
+            self._save(job)
+            raise
+        except Exception as e:
+            logger.error(f"❌ 识别任务 {job.job_id} 失败: {e}")
+            job.status = "failed"
+            job.error = str(e)
+        job.finished_at = time.time()
+        self._save(job)
+        logger.info(f"✅ 识别任务 {job.job_id} 结束: {job.status}")
+        self._cleanup_expired()
+        if job.callback_url:
+            await asyncio.get_event_loop().run_in_executor(None, self._send_callback, job)
+
+    def _send_callback(self, job):
+        try:
+            data = json.dumps(job.to_dict(), ensure_ascii=False, default=float).encode("utf-8")
+            req = urllib.request.Request(
+                job.callback_url, data=data, headers={"Content-Type": "application/json"}, method="POST"
+            )
+            with _callback_opener.open(req, timeout=10):
+                pass
+        except Exception as e:
+            logger.warning(f"⚠️ 识别任务 {job.job_id} 回调失败: {e}")
+
+    def _meta_path(self, job):
+        return os.path.join(job.job_dir, "job.json")
+
+    def _save(self, job):
+        """任务状态落盘（先写临时文件再改名）"""
+        meta = job.to_dict()
+        meta["file_results"] = job.file_results
+        meta["uploads"] = [{"name": f.name, "path": os.path.basename(f.path)} for f in job.files]
+        meta["callback_url"] = job.callback_url
+        tmp_path = self._meta_path(job) + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False, default=float)
+            os.replace(tmp_path, self._meta_path(job))
+        except OSError as e:
+            logger.warning(f"⚠️ 识别任务 {job.job_id} 状态保存失败: {e}")
+
+    def _restore_jobs(self):
+        """加载磁盘上的任务：已结束的只恢复状态，未完成的重新入队"""
+        for job_id in sorted(os.listdir(self.storage_dir)):
+            job_dir = os.path.join(self.storage_dir, job_id)
+            meta_path = os.path.join(job_dir, "job.json")
+            if not os.path.isfile(meta_path):
+                continue
+            try:
+                with open(meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"⚠️ 跳过无法读取的识别任务 {job_id}: {e}")
+                continue
+            files = [JobFile(u["name"], os.path.join(job_dir, u["path"])) for u in meta.get("uploads", [])]
+            job = Job(job_id, job_dir, files, callback_url=meta.get("callback_url"), created_at=meta.get("created_at"))
+            self.jobs[job_id] = job
+            if meta.get("status") in ("done", "failed"):
+                job.status = meta["status"]
+                job.error = meta.get("error")
+                job.file_results = meta.get("file_results") or job.file_results
+                job.completed = meta.get("completed", 0)
+                job.form = meta.get("form")
+                job.finished_at = meta.get("finished_at")
+                continue
+            try:
+                self._queue.put_nowait(job)
+                logger.info(f"🔄 恢复未完成的识别任务 {job_id}")
+            except asyncio.QueueFull:
+                job.status = "failed"
+                job.error = "服务重启后任务队列已满"
+                job.finished_at = time.time()
+                self._save(job)
+
+    def _cleanup_expired(self):
+        """删除超过保留时间的已结束任务（提交新任务、任务结束和定时清理时调用）"""
+        now = time.time()
+        for job_id, job in list(self.jobs.items()):
+            if job.finished_at and now - job.finished_at > self.retention_seconds:
+                shutil.rmtree(job.job_dir, ignore_errors=True)
+                del self.jobs[job_id]
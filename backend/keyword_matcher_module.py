@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+多关键词匹配模块 - 独立模块
+Aho–Corasick 自动机：预编译一组关键词，一次遍历文本找出全部命中（含相互重叠的关键词），
+命中数量之外的开销与关键词表大小无关；对文本块列表匹配时给出每个命中所在的文本块位置
+"""
+
+import bisect
+import logging
+from collections import deque
+from functools import lru_cache
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+
+class KeywordHits:
+    """一组文本块（以分隔符拼接）上的关键词命中结果"""
+
+    def __init__(self):
+        self._blocks = {}     # 关键词 -> 完整位于其中的文本块位置（升序、去重）
+        self._found = set()   # 在拼接文本中出现过的关键词（含跨文本块的命中）
+
+    def _add(self, keyword, block, within_block):
+        self._found.add(keyword)
+        if within_block:
+            positions = self._blocks.setdefault(keyword, [])
+            if not positions or positions[-1] != block:
+                positions.append(block)
+
+    def found(self, *keywords):
+        """拼接文本中是否出现任一关键词（与 `keyword in " ".join(texts)` 一致）"""
+        return any(keyword in self._found for keyword in keywords)
+
+    def blocks(self, *keywords):
+        """包含任一关键词的文本块位置（升序，与逐块 `keyword in text` 一致）"""
+        if len(keywords) == 1:
+            return list(self._blocks.get(keywords[0], ()))
+        merged = set()
+        for keyword in keywords:
+            merged.update(self._blocks.get(keyword, ()))
+        return sorted(merged)
+
+    def first_found(self, rules):
+        """按优先级顺序返回第一个有关键词出现的规则：rules 为 [(结果, 关键词列表)]，都没有时为 None"""
+        for result, keywords in rules:
+            if self.found(*keywords):
+                return result
+        return None
+
+
+class KeywordMatcher:
+    """预编译的 Aho–Corasick 多关键词匹配器"""
+
+    def __init__(self, keywords, ignore_case=True):
+        """keywords: 关键词列表；ignore_case: 忽略大小写（中文不受影响）"""
+        self.ignore_case = ignore_case
+        self.keywords = list(dict.fromkeys(keyword for keyword in keywords if keyword))
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        for keyword in self.keywords:
+            self._insert(keyword)
+        self._link()
+
+    def _normalize(self, text):
+        return text.lower() if self.ignore_case else text
+
+    def _insert(self, keyword):
+        state = 0
+        for ch in self._normalize(keyword):
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append(keyword)
+
+    def _link(self):
+        """按广度优先建立失败指针，并把失败链上的输出合并到各状态"""
+        # 第一层状态的失败指针都指向根
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(ch, 0) if state else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def iter_matches(self, text):
+        """逐个给出命中 (结束位置, 关键词)，结束位置为命中最后一个字符在（规范化后）文本中的下标"""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, ch in enumerate(self._normalize(text)):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for keyword in out[state]:
+                yield i, keyword
+
+    def find(self, text):
+        """文本中出现的全部关键词（集合）"""
+        return {keyword for _, keyword in self.iter_matches(text)}
+
+    def scan(self, texts, separator=" "):
+        """在以 separator 拼接的文本块上一次匹配，返回 KeywordHits（含每个命中所在的文本块位置）
+
+        texts: 文本列表或 texts_with_boxes
+        """
+        texts = [t["text"] if isinstance(t, dict) else t for t in texts]
+        hits = KeywordHits()
+        starts, ends = [], []
+        offset = 0
+        for text in texts:
+            starts.append(offset)
+            offset += len(self._normalize(text))
+            ends.append(offset)
+            offset += len(separator)
+        for end, keyword in self.iter_matches(separator.join(texts)):
+            block = bisect.bisect_right(starts, end - len(self._normalize(keyword)) + 1) - 1
+            # 命中的末尾超出该文本块（落在分隔符或后续文本块中）时只算拼接文本中的命中
+            hits._add(keyword, block, end < ends[block])
+        return hits
+
+
+@lru_cache(maxsize=64)
+def keyword_matcher(keywords, ignore_case=True):
+    """按关键词元组缓存的匹配器（同一组关键词只构建一次自动机）"""
+    return KeywordMatcher(keywords, ignore_case)
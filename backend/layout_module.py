@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+版面索引模块 - 独立模块
+按文本块中心点纵坐标建立有序索引（二分查找），回答"同一行右侧""正下方"等版面查询，
+用于"字段名: 值"这类按位置配对的字段提取；文本块没有坐标时按列表顺序退化为逐行排列
+"""
+
+import bisect
+import logging
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+# 两个文本块中心纵坐标之差不超过 较高者高度 * 该比例 时视为同一行
+SAME_ROW_RATIO = 0.5
+# "下方"查询最多向下查找的距离（文本块高度的倍数）
+BELOW_MAX_ROWS = 3.0
+# 没有坐标时按列表顺序排列的虚拟行高
+VIRTUAL_ROW_HEIGHT = 10.0
+
+
+class LayoutIndex:
+    """一组OCR文本块的版面索引"""
+
+    def __init__(self, texts_with_boxes):
+        """texts_with_boxes: OCR文本块列表（含 center_x/center_y/bbox）"""
+        self.blocks = list(texts_with_boxes)
+        self.has_geometry = bool(self.blocks) and all(
+            isinstance(block, dict) and "center_x" in block and "center_y" in block for block in self.blocks
+        )
+        # 每个文本块的 (x1, y1, x2, y2, center_x, center_y)
+        self.rects = [self._rect(i, block) for i, block in enumerate(self.blocks)]
+        # 典型行高取文本块高度的中位数
+        heights = sorted(rect[3] - rect[1] for rect in self.rects if rect[3] > rect[1])
+        self.row_height = heights[len(heights) // 2] if heights else VIRTUAL_ROW_HEIGHT
+        for i, (x1, y1, x2, y2, cx, cy) in enumerate(self.rects):
+            if y2 <= y1:
+                # 没有文本框的块按典型行高处理
+                self.rects[i] = (x1, cy - self.row_height / 2, x2, cy + self.row_height / 2, cx, cy)
+        # 按中心纵坐标排序的索引
+        self._order = sorted(range(len(self.rects)), key=lambda i: (self.rects[i][5], self.rects[i][4]))
+        self._keys = [self.rects[i][5] for i in self._order]
+        self._max_height = max((rect[3] - rect[1] for rect in self.rects), default=0.0)
+
+    def _rect(self, i, block):
+        if not self.has_geometry:
+            y = i * VIRTUAL_ROW_HEIGHT
+            return (0.0, y - VIRTUAL_ROW_HEIGHT / 2, 0.0, y + VIRTUAL_ROW_HEIGHT / 2, 0.0, y)
+        cx, cy = float(block["center_x"]), float(block["center_y"])
+        bbox = block.get("bbox")
+        try:
+            xs = [float(point[0]) for point in bbox]
+            ys = [float(point[1]) for point in bbox]
+            return (min(xs), min(ys), max(xs), max(ys), cx, cy)
+        except (TypeError, ValueError, IndexError):
+            return (cx, cy, cx, cy, cx, cy)
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def _rows_between(self, low, high):
+        """中心纵坐标在 [low, high] 内的文本块位置（按纵坐标升序）"""
+        start = bisect.bisect_left(self._keys, low)
+        end = bisect.bisect_right(self._keys, high)
+        return self._order[start:end]
+
+    def same_row(self, position):
+        """与指定文本块同一行的其他文本块，按横坐标升序"""
+        x1, y1, x2, y2, cx, cy = self.rects[position]
+        reach = SAME_ROW_RATIO * self._max_height
+        row = []
+        for other in self._rows_between(cy - reach, cy + reach):
+            if other == position:
+                continue
+            o = self.rects[other]
+            if abs(o[5] - cy) <= SAME_ROW_RATIO * max(y2 - y1, o[3] - o[1]):
+                row.append(other)
+        row.sort(key=lambda other: self.rects[other][4])
+        return row
+
+    def right_of(self, position):
+        """同一行中位于指定文本块右侧的文本块，按距离由近到远"""
+        cx = self.rects[position][4]
+        return [other for other in self.same_row(position) if self.rects[other][4] > cx]
+
+    def below(self, position, max_rows=BELOW_MAX_ROWS):
+        """位于指定文本块下方、与其水平方向有重叠的文本块，按距离由近到远"""
+        x1, y1, x2, y2, cx, cy = self.rects[position]
+        height = max(y2 - y1, self.row_height)
+        result = []
+        for other in self._rows_between(cy, cy + height * max_rows):
+            if other == position:
+                continue
+            o = self.rects[other]
+            # 同一行的不算下方
+            if o[5] - cy <= SAME_ROW_RATIO * max(y2 - y1, o[3] - o[1]):
+                continue
+            if not self.has_geometry or (o[0] <= x2 and o[2] >= x1):
+                result.append(other)
+        return result
+
+    def value_of(self, position, accept):
+        """字段名文本块对应的值：同一行右侧优先，其次正下方，取第一个满足 accept(位置) 的文本块"""
+        for other in self.right_of(position):
+            if accept(other):
+                return other
+        for other in self.below(position):
+            if accept(other):
+                return other
+        return None
+
+
+def as_layout(texts_with_boxes):
+    """把 texts_with_boxes 或 LayoutIndex 统一为 LayoutIndex"""
+    if isinstance(texts_with_boxes, LayoutIndex):
+        return texts_with_boxes
+    return LayoutIndex(texts_with_boxes)
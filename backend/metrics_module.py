@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+"""
+运行指标模块 - 独立模块
+进程内的直方图和计数器：识别各阶段用计时区间（time_stage）记录耗时，
+关键分支（次引擎补充、缓存命中等）用计数器记录次数，/metrics 接口按 Prometheus 文本格式输出。
+OCR工作进程中记录的指标在每个任务结束时取出增量（drain），随结果发回主进程合并（merge）
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# 耗时直方图的桶上限（秒），覆盖从毫秒级解码到十秒级整图多层识别
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [(name, value) for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """单调递增计数器"""
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def drain(self):
+        """取出并清零全部计数 {标签值: 增量}"""
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values):
+        """累加其他进程取出的计数"""
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = self._values.get(key, 0) + value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """累积桶直方图（与 Prometheus histogram 语义一致）"""
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}    # 标签值 -> [各桶计数（不累积）, 总和, 总数]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def drain(self):
+        """取出并清零全部序列 {标签值: [各桶计数, 总和, 总数]}"""
+        with self._lock:
+            series, self._series = self._series, {}
+        return series
+
+    def merge(self, series):
+        """累加其他进程取出的序列（桶边界相同）"""
+        with self._lock:
+            for key, (counts, total, count) in series.items():
+                own = self._series.get(key)
+                if own is None:
+                    own = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                own[0] = [a + b for a, b in zip(own[0], counts)]
+                own[1] += total
+                own[2] += count
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, ([*series[0]], series[1], series[2])) for key, series in self._series.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, ('le', bound))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, ('le', '+Inf'))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """指标注册表：同名指标只创建一次"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, help_text, label_names, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, label_names, **kwargs)
+            return metric
+
+    def counter(self, name, help_text, label_names=()):
+        return self._get_or_create(Counter, name, help_text, label_names)
+
+    def histogram(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, label_names, buckets=buckets)
+
+    def drain(self):
+        """取出并清零全部指标的增量 {指标名: 增量}（工作进程发回主进程用，可直接序列化）"""
+        with self._lock:
+            metrics = list(self._metrics.items())
+        deltas = {}
+        for name, metric in metrics:
+            delta = metric.drain()
+            if delta:
+                deltas[name] = delta
+        return deltas
+
+    def merge(self, deltas):
+        """合并其他进程 drain() 取出的增量（只合并本进程已注册的同名指标）"""
+        with self._lock:
+            metrics = dict(self._metrics)
+        for name, delta in (deltas or {}).items():
+            metric = metrics.get(name)
+            if metric is not None:
+                metric.merge(delta)
+
+    def render(self):
+        """Prometheus 文本格式（text/plain; version=0.0.4）"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# 创建全局实例
+metrics = MetricsRegistry()
+
+# 识别流程的公共指标
+STAGE_SECONDS = metrics.histogram(
+    "ocr_stage_seconds", "识别各阶段耗时（秒）", ["stage"]
+)
+DOCUMENT_SECONDS = metrics.histogram(
+    "ocr_document_seconds", "单个文件从接收到提取完成的耗时（秒），按文档类型", ["doc_type"]
+)
+EXTRACT_SECONDS = metrics.histogram(
+    "ocr_extract_seconds", "字段提取耗时（秒），按文档类型", ["doc_type"]
+)
+EARTAG_LAYER_SECONDS = metrics.histogram(
+    "ocr_eartag_layer_seconds", "猪耳标各识别层耗时（秒）", ["layer"]
+)
+SECONDARY_FALLBACKS = metrics.counter(
+    "ocr_secondary_fallback_total", "主引擎结果不足、使用次引擎补充识别的次数", ["mode"]
+)
+CACHE_LOOKUPS = metrics.counter(
+    "ocr_cache_lookups_total", "识别结果缓存查询次数", ["namespace", "result"]
+)
+
+
+@contextmanager
+def timed(histogram, **labels):
+    """计时区间：with timed(EXTRACT_SECONDS, doc_type="id"): ... 结束时（含异常）把耗时记入直方图"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+
+
+def time_stage(stage):
+    """识别阶段计时区间，记入 ocr_stage_seconds{stage=...}"""
+    return timed(STAGE_SECONDS, stage=stage)
+
+
+def drain_metrics():
+    """取出本进程记录的指标增量"""
+    return metrics.drain()
+
+
+def merge_metrics(deltas):
+    """合并工作进程发回的指标增量"""
+    metrics.merge(deltas)
+
+
+def render_metrics():
+    """全部指标的 Prometheus 文本"""
+    return metrics.render()
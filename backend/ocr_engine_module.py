@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+"""
+OCR引擎配置模块 - 独立模块
+集中维护各识别场景的PaddleOCR参数，供主进程和OCR工作进程共同使用；
+引擎注册表按需加载模型并支持启动预热；默认模型参数相同的场景共用一套预测器，
+各场景的阈值写在各自的前后处理对象中，检测/识别/方向分类预测器各自加锁
+"""
+
+import copy
+import logging
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from paddleocr import PaddleOCR
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+# 主引擎：通用文档识别
+PRIMARY_OCR_PARAMS = {
+    "use_angle_cls": False,
+    "lang": "ch",
+    "use_gpu": False,
+    "rec_batch_num": 10,
+    "cpu_threads": 6,
+    "use_mkldnn": True,
+    "det_limit_side_len": 1280,
+    "drop_score": 0.1,
+    "show_log": False,
+}
+
+# 次引擎：主引擎结果不足时的补充识别
+SECONDARY_OCR_PARAMS = {
+    "use_angle_cls": False,
+    "lang": "ch",
+    "use_gpu": False,
+    "rec_batch_num": 10,
+    "cpu_threads": 6,
+    "use_mkldnn": True,
+    "det_limit_side_len": 960,
+    "drop_score": 0.05,
+    "show_log": False,
+}
+
+# 猪耳标引擎：基于demo_eartag_ocr.py的优化参数
+EARTAG_OCR_PARAMS = {
+    "use_angle_cls": True,       # 文本方向分类
+    "lang": "ch",                # 中文+数字
+    "use_gpu": False,            # CPU 模式
+    "det_db_thresh": 0.05,       # 进一步降低检测阈值，提高检测敏感度
+    "det_db_box_thresh": 0.2,    # 进一步降低框阈值
+    "det_db_unclip_ratio": 3.0,  # 进一步增加未裁剪比例
+    "drop_score": 0.05,          # 进一步降低置信度阈值
+    "max_text_length": 50,       # 增加最大文本长度
+    "show_log": False,
+}
+
+OCR_ENGINE_PROFILES = {
+    "primary": PRIMARY_OCR_PARAMS,
+    "secondary": SECONDARY_OCR_PARAMS,
+    "eartag": EARTAG_OCR_PARAMS,
+}
+
+# 模型共享（默认开启）：模型参数相同的场景共用同一套检测/识别/方向分类预测器，模型只加载一次。
+#   - 每个场景持有自己的检测前后处理对象和识别器副本（与共享对象共用底层预测器），
+#     检测缩放上限、DB阈值、识别批大小和结果过滤阈值在创建时写入一次，调用时不改写共享对象；
+#   - 检测、识别、方向分类各有一把锁：同一预测器的推理串行，不同场景可同时使用不同的预测器；
+#     主次引擎共用检测器，推测执行自动关闭（app.SPECULATIVE_OCR_USEFUL）；
+#   - 线程数、MKLDNN等运行时参数取第一个场景的配置，猪耳标不再使用自己的运行时参数
+# 关闭后每个场景各自加载预测器（内存占用约为三倍），主/次/猪耳标引擎可以同时推理
+OCR_SHARE_MODELS = True
+# 决定加载哪套模型的参数，相同则共享预测器
+MODEL_PARAMS = (
+    "lang",
+    "use_gpu",
+    "ocr_version",
+    "det_model_dir",
+    "rec_model_dir",
+    "cls_model_dir",
+)
+# 每次调用时覆盖的参数及未配置时的取值（PaddleOCR 默认值）
+OVERRIDE_DEFAULTS = {
+    "det_limit_side_len": 960,
+    "det_limit_type": "max",
+    "det_db_thresh": 0.3,
+    "det_db_box_thresh": 0.6,
+    "det_db_unclip_ratio": 1.5,
+    "drop_score": 0.5,
+    "rec_batch_num": 6,
+}
+
+# 进程级参数覆盖（例如OCR工作进程按分配到的CPU核数设置 cpu_threads）
+_process_overrides = {}
+
+
+def set_process_overrides(**overrides):
+    """设置当前进程内所有新建引擎的公共参数覆盖"""
+    _process_overrides.update(overrides)
+
+
+def get_engine_params(name, **overrides):
+    """返回指定场景的完整引擎参数"""
+    if name not in OCR_ENGINE_PROFILES:
+        raise KeyError(f"未知的OCR引擎配置: {name}")
+    params = dict(OCR_ENGINE_PROFILES[name])
+    params.update(_process_overrides)
+    params.update(overrides)
+    return params
+
+
+def create_ocr_engine(name, **overrides):
+    """按场景名称创建PaddleOCR实例"""
+    params = get_engine_params(name, **overrides)
+    logger.info(f"🔧 创建OCR引擎 {name} (cpu_threads={params.get('cpu_threads', 'default')})")
+    return PaddleOCR(**params)
+
+
+def _model_key(name, params):
+    """模型键：决定加载哪套模型的参数组合；不共享模型时每个场景独立"""
+    if not OCR_SHARE_MODELS:
+        return (name,)
+    return tuple((k, repr(params.get(k))) for k in MODEL_PARAMS)
+
+
+def get_engine_overrides(name):
+    """场景的调用级参数覆盖（未配置的项取 PaddleOCR 默认值）"""
+    params = get_engine_params(name)
+    return {key: params.get(key, default) for key, default in OVERRIDE_DEFAULTS.items()}
+
+
+class _LockedPredictor:
+    """共享预测器的调用代理：同一预测器的调用经它自己的锁串行，其余属性透传"""
+
+    def __init__(self, predictor, lock):
+        self.predictor = predictor
+        self.lock = lock
+
+    def __getattr__(self, item):
+        if item in ("predictor", "lock"):
+            raise AttributeError(item)
+        return getattr(self.predictor, item)
+
+    def __call__(self, *args, **kwargs):
+        with self.lock:
+            return self.predictor(*args, **kwargs)
+
+
+class SharedOCREngine:
+    """一套已加载的检测/识别/方向分类预测器，供模型参数相同的场景共用
+
+    依赖 PaddleOCR 2.x 的内部结构：text_detector.preprocess_op 中的 DetResizeForTest
+    （limit_side_len/limit_type）、text_detector.postprocess_op（DBPostProcess）
+    和 text_recognizer.rec_batch_num。场景引擎浅拷贝这些对象后写入自己的参数，
+    与共享对象共用底层预测器；预测器不能并发推理，检测/识别/方向分类的调用各自经一把锁串行
+    """
+
+    def __init__(self, params):
+        self.params = params
+        self.engine = PaddleOCR(**params)
+        self.locks = {attr: threading.Lock() for attr in ("text_detector", "text_recognizer", "text_classifier")}
+
+    @property
+    def has_classifier(self):
+        return bool(self.params.get("use_angle_cls"))
+
+    @staticmethod
+    def _resize_op(op, overrides):
+        """检测缩放算子的副本（写入场景的缩放上限），其余算子原样共用"""
+        if not hasattr(op, "limit_side_len"):
+            return op
+        op = copy.copy(op)
+        op.limit_side_len = overrides["det_limit_side_len"]
+        op.limit_type = overrides["det_limit_type"]
+        return op
+
+    def profile_engine(self, overrides, use_cls):
+        """按场景参数创建共用预测器的 PaddleOCR 对象（浅拷贝），之后的调用不再改写任何共享对象"""
+        base = self.engine
+        detector = copy.copy(base.text_detector)
+        detector.preprocess_op = [self._resize_op(op, overrides) for op in base.text_detector.preprocess_op]
+        postprocess = copy.copy(base.text_detector.postprocess_op)
+        postprocess.thresh = overrides["det_db_thresh"]
+        postprocess.box_thresh = overrides["det_db_box_thresh"]
+        postprocess.unclip_ratio = overrides["det_db_unclip_ratio"]
+        detector.postprocess_op = postprocess
+        recognizer = copy.copy(base.text_recognizer)
+        recognizer.rec_batch_num = overrides["rec_batch_num"]
+
+        engine = copy.copy(base)
+        engine.text_detector = _LockedPredictor(detector, self.locks["text_detector"])
+        engine.text_recognizer = _LockedPredictor(recognizer, self.locks["text_recognizer"])
+        engine.use_angle_cls = bool(use_cls and self.has_classifier)
+        engine.text_classifier = (
+            _LockedPredictor(base.text_classifier, self.locks["text_classifier"]) if engine.use_angle_cls else None
+        )
+        engine.drop_score = overrides["drop_score"]
+        return engine
+
+
+class OCRProfileEngine:
+    """场景引擎：共用预测器、持有本场景参数的 PaddleOCR 对象，接口与 PaddleOCR 一致"""
+
+    def __init__(self, shared, name, overrides, use_cls):
+        self.shared = shared
+        self.name = name
+        self.overrides = overrides
+        self.engine = shared.profile_engine(overrides, use_cls)
+        self.use_cls = self.engine.use_angle_cls
+
+    @property
+    def drop_score(self):
+        return self.engine.drop_score
+
+    @property
+    def text_classifier(self):
+        """方向分类器（场景未开启方向分类时为 None）"""
+        return self.engine.text_classifier
+
+    def ocr(self, img, det=True, rec=True, cls=True, **kwargs):
+        return self.engine.ocr(img, det=det, rec=rec, cls=cls and self.use_cls, **kwargs)
+
+
+class _LazyEngine:
+    """引擎代理：第一次使用时才从注册表加载模型"""
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __getattr__(self, item):
+        if item in ("registry", "name"):
+            raise AttributeError(item)
+        return getattr(self.registry.get(self.name), item)
+
+    def ocr(self, img, **kwargs):
+        return self.registry.get(self.name).ocr(img, **kwargs)
+
+
+class OCREngineRegistry:
+    """OCR引擎注册表：按需加载、共享模型、启动预热"""
+
+    def __init__(self):
+        self._engines = {}       # 场景名 -> 引擎
+        self._bases = {}         # 模型键 -> SharedOCREngine
+        self._lock = threading.Lock()
+        self._warmed = set()
+
+    def get(self, name):
+        """返回场景引擎，首次调用时加载（模型参数相同的场景共享已加载的预测器）"""
+        engine = self._engines.get(name)
+        if engine is not None:
+            return engine
+        with self._lock:
+            if name in self._engines:
+                return self._engines[name]
+            params = get_engine_params(name)
+            key = _model_key(name, params)
+            shared = self._bases.get(key)
+            if shared is not None:
+                logger.info(f"🔗 OCR引擎 {name} 共享已加载的模型")
+            else:
+                start = time.time()
+                # 共享时按共用这套模型的全部场景合并加载参数，独立加载时直接用本场景参数
+                shared_params = self._shared_params(key) if OCR_SHARE_MODELS else params
+                logger.info(f"🔧 加载OCR模型 {name} (cpu_threads={shared_params.get('cpu_threads', 'default')})")
+                shared = SharedOCREngine(shared_params)
+                self._bases[key] = shared
+                logger.info(f"✅ OCR引擎 {name} 加载完成 ({time.time() - start:.1f}s)")
+            engine = OCRProfileEngine(shared, name, get_engine_overrides(name), params.get("use_angle_cls", False))
+            self._engines[name] = engine
+            return engine
+
+    @staticmethod
+    def _shared_params(key):
+        """共享同一套模型的所有场景合并后的加载参数：任一场景需要方向分类就加载分类器，
+        运行时参数（线程数、MKLDNN等）按场景配置顺序取第一个配置的值"""
+        profiles = [get_engine_params(name) for name in OCR_ENGINE_PROFILES
+                    if _model_key(name, get_engine_params(name)) == key]
+        params = {}
+        for profile in profiles:
+            for k, v in profile.items():
+                if k not in OVERRIDE_DEFAULTS:
+                    params.setdefault(k, v)
+        params["use_angle_cls"] = any(profile.get("use_angle_cls") for profile in profiles)
+        return params
+
+    def shares_model(self, name_a, name_b):
+        """两个场景是否共享同一套模型（共享时同一预测器的推理串行）"""
+        return _model_key(name_a, get_engine_params(name_a)) == _model_key(name_b, get_engine_params(name_b))
+
+    def lazy(self, name):
+        """返回按需加载的引擎代理"""
+        if name not in OCR_ENGINE_PROFILES:
+            raise KeyError(f"未知的OCR引擎配置: {name}")
+        return _LazyEngine(self, name)
+
+    def warm_up(self, names):
+        """加载并在合成图像上各推理一次，避免首个请求承担模型初始化和MKLDNN预热的开销"""
+        image = _synthetic_text_image()
+        for name in names:
+            if name in self._warmed:
+                continue
+            start = time.time()
+            engine = self.get(name)
+            engine.ocr(image, cls=OCR_ENGINE_PROFILES[name].get("use_angle_cls", False))
+            self._warmed.add(name)
+            logger.info(f"🔥 OCR引擎 {name} 预热完成 ({time.time() - start:.1f}s)")
+
+    def status(self):
+        return {
+            name: ("warm" if name in self._warmed else "loaded" if name in self._engines else "lazy")
+            for name in OCR_ENGINE_PROFILES
+        }
+
+
+def _synthetic_text_image():
+    """预热用的合成图像：白底黑字的数字和英文"""
+    image = np.full((160, 640, 3), 255, dtype=np.uint8)
+    cv2.putText(image, "10900830 ABC", (20, 70), cv2.FONT_HERSHEY_SIMPLEX, 1.6, (0, 0, 0), 3)
+    cv2.putText(image, "1234567", (20, 135), cv2.FONT_HERSHEY_SIMPLEX, 1.6, (0, 0, 0), 3)
+    return image
+
+
+# 创建全局实例
+engine_registry = OCREngineRegistry()
+
+
+def get_ocr_engine(name):
+    """获取场景引擎（首次调用时加载）"""
+    return engine_registry.get(name)
+
+
+def lazy_ocr_engine(name):
+    """获取按需加载的场景引擎代理"""
+    return engine_registry.lazy(name)
+
+
+def warm_up_ocr_engines(names):
+    """加载并预热指定场景的引擎"""
+    engine_registry.warm_up(names)
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+OCR公共工具 - 独立模块
+文本框排序、文本区域裁剪、仅识别（det=False）批量调用等公共函数
+"""
+
+import cv2
+import numpy as np
+
+
+def ensure_bgr(img):
+    """确保图像为3通道BGR（PaddleOCR期望彩色图像）"""
+    if img is not None and len(img.shape) == 2:
+        return cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+    return img
+
+
+def sort_text_boxes(dt_boxes):
+    """按从上到下、从左到右排序文本框（与PaddleOCR内部的sorted_boxes一致）"""
+    boxes = sorted(dt_boxes, key=lambda b: (b[0][1], b[0][0]))
+    for i in range(len(boxes) - 1):
+        for j in range(i, -1, -1):
+            # 同一行（纵坐标相差小于10像素）的文本框按横坐标排序
+            if abs(boxes[j + 1][0][1] - boxes[j][0][1]) < 10 and boxes[j + 1][0][0] < boxes[j][0][0]:
+                boxes[j], boxes[j + 1] = boxes[j + 1], boxes[j]
+            else:
+                break
+    return boxes
+
+
+def crop_text_region(img, box):
+    """按四边形文本框透视裁剪文本区域（与PaddleOCR的get_rotate_crop_image一致）"""
+    points = np.array(box, dtype=np.float32)
+    crop_width = int(max(np.linalg.norm(points[0] - points[1]), np.linalg.norm(points[2] - points[3])))
+    crop_height = int(max(np.linalg.norm(points[0] - points[3]), np.linalg.norm(points[1] - points[2])))
+    crop_width = max(crop_width, 1)
+    crop_height = max(crop_height, 1)
+    pts_std = np.float32([[0, 0], [crop_width, 0], [crop_width, crop_height], [0, crop_height]])
+    matrix = cv2.getPerspectiveTransform(points, pts_std)
+    dst_img = cv2.warpPerspective(
+        img, matrix, (crop_width, crop_height),
+        borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC
+    )
+    # 竖排文本旋转为横排
+    if dst_img.shape[0] * 1.0 / dst_img.shape[1] >= 1.5:
+        dst_img = np.rot90(dst_img)
+    return dst_img
+
+
+def recognize_crops(engine, crops, cls=False):
+    """仅识别模式：一次调用批量识别多个已裁剪的文本区域，返回 [(text, score), ...]"""
+    if not crops:
+        return []
+    # 外层再包一层列表，PaddleOCR才会把所有裁剪图作为同一批送入识别器
+    results = engine.ocr([crops], det=False, rec=True, cls=cls)
+    if not results or not results[0]:
+        return []
+    return list(results[0])
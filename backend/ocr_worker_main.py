@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+OCR工作进程入口 - 独立模块
+由OCR工作池以独立解释器启动（python ocr_worker_main.py ...），只导入OCR引擎和识别模块，
+不会像 multiprocessing 的 spawn 方式那样在子进程中重新导入服务主模块（app.py）；
+推理线程数环境变量由工作池在启动解释器时设置，早于任何 paddle 导入
+"""
+
+import argparse
+import logging
+import os
+import sys
+from multiprocessing.connection import Connection
+
+from metrics_module import drain_metrics
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+
+def worker_main(worker_id, cpu_ids, cpu_threads, conn, warmup_engines=()):
+    """工作进程主循环：绑定CPU、预热引擎（其余引擎按需加载）、循环处理任务
+
+    每条消息为 (状态, 任务ID, 结果, 指标增量)：本进程记录的阶段耗时等指标随消息发回主进程合并
+    """
+    if cpu_ids and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cpu_ids)
+        except OSError:
+            pass
+
+    from ocr_engine_module import get_ocr_engine, set_process_overrides, warm_up_ocr_engines
+    set_process_overrides(cpu_threads=cpu_threads)
+
+    if warmup_engines:
+        warm_up_ocr_engines(warmup_engines)
+    conn.send(("ready", None, None, drain_metrics()))
+
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        task_id, kind, payload = task
+        try:
+            if kind == "ocr":
+                name, img, kwargs = payload
+                result = get_ocr_engine(name).ocr(img, **kwargs)
+            elif kind == "eartag":
+                from eartag_ocr_module import recognize_pig_ear_tag
+                args, kwargs = payload
+                result = recognize_pig_ear_tag(*args, **kwargs)
+            elif kind == "ping":
+                result = "pong"
+            else:
+                raise ValueError(f"未知任务类型: {kind}")
+            conn.send(("done", task_id, result, drain_metrics()))
+        except Exception as e:
+            conn.send(("error", task_id, f"{type(e).__name__}: {e}", drain_metrics()))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="OCR工作进程（由OCR工作池启动）")
+    parser.add_argument("--worker-id", type=int, required=True)
+    parser.add_argument("--fd", type=int, required=True, help="与工作池通信的套接字文件描述符")
+    parser.add_argument("--cpus", default="", help="绑定的CPU核，逗号分隔")
+    parser.add_argument("--threads", type=int, default=1, help="推理线程数")
+    parser.add_argument("--warmup", default="", help="启动时预热的引擎，逗号分隔")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format=f"[ocr-worker-{args.worker_id}] %(levelname)s %(name)s: %(message)s")
+    cpu_ids = [int(cpu) for cpu in args.cpus.split(",") if cpu]
+    warmup_engines = [name for name in args.warmup.split(",") if name]
+    conn = Connection(args.fd)
+    try:
+        worker_main(args.worker_id, cpu_ids, args.threads, conn, warmup_engines)
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+"""
+OCR多进程工作池 - 独立模块
+每个工作进程独占一套OCR引擎和一组CPU核，任务经主进程队列分发给空闲进程，
+带健康检查（进程存活、任务超时）和崩溃自动重启。
+工作进程以独立解释器运行 ocr_worker_main.py，经套接字连接收发任务
+"""
+
+import itertools
+import logging
+import os
+import queue
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import Connection, wait
+
+from metrics_module import merge_metrics
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+
+# 工作进程入口脚本（不导入 app.py）
+WORKER_ENTRY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ocr_worker_main.py")
+# 按工作进程分到的CPU核数设置的推理线程数环境变量（解释器启动前设置，paddle导入时读取）
+THREAD_ENV_VARS = ("OMP_NUM_THREADS", "MKL_NUM_THREADS")
+
+
+class _Task:
+    """主进程侧的任务记录"""
+
+    def __init__(self, task_id, kind, payload):
+        self.task_id = task_id
+        self.kind = kind
+        self.payload = payload
+        self.attempts = 0
+        self.future = Future()
+
+
+class _Worker:
+    """主进程侧的工作进程记录"""
+
+    def __init__(self, worker_id, process, conn):
+        self.worker_id = worker_id
+        self.process = process
+        self.conn = conn
+        self.ready = False
+        self.task = None          # 正在执行的任务
+        self.started_at = None    # 当前任务开始时间
+        self.lost = False         # 连接已断开（进程退出或管道损坏），等待健康检查重启
+
+
+class _WorkerProcess:
+    """工作进程句柄：在 subprocess.Popen 上提供与 multiprocessing.Process 相同的存活检查和终止接口"""
+
+    def __init__(self, popen):
+        self.popen = popen
+        self.pid = popen.pid
+
+    def is_alive(self):
+        return self.popen.poll() is None
+
+    @property
+    def exitcode(self):
+        return self.popen.poll()
+
+    def terminate(self):
+        if self.is_alive():
+            self.popen.terminate()
+
+    def join(self, timeout=None):
+        try:
+            self.popen.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            pass
+
+
+class OCRWorkerPool:
+    """OCR多进程工作池"""
+
+    def __init__(self, num_workers, task_timeout=120.0, health_check_interval=2.0, max_retries=1, warmup_engines=()):
+        """初始化工作池（调用 start() 后才真正启动进程）
+
+        num_workers: 工作进程数
+        warmup_engines: 工作进程启动时预热的引擎，预热完成后进程才报告就绪
+        task_timeout: 单个任务最长执行秒数，超时视为进程卡死并重启
+        health_check_interval: 健康检查间隔秒数
+        max_retries: 工作进程崩溃时任务的最大重试次数
+        """
+        self.num_workers = max(1, num_workers)
+        self.task_timeout = task_timeout
+        self.health_check_interval = health_check_interval
+        self.max_retries = max_retries
+        self.warmup_engines = tuple(warmup_engines)
+
+        # 以独立解释器启动工作进程：不 fork（避免继承已初始化的推理线程），
+        # 也不用 multiprocessing 的 spawn（子进程会重新导入主模块 app.py，在设置线程数之前就导入了 paddle）
+        self._pending = queue.Queue()
+        self._workers = {}
+        self._cond = threading.Condition()
+        self._task_ids = itertools.count()
+        self._running = False
+        self._cpu_plan = self._plan_cpus()
+
+    def _plan_cpus(self):
+        """把可用CPU核平均分给各工作进程"""
+        if hasattr(os, "sched_getaffinity"):
+            cpus = sorted(os.sched_getaffinity(0))
+        else:
+            cpus = list(range(os.cpu_count() or 1))
+        plan = []
+        per_worker = max(1, len(cpus) // self.num_workers)
+        for i in range(self.num_workers):
+            chunk = cpus[i * per_worker:(i + 1) * per_worker] or cpus
+            plan.append(chunk)
+        return plan
+
+    def start(self):
+        """启动所有工作进程和后台线程"""
+        if self._running:
+            return
+        self._running = True
+        for worker_id in range(self.num_workers):
+            self._spawn_worker(worker_id)
+        threading.Thread(target=self._dispatch_tasks, name="ocr-pool-dispatcher", daemon=True).start()
+        threading.Thread(target=self._collect_results, name="ocr-pool-collector", daemon=True).start()
+        threading.Thread(target=self._monitor_workers, name="ocr-pool-monitor", daemon=True).start()
+        logger.info(f"✅ OCR工作池已启动: {self.num_workers} 个进程")
+
+    def _spawn_worker(self, worker_id):
+        cpu_ids = self._cpu_plan[worker_id]
+        parent_sock, child_sock = socket.socketpair()
+        env = dict(os.environ)
+        env.update({name: str(len(cpu_ids)) for name in THREAD_ENV_VARS})
+        try:
+            popen = subprocess.Popen(
+                [
+                    sys.executable, WORKER_ENTRY,
+                    "--worker-id", str(worker_id),
+                    "--fd", str(child_sock.fileno()),
+                    "--cpus", ",".join(str(cpu) for cpu in cpu_ids),
+                    "--threads", str(len(cpu_ids)),
+                    "--warmup", ",".join(self.warmup_engines),
+                ],
+                pass_fds=(child_sock.fileno(),),
+                env=env,
+                cwd=os.path.dirname(WORKER_ENTRY),
+            )
+        finally:
+            child_sock.close()
+        process = _WorkerProcess(popen)
+        parent_conn = Connection(parent_sock.detach())
+        with self._cond:
+            self._workers[worker_id] = _Worker(worker_id, process, parent_conn)
+            self._cond.notify_all()
+        logger.info(f"🔧 OCR工作进程 {worker_id} 已启动 (pid={process.pid}, cpus={cpu_ids})")
+
+    def shutdown(self):
+        """停止所有工作进程"""
+        if not self._running:
+            return
+        self._running = False
+        self._pending.put(None)
+        with self._cond:
+            workers = list(self._workers.values())
+            self._cond.notify_all()
+        for worker in workers:
+            try:
+                worker.conn.send(None)
+            except (OSError, BrokenPipeError):
+                pass
+        for worker in workers:
+            worker.process.join(timeout=5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            if worker.task is not None and not worker.task.future.done():
+                worker.task.future.set_exception(RuntimeError("OCR工作池已关闭"))
+        while True:
+            try:
+                task = self._pending.get_nowait()
+            except queue.Empty:
+                break
+            if task is not None and not task.future.done():
+                task.future.set_exception(RuntimeError("OCR工作池已关闭"))
+        logger.info("🛑 OCR工作池已停止")
+
+    def all_ready(self):
+        """所有工作进程都已完成预热"""
+        with self._cond:
+            return bool(self._workers) and all(w.ready for w in self._workers.values())
+
+    def submit(self, kind, payload):
+        """提交任务，返回 Future"""
+        if not self._running:
+            raise RuntimeError("OCR工作池未启动")
+        task = _Task(next(self._task_ids), kind, payload)
+        self._pending.put(task)
+        return task.future
+
+    def ocr(self, engine_name, img, **kwargs):
+        """在工作进程中执行 engine.ocr，阻塞返回结果"""
+        return self.submit("ocr", (engine_name, img, kwargs)).result()
+
+    def recognize_eartag(self, *args, **kwargs):
+        """在工作进程中执行猪耳标识别，阻塞返回结果"""
+        return self.submit("eartag", (args, kwargs)).result()
+
+    def engine(self, engine_name):
+        """返回接口与 PaddleOCR 一致的引擎代理"""
+        return _PooledEngine(self, engine_name)
+
+    def _idle_worker(self):
+        for worker in self._workers.values():
+            if worker.ready and worker.task is None and worker.process.is_alive():
+                return worker
+        return None
+
+    def _dispatch_tasks(self):
+        """后台线程：把待处理任务逐个交给空闲的工作进程"""
+        while self._running:
+            task = self._pending.get()
+            if task is None:
+                return
+            with self._cond:
+                worker = self._idle_worker()
+                while worker is None and self._running:
+                    self._cond.wait(timeout=1.0)
+                    worker = self._idle_worker()
+                if worker is None:
+                    task.future.set_exception(RuntimeError("OCR工作池已关闭"))
+                    return
+                worker.task = task
+                worker.started_at = time.monotonic()
+            task.attempts += 1
+            try:
+                worker.conn.send((task.task_id, task.kind, task.payload))
+            except (OSError, BrokenPipeError):
+                # 发送失败由健康检查按崩溃处理
+                pass
+
+    def _collect_results(self):
+        """后台线程：接收工作进程消息并完成对应 Future"""
+        while self._running:
+            with self._cond:
+                # 已断开的连接不再等待（否则 wait 会立即返回，收集线程空转）
+                conns = {w.conn: w for w in self._workers.values() if not w.lost and not w.conn.closed}
+            try:
+                ready = wait(list(conns), timeout=1.0)
+            except OSError:
+                # 健康检查恰好关闭了某个连接，下一轮重新取连接
+                continue
+            for conn in ready:
+                worker = conns[conn]
+                try:
+                    status, task_id, payload, deltas = conn.recv()
+                except (EOFError, OSError):
+                    # 进程已退出或管道损坏：标记后由健康检查重启进程并重新分发（或失败）其任务
+                    with self._cond:
+                        worker.lost = True
+                    if self._running:
+                        logger.error(f"❌ OCR工作进程 {worker.worker_id} 连接已断开")
+                    continue
+                # 工作进程中记录的指标合并到本进程，由 /metrics 统一输出
+                merge_metrics(deltas)
+                with self._cond:
+                    if status == "ready":
+                        worker.ready = True
+                        self._cond.notify_all()
+                        logger.info(f"✅ OCR工作进程 {worker.worker_id} 就绪")
+                        continue
+                    task = worker.task
+                    worker.task = None
+                    worker.started_at = None
+                    self._cond.notify_all()
+                if task is None or task.task_id != task_id or task.future.done():
+                    continue
+                if status == "done":
+                    task.future.set_result(payload)
+                else:
+                    task.future.set_exception(RuntimeError(f"OCR工作进程 {worker.worker_id} 任务失败: {payload}"))
+
+    def _monitor_workers(self):
+        """后台线程：健康检查，重启崩溃或卡死的工作进程"""
+        while self._running:
+            time.sleep(self.health_check_interval)
+            now = time.monotonic()
+            with self._cond:
+                workers = list(self._workers.values())
+            for worker in workers:
+                if not self._running:
+                    return
+                hung = worker.started_at is not None and now - worker.started_at > self.task_timeout
+                if worker.process.is_alive() and not hung and not worker.lost:
+                    continue
+                if worker.process.is_alive():
+                    reason = "任务超时" if hung else "连接已断开"
+                    logger.error(f"❌ OCR工作进程 {worker.worker_id} {reason}，强制重启")
+                    worker.process.terminate()
+                    worker.process.join(timeout=5)
+                else:
+                    logger.error(f"❌ OCR工作进程 {worker.worker_id} 已退出 (exitcode={worker.process.exitcode})，重启中")
+                worker.conn.close()
+                self._spawn_worker(worker.worker_id)
+                self._handle_lost_task(worker)
+
+    def _handle_lost_task(self, worker):
+        """处理崩溃进程上正在执行的任务：未超过重试次数则重新分发"""
+        task = worker.task
+        if task is None or task.future.done():
+            return
+        if task.attempts <= self.max_retries:
+            logger.warning(f"⚠️ 任务 {task.task_id} 重新分发 (第 {task.attempts + 1} 次)")
+            self._pending.put(task)
+        else:
+            task.future.set_exception(RuntimeError(f"OCR工作进程 {worker.worker_id} 崩溃，任务 {task.task_id} 失败"))
+
+
+class _PooledEngine:
+    """工作池中某个引擎的代理对象"""
+
+    def __init__(self, pool, name):
+        self.pool = pool
+        self.name = name
+
+    def ocr(self, img, **kwargs):
+        return self.pool.ocr(self.name, img, **kwargs)
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+分辨率规划模块 - 独立模块
+按证件类型为图像选择工作分辨率：预处理和文本检测在缩小后的图像上进行，
+文本框映射回原图坐标，只对低置信度或文字过小的文本区域重新识别：
+优先从已解码的最大金字塔层裁剪，该层上文字仍过小时才完整解码原图
+"""
+
+import logging
+
+import numpy as np
+
+from image_context_module import as_context
+from ocr_utils import ensure_bgr, crop_text_region, recognize_crops
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+# 各场景的工作分辨率（最长边像素），原图不超过该尺寸时不缩放
+RESOLUTION_PROFILES = {
+    "general": 1600,      # 身份证/银行卡/系统截图：主引擎检测边长上限为1280
+    "eartag": 1280,       # 猪耳标整图：检测引擎默认边长上限为960
+    "eartag_roi": 960,    # 猪耳标区域裁剪图
+}
+
+REFINE_CONFIDENCE = 0.85      # 置信度低于该值的文本区域重新识别
+REFINE_MIN_TEXT_HEIGHT = 16   # 工作分辨率下文字高度低于该像素数时重新识别；已解码层上仍低于该值时才完整解码原图
+REFINE_MAX_CROPS = 32         # 单张图片最多重新识别的文本区域数
+
+
+class ResolutionPlan:
+    """一张图像的分辨率规划：工作图像 + 到原图坐标的映射"""
+
+    def __init__(self, context, max_side=None, offset=None):
+        """context: 原分辨率图像的 ImageContext；max_side: 工作图像最长边上限；
+        offset: 原图在更大原图中的左上角坐标（如耳标区域裁剪图）
+        """
+        self.source = context
+        # 工作图像取自上下文的金字塔层（整图未解码时为JPEG缩小解码），灰度图等中间结果在该层上复用
+        self.context = context.resized(max_side)
+        self.image = self.context.bgr
+        self.scale = self.context.scale / context.scale
+        self.offset = tuple(offset) if offset else (0, 0)
+
+    @property
+    def original(self):
+        """source 的原分辨率图像：只在需要从原图裁剪细节时才完整解码"""
+        return self.source.bgr
+
+    def to_local(self, box):
+        """工作图像坐标 -> original 坐标"""
+        return [[point[0] / self.scale, point[1] / self.scale] for point in box]
+
+    def to_original(self, box):
+        """工作图像坐标 -> 最终原图坐标（含 offset）
+
+        context.scale 是相对最终原图的比例，source 本身是缩小层上的裁剪图时同样适用
+        """
+        scale = self.context.scale
+        return [[point[0] / scale + self.offset[0], point[1] / scale + self.offset[1]] for point in box]
+
+
+def plan_resolution(image, profile="general", offset=None):
+    """按场景选择工作分辨率，返回 ResolutionPlan
+
+    image: ImageContext 或 numpy 数组
+    """
+    plan = ResolutionPlan(as_context(image), RESOLUTION_PROFILES.get(profile), offset=offset)
+    if plan.scale < 1.0 and plan.image is not None:
+        w, h = plan.source.size
+        logger.info(f"📐 {profile} 工作分辨率: {w}x{h} -> {plan.image.shape[1]}x{plan.image.shape[0]}")
+    return plan
+
+
+def _box_height(box):
+    points = np.array(box, dtype=np.float32)
+    return max(np.linalg.norm(points[0] - points[3]), np.linalg.norm(points[1] - points[2]))
+
+
+def _refine_crop(plan, box, detail):
+    """裁剪需要重新识别的文本区域（box 为工作图像坐标），返回 (裁剪图, 是否来自完整解码的原图)
+
+    detail: source 已解码的最大一层；其分辨率高于工作图像、且文字在该层上不低于最小高度时从该层裁剪
+    """
+    if detail is not None and detail is not plan.source:
+        ratio = detail.scale / plan.context.scale
+        if ratio > 1.0 and _box_height(box) * ratio >= REFINE_MIN_TEXT_HEIGHT:
+            return crop_text_region(detail.bgr, [[x * ratio, y * ratio] for x, y in box]), False
+    return crop_text_region(plan.original, plan.to_local(box)), True
+
+
+def refine_ocr_result(engine, plan, ocr_result, cls=False, adjust=None):
+    """把工作分辨率下的识别结果映射回原图坐标，并重新识别需要的文本区域
+
+    重新识别优先从已解码的最大金字塔层（通常是工作图像所取的JPEG缩小解码）裁剪，
+    该层上文字仍低于 REFINE_MIN_TEXT_HEIGHT 时才完整解码原图
+
+    ocr_result: PaddleOCR.ocr 在 plan.image 上的返回值
+    adjust: 对原图裁剪区域施加与工作图像相同的预处理（如亮度增强）
+    返回与 PaddleOCR.ocr 相同格式的结果，文本框为原图坐标
+    """
+    if not ocr_result or not ocr_result[0]:
+        return ocr_result
+
+    lines = [line for line in ocr_result[0] if len(line) >= 2]
+    if plan.scale < 1.0:
+        # 只有缩小过的图像才需要从原图重新识别
+        targets = []
+        for index, line in enumerate(lines):
+            text_info = line[1]
+            score = text_info[1] if isinstance(text_info, (list, tuple)) and len(text_info) > 1 else 0.0
+            if score < REFINE_CONFIDENCE or _box_height(line[0]) < REFINE_MIN_TEXT_HEIGHT:
+                targets.append((score, index))
+        targets.sort()
+        targets = targets[:REFINE_MAX_CROPS]
+
+        if targets:
+            try:
+                detail = plan.source.largest_decoded()
+                crops = []
+                full_decoded = 0
+                for _, index in targets:
+                    crop, from_original = _refine_crop(plan, lines[index][0], detail)
+                    full_decoded += from_original
+                    crops.append(ensure_bgr(adjust(crop) if adjust else crop))
+                rec_results = recognize_crops(engine, crops, cls=cls)
+                improved = 0
+                for (score, index), rec_res in zip(targets, rec_results):
+                    text, new_score = rec_res[0], rec_res[1]
+                    if text and new_score > score:
+                        lines[index] = [lines[index][0], (text, new_score)]
+                        improved += 1
+                logger.info(f"🔍 重新识别 {len(targets)} 个文本区域（{full_decoded} 个来自原图），{improved} 个结果更优")
+            except Exception as e:
+                logger.warning(f"⚠️ 原图重新识别失败，保留工作分辨率结果: {e}")
+
+    mapped = [[plan.to_original(line[0]), line[1]] for line in lines]
+    return [mapped]
+
+
+def ocr_with_plan(engine, plan, img=None, cls=True, adjust=None):
+    """在工作图像上检测识别，再映射回原图并按需从原图重新识别
+
+    img: 实际送入检测的图像（plan.image 经过预处理后的版本），默认 plan.image
+    """
+    work_img = plan.image if img is None else img
+    result = engine.ocr(work_img, cls=cls)
+    return refine_ocr_result(engine, plan, result, cls=cls, adjust=adjust)
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+识别结果缓存模块 - 独立模块
+按图片内容哈希 + 引擎参数指纹缓存识别结果：
+内存LRU层按占用字节数淘汰，可选磁盘层在服务重启后仍然有效
+（磁盘层的条目和总字节数记在内存索引中，只在启动时扫描一次目录）
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+
+def _json_default(value):
+    # numpy 数组/标量转换为原生类型
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return float(value)
+
+
+def compute_fingerprint(*parts):
+    """计算引擎/参数配置的指纹（任意可JSON序列化对象）"""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class ResultCache:
+    """内容寻址的识别结果缓存"""
+
+    def __init__(self, max_memory_bytes=64 * 1024 * 1024, disk_dir=None, max_disk_bytes=512 * 1024 * 1024):
+        """初始化缓存
+
+        max_memory_bytes: 内存层最大占用字节数（按结果JSON大小估算）
+        disk_dir: 磁盘层目录，为 None 时不启用磁盘层
+        max_disk_bytes: 磁盘层最大占用字节数
+        """
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()   # key -> (json字符串, 字节数)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._disk_index = OrderedDict()   # key -> 文件字节数，按最近访问排序
+        self._disk_bytes = 0
+        self._disk_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._scan_disk()
+
+    @staticmethod
+    def make_key(namespace, digest, fingerprint):
+        """缓存键：命名空间 + 参数指纹 + 图片内容哈希（见 ImageContext.digest）"""
+        return f"{namespace}-{fingerprint}-{digest}"
+
+    def get(self, key):
+        """读取缓存，未命中返回 None"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return json.loads(entry[0])
+
+        data = self._disk_get(key)
+        with self._lock:
+            if data is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._memory_put(key, data)
+        return json.loads(data)
+
+    def put(self, key, value):
+        """写入缓存（值需可JSON序列化）"""
+        try:
+            data = json.dumps(value, ensure_ascii=False, default=_json_default)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"⚠️ 结果无法缓存: {e}")
+            return
+        with self._lock:
+            self._memory_put(key, data)
+        self._disk_put(key, data)
+
+    def _memory_put(self, key, data):
+        size = len(data.encode("utf-8"))
+        if size > self.max_memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= old[1]
+        self._memory[key] = (data, size)
+        self._memory_bytes += size
+        # 按占用字节数淘汰最久未使用的条目
+        while self._memory_bytes > self.max_memory_bytes and self._memory:
+            _, (_, evicted_size) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _scan_disk(self):
+        """启动时扫描磁盘层目录，按访问时间（旧到新）建立索引并统计总字节数"""
+        entries = []
+        try:
+            for entry in os.scandir(self.disk_dir):
+                if entry.is_file() and entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, entry.name[:-len(".json")], stat.st_size))
+        except OSError as e:
+            logger.warning(f"⚠️ 扫描磁盘缓存失败: {e}")
+        entries.sort()
+        with self._disk_lock:
+            for _, key, size in entries:
+                self._disk_index[key] = size
+                self._disk_bytes += size
+        self._evict_disk()
+        logger.info(f"📦 磁盘缓存: {len(entries)} 个条目, {self._disk_bytes / 1024 / 1024:.1f}MB")
+
+    def _disk_get(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = f.read()
+            # 更新访问时间，重启后重建索引时仍按最近使用排序
+            os.utime(path, None)
+        except FileNotFoundError:
+            # 已被淘汰（或被外部删除）的文件移出索引
+            self._disk_forget(key)
+            return None
+        except OSError as e:
+            logger.warning(f"⚠️ 读取磁盘缓存失败: {e}")
+            return None
+        with self._disk_lock:
+            if key in self._disk_index:
+                self._disk_index.move_to_end(key)
+            else:
+                # 其他进程写入的文件
+                self._disk_index[key] = len(data.encode("utf-8"))
+                self._disk_bytes += self._disk_index[key]
+        return data
+
+    def _disk_forget(self, key):
+        with self._disk_lock:
+            size = self._disk_index.pop(key, None)
+            if size is not None:
+                self._disk_bytes -= size
+
+    def _disk_put(self, key, data):
+        if not self.disk_dir:
+            return
+        try:
+            # 先写临时文件再改名，避免并发读到写了一半的文件
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, self._disk_path(key))
+        except OSError as e:
+            logger.warning(f"⚠️ 写入磁盘缓存失败: {e}")
+            return
+        size = len(data.encode("utf-8"))
+        with self._disk_lock:
+            old = self._disk_index.pop(key, None)
+            if old is not None:
+                self._disk_bytes -= old
+            self._disk_index[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    def _evict_disk(self):
+        """磁盘层超出上限时按索引删除最久未访问的文件（不扫描目录）"""
+        evicted = []
+        with self._disk_lock:
+            while self._disk_bytes > self.max_disk_bytes and self._disk_index:
+                key, size = self._disk_index.popitem(last=False)
+                self._disk_bytes -= size
+                evicted.append(key)
+        for key in evicted:
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                continue
+
+    def stats(self):
+        """缓存统计信息"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "disk_entries": len(self._disk_index),
+                "disk_bytes": self._disk_bytes,
+            }
@@ -4,12 +4,55 @@
 专门用于识别系统截图中的保险相关信息
 """
 
+import bisect
 import logging
 import re
+from layout_module import LayoutIndex
+from text_index_module import TextIndex, as_text_index, first_between
 
 # 设置日志
 logger = logging.getLogger(__name__)
 
+# 预编译的字段模式
+DATE_PATTERN = re.compile(r'(\d{4}-\d{1,2}-\d{1,2})')
+NORMALIZE_DATE_PATTERNS = [
+    re.compile(r"(\d{4})-?(\d{1,2})-?(\d{1,2})"),  # YYYY-MM-DD, YYYYMMDD
+    re.compile(r"(\d{4})年(\d{1,2})月(\d{1,2})日"),  # YYYY年MM月DD日
+    re.compile(r"(\d{4})\.(\d{1,2})\.(\d{1,2})"),   # YYYY.MM.DD
+    re.compile(r"(\d{4})/(\d{1,2})/(\d{1,2})"),     # YYYY/MM/DD
+]
+POLICY_PATTERN = re.compile(r'P[A-Z0-9]{15,}')
+CLAIM_PATTERN = re.compile(r'R[A-Z0-9]+')
+INSURED_PATTERN = re.compile(r'被保险人[：:]\s*([^\s]+)')
+SUBJECT_PATTERN = re.compile(r'保险标的[：:]\s*([^\s]+)')
+LOCATION_PATTERN = re.compile(r'(?:出险地点|出险区域|投保区域)[：:]\s*([^\n]+)')
+ADDRESS_PATTERN = re.compile(r'[省市区县乡村组]')
+METHOD_PATTERN = re.compile(r'(?:查勘方式|处理方式)[：:]\s*([^\s\n]+)')
+LOSS_PATTERN = re.compile(r'(?:估损金额|估计赔款|估损)[：:]\s*([0-9,]+\.?\d*)')
+AMOUNT_PATTERN = re.compile(r'([0-9,]+\.?\d*)')
+CAUSE_PATTERN = re.compile(r'(?:出险原因|事故原因|病因)[：:]\s*([^\n]+)')
+COLON_PATTERN = re.compile(r'[：:]')
+
+# 字段关键词
+LOCATION_KEYWORDS = ("出险地点", "出险区域", "投保区域")
+INSPECTION_KEYWORDS = ("现场查勘", "现场查助", "现汤查勘")   # 后两个是常见的OCR识别错误
+INSPECTION_LABELS = ("查勘方式", "处理方式")
+INSPECTION_METHODS = (("现场", "现场查勘"), ("电话", "电话查勘"), ("视频", "视频查勘"), ("自助", "自助查勘"))
+LOSS_KEYWORDS = ("估损", "估计赔款")   # "估损"已覆盖"估损金额"
+DISEASE_KEYWORDS = ("猪肺疫", "猪瘟", "猪丹毒", "羊快疫", "非传染病")
+CAUSE_KEYWORDS = ("出险原因", "事故原因", "病因")
+
+# 关键词所在行没有值时，向前后相邻行查找的范围
+COVERAGE_DATE_WINDOW = 5
+NEARBY_VALUE_WINDOW = 2
+
+SCREENSHOT_KEYWORDS = (
+    "被保险人", "保险标的", "起保日期", "终保日期", "出险日期",
+    *LOCATION_KEYWORDS, *INSPECTION_KEYWORDS, *INSPECTION_LABELS,
+    *LOSS_KEYWORDS, *DISEASE_KEYWORDS, *CAUSE_KEYWORDS,
+)
+
+
 class ScreenshotOCR:
     """系统截图OCR识别类"""
     
@@ -23,15 +66,8 @@ class ScreenshotOCR:
             return None
         
         # 匹配各种日期格式
-        patterns = [
-            r"(\d{4})-?(\d{1,2})-?(\d{1,2})",  # YYYY-MM-DD, YYYYMMDD
-            r"(\d{4})年(\d{1,2})月(\d{1,2})日",  # YYYY年MM月DD日
-            r"(\d{4})\.(\d{1,2})\.(\d{1,2})",   # YYYY.MM.DD
-            r"(\d{4})/(\d{1,2})/(\d{1,2})",     # YYYY/MM/DD
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, date_str)
+        for pattern in NORMALIZE_DATE_PATTERNS:
+            match = pattern.search(date_str)
             if match:
                 year, month, day = match.groups()
                 yyyy_int = int(year)
@@ -46,55 +82,130 @@ class ScreenshotOCR:
         
         return None
     
-    def find_date_near(self, texts, keyword, window=15):
-        """在关键词附近查找日期"""
-        keyword_positions = []
-        dates = []
-        
-        # 找到所有关键词位置
-        for i, text in enumerate(texts):
-            if keyword in text:
-                keyword_positions.append(i)
-        
-        # 找到所有日期
-        for i, text in enumerate(texts):
-            date_match = re.search(r'\d{4}-\d{1,2}-\d{1,2}', text)
-            if date_match:
-                normalized_date = self.normalize_date_to_yyyy_mm_dd(date_match.group(0))
-                if normalized_date:
-                    dates.append((i, normalized_date))
-        
-        if not keyword_positions or not dates:
+    def find_date_near(self, texts, keyword, window=15, layout=None):
+        """在关键词附近查找日期（texts: 文本列表或 TextIndex）
+
+        有版面索引（layout_module.LayoutIndex）时优先取关键词所在块、同一行右侧或正下方的日期；
+        否则按列表位置，每个关键词位置用二分查找取前后最近的日期，距离相同取靠前的，
+        多个关键词位置时取距离最近的（相同时取靠前的关键词）
+        """
+        index = as_text_index(texts)
+        keyword_positions = index.positions(keyword)
+        if not keyword_positions:
             return None
         
-        # 为每个关键词位置找到最近的日期
-        best_dates = []
-        for kp in keyword_positions:
-            candidates = []
-            for date_pos, date_str in dates:
-                distance = abs(date_pos - kp)
-                if distance <= window:
-                    candidates.append((distance, date_str, date_pos))
-            
-            if candidates:
-                # 按距离排序，选择最近的
-                candidates.sort(key=lambda x: x[0])
-                best_dates.append(candidates[0])
-        
-        if not best_dates:
+        dates = []
+        for i, date_match in index.matches(DATE_PATTERN):
+            normalized_date = self.normalize_date_to_yyyy_mm_dd(date_match.group(0))
+            if normalized_date:
+                dates.append((i, normalized_date))
+        if not dates:
             return None
+        date_positions = [i for i, _ in dates]
         
-        # 如果有多个候选，选择最合理的
-        if len(best_dates) == 1:
-            return best_dates[0][1]
+        if layout is not None:
+            normalized = dict(dates)
+            for kp in keyword_positions:
+                paired = kp if kp in normalized else layout.value_of(kp, lambda j: j in normalized)
+                if paired is not None:
+                    return normalized[paired]
         
-        # 多个候选时，选择距离最近的
-        best_dates.sort(key=lambda x: x[0])
-        return best_dates[0][1]
+        best = None
+        for kp in keyword_positions:
+            right = bisect.bisect_left(date_positions, kp)
+            for candidate in (right - 1, right):
+                if 0 <= candidate < len(dates):
+                    distance = abs(date_positions[candidate] - kp)
+                    if distance <= window and (best is None or distance < best[0]):
+                        best = (distance, dates[candidate][1])
+        return best[1] if best else None
+    
+    def _date_near(self, index, position, layout=None):
+        """关键词行中的日期；没有时取同一行右侧或正下方的日期（有版面索引时），再否则取相邻行中第一个日期"""
+        current = index.match_at(DATE_PATTERN, position)
+        if current:
+            return current.group(1)
+        if layout is not None:
+            paired = layout.value_of(position, lambda j: index.match_at(DATE_PATTERN, j) is not None)
+            if paired is not None:
+                return index.match_at(DATE_PATTERN, paired).group(1)
+        found = index.first_in_window(DATE_PATTERN, position, COVERAGE_DATE_WINDOW, COVERAGE_DATE_WINDOW)
+        return found[1].group(1) if found else None
+    
+    def _first_date_near(self, index, keyword, layout=None):
+        """第一个能找到日期的关键词位置上的日期"""
+        for position in index.positions(keyword):
+            date = self._date_near(index, position, layout)
+            if date:
+                return date
+        return None
+    
+    def _value_or_nearby(self, index, keywords, pattern, accept, nearby, layout=None):
+        """关键词行按 pattern 取值（accept 校验通过的第一个）；都没有时找第一个满足 nearby 的附近行：
+        有版面索引时先找关键词同一行右侧或正下方的块，再按列表位置找相邻行
+
+        返回 (值, 是否来自附近行)，都没有时为 (None, False)
+        """
+        positions = index.positions(*keywords)
+        for position in positions:
+            match = index.match_at(pattern, position)
+            if match and accept(match.group(1).strip()):
+                return match.group(1).strip(), False
+        if layout is not None:
+            for position in positions:
+                paired = layout.value_of(position, lambda j: bool(nearby(index.texts[j])))
+                if paired is not None:
+                    return index.texts[paired], True
+        candidates = [i for i, text in enumerate(index.texts) if nearby(text)] if positions else []
+        for position in positions:
+            found = first_between(candidates, position - NEARBY_VALUE_WINDOW, position + NEARBY_VALUE_WINDOW)
+            if found is not None:
+                return index.texts[found], True
+        return None, False
+    
+    def _inspection_method(self, index):
+        """查勘方式：按文本块顺序取第一个能确定方式的行"""
+        for position in index.positions(*INSPECTION_KEYWORDS, *INSPECTION_LABELS):
+            text = index.texts[position]
+            if any(keyword in text for keyword in INSPECTION_KEYWORDS):
+                return "现场查勘"
+            for keyword, method in INSPECTION_METHODS:
+                if keyword in text:
+                    return method
+            # 尝试提取冒号后的内容
+            method_match = index.match_at(METHOD_PATTERN, position)
+            if method_match:
+                return method_match.group(1).strip()
+        return None
+    
+    def _incident_cause(self, index, layout=None):
+        """出险原因"""
+        # 直接命中具体病因的行、或"出险原因"等后面有内容的行，取最靠前的一个
+        for position in index.positions(*DISEASE_KEYWORDS, *CAUSE_KEYWORDS):
+            text = index.texts[position]
+            if any(keyword in text for keyword in DISEASE_KEYWORDS):
+                return text.strip()
+            cause_match = index.match_at(CAUSE_PATTERN, position)
+            if cause_match:
+                cause = cause_match.group(1).strip()
+                if cause and cause != "未识别":
+                    return cause
+        # 在关键词附近几行查找原因文本
+        cause, _ = self._value_or_nearby(
+            index, CAUSE_KEYWORDS, CAUSE_PATTERN, lambda value: False,
+            lambda text: len(text) > 2 and not COLON_PATTERN.search(text), layout,
+        )
+        return cause.strip() if cause is not None else None
     
     def extract_system_screenshot_enhanced(self, texts_with_boxes):
-        """提取系统截图中的关键信息"""
-        texts = [b["text"] for b in texts_with_boxes]
+        """提取系统截图中的关键信息
+
+        先对全部文本块做一次关键词位置索引，各字段都从索引中查询
+        """
+        index = TextIndex(texts_with_boxes, SCREENSHOT_KEYWORDS)
+        # 有文本框坐标时按版面配对"字段名: 值"，否则按列表位置查找相邻行
+        layout = LayoutIndex(texts_with_boxes)
+        layout = layout if layout.has_geometry else None
         
         # 初始化结果
         result = {
@@ -113,92 +224,44 @@ class ScreenshotOCR:
         }
         
         # 提取保单号 - 匹配完整的P开头编号
-        for text in texts:
-            # 保单号以P开头，包含字母和数字的完整编号
-            policy_match = re.search(r'P[A-Z0-9]{15,}', text)
-            if policy_match:
-                result["policy_number"] = policy_match.group(0)
-                break
+        policy_match = index.first_match(POLICY_PATTERN)
+        if policy_match:
+            result["policy_number"] = policy_match.group(0)
         
-        # 提取报案号
-        for text in texts:
-            # 报案号以R开头
-            claim_match = re.search(r'R[A-Z0-9]+', text)
-            if claim_match:
-                result["claim_number"] = claim_match.group(0)
-                break
+        # 提取报案号 - 报案号以R开头
+        claim_match = index.first_match(CLAIM_PATTERN)
+        if claim_match:
+            result["claim_number"] = claim_match.group(0)
         
         # 提取被保险人
-        for text in texts:
-            if "被保险人" in text:
-                insured_match = re.search(r'被保险人[：:]\s*([^\s]+)', text)
-                if insured_match:
-                    result["insured_person"] = insured_match.group(1).strip()
-                    break
-        
-        # 提取保险标的
-        for text in texts:
-            if "保险标的" in text:
-                subject_match = re.search(r'保险标的[：:]\s*([^\s]+)', text)
-                if subject_match:
-                    subject = subject_match.group(1).strip()
-                    if subject and subject != "未识别":
-                        result["insurance_subject"] = subject
+        for position in index.positions("被保险人"):
+            insured_match = index.match_at(INSURED_PATTERN, position)
+            if insured_match:
+                result["insured_person"] = insured_match.group(1).strip()
                 break
         
-        # 提取保险期间 - 改进日期查找逻辑，支持相邻行搜索
-        start_date = None
-        end_date = None
-        
-        # 搜索起保日期 - 在关键词行及其相邻行中搜索
-        for i, text in enumerate(texts):
-            if "起保日期" in text:
-                # 在当前行中搜索日期
-                start_match = re.search(r'(\d{4}-\d{1,2}-\d{1,2})', text)
-                if start_match:
-                    start_date = start_match.group(1)
-                    break
-                # 如果当前行没有，在相邻行中搜索（扩大搜索范围）
-                for j in range(max(0, i-5), min(len(texts), i+6)):
-                    start_match = re.search(r'(\d{4}-\d{1,2}-\d{1,2})', texts[j])
-                    if start_match:
-                        start_date = start_match.group(1)
-                        break
-                if start_date:
-                    break
+        # 提取保险标的（只看第一个包含关键词的行）
+        subject_positions = index.positions("保险标的")
+        if subject_positions:
+            subject_match = index.match_at(SUBJECT_PATTERN, subject_positions[0])
+            if subject_match:
+                subject = subject_match.group(1).strip()
+                if subject and subject != "未识别":
+                    result["insurance_subject"] = subject
         
-        # 搜索终保日期 - 在关键词行及其相邻行中搜索
-        for i, text in enumerate(texts):
-            if "终保日期" in text:
-                # 在当前行中搜索日期
-                end_match = re.search(r'(\d{4}-\d{1,2}-\d{1,2})', text)
-                if end_match:
-                    end_date = end_match.group(1)
-                    break
-                # 如果当前行没有，在相邻行中搜索（扩大搜索范围）
-                for j in range(max(0, i-5), min(len(texts), i+6)):
-                    end_match = re.search(r'(\d{4}-\d{1,2}-\d{1,2})', texts[j])
-                    if end_match:
-                        end_date = end_match.group(1)
-                        break
-                if end_date:
-                    break
+        # 提取保险期间 - 在关键词行及其相邻行中搜索
+        start_date = self._first_date_near(index, "起保日期", layout)
+        end_date = self._first_date_near(index, "终保日期", layout)
         
         # 如果起保日期和终保日期相同，说明可能找到了同一个日期，需要重新搜索
         if start_date and end_date and start_date == end_date:
-            # 重新搜索，确保找到不同的日期
-            all_dates = []
-            for i, text in enumerate(texts):
-                if "起保日期" in text or "终保日期" in text:
-                    # 在相邻行中搜索所有日期（扩大搜索范围）
-                    for j in range(max(0, i-5), min(len(texts), i+6)):
-                        date_matches = re.findall(r'(\d{4}-\d{1,2}-\d{1,2})', texts[j])
-                        all_dates.extend(date_matches)
-            
-            # 去重并排序
-            unique_dates = list(set(all_dates))
+            # 在两个关键词相邻行中收集所有日期，去重并排序
+            all_dates = set()
+            for position in index.positions("起保日期", "终保日期"):
+                for j, _ in index.in_window(DATE_PATTERN, position, COVERAGE_DATE_WINDOW, COVERAGE_DATE_WINDOW):
+                    all_dates.update(DATE_PATTERN.findall(index.texts[j]))
+            unique_dates = sorted(all_dates)
             if len(unique_dates) >= 2:
-                unique_dates.sort()
                 start_date = unique_dates[0]
                 end_date = unique_dates[1]
             elif len(unique_dates) == 1:
@@ -214,120 +277,51 @@ class ScreenshotOCR:
             result["coverage_period"] = f"未识别 至 {end_date}"
         
         # 提取出险日期
-        incident_date = self.find_date_near(texts, "出险日期", window=15)
+        incident_date = self.find_date_near(index, "出险日期", window=15, layout=layout)
         if incident_date:
             result["incident_date"] = incident_date
             result["report_time"] = incident_date
             result["inspection_time"] = incident_date
         
-        # 提取出险地点 - 改进匹配逻辑
-        for text in texts:
-            if "出险地点" in text or "出险区域" in text or "投保区域" in text:
-                # 优先匹配具体地址
-                location_match = re.search(r'(?:出险地点|出险区域|投保区域)[：:]\s*([^\n]+)', text)
-                if location_match:
-                    location = location_match.group(1).strip()
-                    if location and location != "未识别":
-                        result["incident_location"] = location
-                        break
-                # 如果没有找到，尝试在附近文本中查找地址信息
-                if not result["incident_location"] or result["incident_location"] == "未识别":
-                    for i, t in enumerate(texts):
-                        if "出险地点" in t or "出险区域" in t or "投保区域" in t:
-                            # 在附近几行查找地址
-                            for j in range(max(0, i-2), min(len(texts), i+3)):
-                                if re.search(r'[省市区县乡村组]', texts[j]) and len(texts[j]) > 5:
-                                    result["incident_location"] = texts[j].strip()
-                                    break
-                            if result["incident_location"] != "未识别":
-                                break
+        # 提取出险地点 - 优先匹配关键词后的具体地址，否则在附近几行查找地址信息
+        location, nearby = self._value_or_nearby(
+            index, LOCATION_KEYWORDS, LOCATION_PATTERN, lambda value: value and value != "未识别",
+            lambda text: len(text) > 5 and ADDRESS_PATTERN.search(text), layout,
+        )
+        if location:
+            result["incident_location"] = location.strip() if nearby else location
         
-        # 提取查勘方式 - 改进匹配逻辑，处理OCR识别错误
-        for text in texts:
-            # 直接匹配"现场查勘"文本
-            if "现场查勘" in text:
-                result["inspection_method"] = "现场查勘"
-                break
-            # 处理OCR识别错误：现场查助 -> 现场查勘
-            elif "现场查助" in text:
-                result["inspection_method"] = "现场查勘"
-                break
-            # 处理OCR识别错误：现汤查勘 -> 现场查勘
-            elif "现汤查勘" in text:
-                result["inspection_method"] = "现场查勘"
-                break
-            elif "查勘方式" in text or "处理方式" in text:
-                # 查找查勘方式关键词
-                if "现场" in text:
-                    result["inspection_method"] = "现场查勘"
-                    break
-                elif "电话" in text:
-                    result["inspection_method"] = "电话查勘"
-                    break
-                elif "视频" in text:
-                    result["inspection_method"] = "视频查勘"
-                    break
-                elif "自助" in text:
-                    result["inspection_method"] = "自助查勘"
-                    break
-                else:
-                    # 尝试提取冒号后的内容
-                    method_match = re.search(r'(?:查勘方式|处理方式)[：:]\s*([^\s\n]+)', text)
-                    if method_match:
-                        result["inspection_method"] = method_match.group(1).strip()
-                        break
+        # 提取查勘方式 - 处理OCR识别错误
+        method = self._inspection_method(index)
+        if method:
+            result["inspection_method"] = method
         
-        # 提取估损金额 - 改进匹配逻辑
-        for text in texts:
-            # 查找估损金额相关关键词
-            if "估损金额" in text or "估计赔款" in text or "估损" in text:
-                # 匹配数字金额
-                loss_match = re.search(r'(?:估损金额|估计赔款|估损)[：:]\s*([0-9,]+\.?\d*)', text)
-                if loss_match:
-                    result["estimated_loss"] = loss_match.group(1)
-                    break
-                # 如果没有找到，尝试在附近文本中查找金额
-                if not result["estimated_loss"] or result["estimated_loss"] == "未识别":
-                    for i, t in enumerate(texts):
-                        if "估损金额" in t or "估计赔款" in t or "估损" in t:
-                            # 在附近几行查找金额数字
-                            for j in range(max(0, i-2), min(len(texts), i+3)):
-                                amount_match = re.search(r'([0-9,]+\.?\d*)', texts[j])
-                                if amount_match and float(amount_match.group(1).replace(',', '')) > 0:
-                                    result["estimated_loss"] = amount_match.group(1)
-                                    break
-                            if result["estimated_loss"] != "未识别":
-                                break
+        # 提取估损金额 - 优先匹配关键词后的金额，否则在附近几行查找金额数字
+        loss, nearby = self._value_or_nearby(
+            index, LOSS_KEYWORDS, LOSS_PATTERN, lambda value: True, _has_positive_amount, layout,
+        )
+        if loss is not None:
+            result["estimated_loss"] = AMOUNT_PATTERN.search(loss).group(1) if nearby else loss
         
-        # 提取出险原因 - 改进匹配逻辑
-        for text in texts:
-            # 直接匹配具体病因
-            if "猪肺疫" in text or "猪瘟" in text or "猪丹毒" in text or "羊快疫" in text or "非传染病" in text:
-                result["incident_cause"] = text.strip()
-                break
-            elif "出险原因" in text or "事故原因" in text or "病因" in text:
-                # 优先匹配冒号后的内容
-                cause_match = re.search(r'(?:出险原因|事故原因|病因)[：:]\s*([^\n]+)', text)
-                if cause_match:
-                    cause = cause_match.group(1).strip()
-                    if cause and cause != "未识别":
-                        result["incident_cause"] = cause
-                        break
-                # 如果没有找到，尝试在附近文本中查找原因
-                if not result["incident_cause"] or result["incident_cause"] == "未识别":
-                    for i, t in enumerate(texts):
-                        if "出险原因" in t or "事故原因" in t or "病因" in t:
-                            # 在附近几行查找原因文本
-                            for j in range(max(0, i-2), min(len(texts), i+3)):
-                                if len(texts[j]) > 2 and not re.search(r'[：:]', texts[j]):
-                                    result["incident_cause"] = texts[j].strip()
-                                    break
-                            if result["incident_cause"] != "未识别":
-                                break
+        # 提取出险原因
+        cause = self._incident_cause(index, layout)
+        if cause is not None:
+            result["incident_cause"] = cause
         
         logger.info(f"📌 系统截图提取结果: {result}")
         return result
 
+
+def _has_positive_amount(text):
+    """文本中第一个数字串是否为大于0的金额"""
+    amount_match = AMOUNT_PATTERN.search(text)
+    if not amount_match:
+        return False
+    try:
+        return float(amount_match.group(1).replace(',', '')) > 0
+    except ValueError:
+        return False
+
 # 创建全局实例
 screenshot_ocr = ScreenshotOCR()
 
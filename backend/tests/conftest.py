@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+"""
+单元测试公共配置 - 把 backend/ 加入模块搜索路径（各模块均为平铺的独立模块）
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+图像上下文模块测试 - 只读文件头得到的宽高与完整解码的结果一致
+"""
+
+import cv2
+import numpy as np
+import pytest
+
+from image_context_module import ImageContext, probe_image_size
+
+FIXTURE = "测试/猪耳标/pig1.JPG"
+
+
+def encode(ext, width, height, params=()):
+    img = np.zeros((height, width, 3), dtype=np.uint8)
+    img[::7, ::5] = 255
+    ok, buf = cv2.imencode(ext, img, list(params))
+    assert ok
+    return buf.tobytes()
+
+
+@pytest.mark.parametrize("width,height", [(1, 1), (37, 911), (1080, 1920), (4032, 3024)])
+@pytest.mark.parametrize("ext,params", [
+    (".jpg", ()),
+    (".jpg", (cv2.IMWRITE_JPEG_PROGRESSIVE, 1)),
+    (".png", ()),
+])
+def test_probe_equals_decode(ext, params, width, height):
+    data = encode(ext, width, height, params)
+    decoded = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    assert probe_image_size(data) == (decoded.shape[1], decoded.shape[0]) == (width, height)
+    assert probe_image_size(memoryview(data)) == (width, height)
+
+
+def test_probe_skips_app_segments_and_fill_bytes():
+    data = encode(".jpg", 64, 48)
+    # SOI 之后插入一个 APP1 段和填充字节
+    app1 = b"\xff\xe1" + (2 + 10).to_bytes(2, "big") + b"Exif\x00\x00abcd"
+    assert probe_image_size(data[:2] + b"\xff" + app1 + data[2:]) == (64, 48)
+
+
+def test_probe_fixture(request):
+    path = request.config.rootpath / FIXTURE
+    if not path.exists():
+        pytest.skip("样例图片不存在")
+    data = path.read_bytes()
+    decoded = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    assert probe_image_size(data) == (decoded.shape[1], decoded.shape[0])
+
+
+@pytest.mark.parametrize("data", [b"", b"GIF89a", b"\xff\xd8", b"\xff\xd8\x00\x00\x00\x00", b"\x89PNG\r\n\x1a\n"])
+def test_probe_unknown_or_truncated(data):
+    assert probe_image_size(data) is None
+
+
+def test_probe_truncated_jpeg_header():
+    data = encode(".jpg", 64, 48)
+    sof = data.find(b"\xff\xc0")
+    assert probe_image_size(data[:sof + 6]) is None
+
+
+def test_largest_decoded_does_not_decode():
+    data = encode(".jpg", 4000, 3000)
+    context = ImageContext(image_bytes=data)
+    assert context.largest_decoded() is None
+    level = context.resized(1600)
+    # 工作层取自 1/2 缩小解码（2000 像素）
+    detail = context.largest_decoded()
+    assert max(detail.bgr.shape[:2]) == 2000
+    assert detail.scale == pytest.approx(0.5)
+    assert level.scale == pytest.approx(0.4)
+    assert not context._decoded
+    assert context.largest_decoded() is detail
+    context.bgr
+    assert context.largest_decoded() is context
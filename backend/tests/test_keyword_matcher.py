@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+多关键词匹配模块测试 - Aho–Corasick 自动机与逐个关键词 `in` 判断的结果一致
+"""
+
+import random
+
+import pytest
+
+from keyword_matcher_module import KeywordMatcher, keyword_matcher
+
+
+def naive_matches(keywords, text):
+    """逐个关键词、逐个位置查找的全部命中 (结束位置, 关键词)"""
+    matches = []
+    for keyword in dict.fromkeys(k for k in keywords if k):
+        start = text.find(keyword)
+        while start >= 0:
+            matches.append((start + len(keyword) - 1, keyword))
+            start = text.find(keyword, start + 1)
+    return sorted(matches)
+
+
+def random_text(rng, alphabet, max_len):
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, max_len)))
+
+
+def test_overlapping_keywords():
+    matcher = KeywordMatcher(["he", "she", "his", "hers"], ignore_case=False)
+    assert sorted(matcher.iter_matches("ushers")) == [(3, "he"), (3, "she"), (5, "hers")]
+    assert matcher.find("ahishers") == {"his", "she", "he", "hers"}
+
+
+def test_chinese_keywords():
+    matcher = KeywordMatcher(["银行", "中国银行", "建设银行", "卡号"])
+    assert matcher.find("中国建设银行储蓄卡 卡号") == {"银行", "建设银行", "卡号"}
+    assert matcher.find("中国银行") == {"银行", "中国银行"}
+
+
+def test_ignore_case():
+    assert KeywordMatcher(["ICBC"]).find("icbc 工行") == {"ICBC"}
+    assert KeywordMatcher(["ICBC"], ignore_case=False).find("icbc 工行") == set()
+
+
+def test_empty_and_duplicate_keywords():
+    matcher = KeywordMatcher(["", "ab", "ab"], ignore_case=False)
+    assert matcher.keywords == ["ab"]
+    assert list(matcher.iter_matches("abab")) == [(1, "ab"), (3, "ab")]
+    assert KeywordMatcher([]).find("anything") == set()
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_iter_matches_equals_naive(seed):
+    rng = random.Random(seed)
+    alphabet = "abc中"
+    keywords = [random_text(rng, alphabet, 4) for _ in range(rng.randint(1, 8))]
+    matcher = KeywordMatcher(keywords, ignore_case=False)
+    for _ in range(20):
+        text = random_text(rng, alphabet, 30)
+        assert sorted(matcher.iter_matches(text)) == naive_matches(keywords, text)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_scan_equals_naive(seed):
+    rng = random.Random(seed)
+    alphabet = "ab 中"
+    keywords = [k for k in (random_text(rng, alphabet, 3) for _ in range(6)) if k]
+    matcher = KeywordMatcher(keywords, ignore_case=False)
+    for _ in range(10):
+        texts = [random_text(rng, alphabet, 6) for _ in range(rng.randint(0, 6))]
+        joined = " ".join(texts)
+        hits = matcher.scan([{"text": t} for t in texts])
+        for keyword in keywords:
+            assert hits.found(keyword) == (keyword in joined)
+            assert hits.blocks(keyword) == [i for i, text in enumerate(texts) if keyword in text]
+        pair = keywords[:2]
+        assert hits.blocks(*pair) == [i for i, text in enumerate(texts) if any(k in text for k in pair)]
+
+
+def test_scan_hit_across_blocks_is_found_but_not_in_block():
+    hits = KeywordMatcher(["银行 卡"]).scan(["中国银行", "卡号"])
+    assert hits.found("银行 卡")
+    assert hits.blocks("银行 卡") == []
+
+
+def test_first_found_respects_rule_order():
+    hits = KeywordMatcher(["身份证", "银行"]).scan(["中国银行", "居民身份证"])
+    rules = [("bank", ["银行"]), ("id", ["身份证"])]
+    assert hits.first_found(rules) == "bank"
+    assert hits.first_found(list(reversed(rules))) == "id"
+    assert hits.first_found([("ss", ["截图"])]) is None
+
+
+def test_keyword_matcher_is_cached():
+    assert keyword_matcher(("a", "b")) is keyword_matcher(("a", "b"))
+    assert keyword_matcher(("a", "b")) is not keyword_matcher(("a", "b"), False)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+版面索引模块测试 - 二分查找的行查询与逐对比较所有文本块的结果一致
+"""
+
+import random
+
+import pytest
+
+from layout_module import BELOW_MAX_ROWS, SAME_ROW_RATIO, VIRTUAL_ROW_HEIGHT, LayoutIndex, as_layout
+
+
+def make_block(text, x1, y1, x2, y2):
+    return {
+        "text": text,
+        "bbox": [[x1, y1], [x2, y1], [x2, y2], [x1, y2]],
+        "center_x": (x1 + x2) / 2,
+        "center_y": (y1 + y2) / 2,
+    }
+
+
+def random_blocks(rng, count):
+    blocks = []
+    for i in range(count):
+        x1, y1 = rng.randint(0, 400), rng.randint(0, 400)
+        blocks.append(make_block(f"t{i}", x1, y1, x1 + rng.randint(5, 120), y1 + rng.randint(8, 40)))
+    return blocks
+
+
+def rect(block):
+    xs = [p[0] for p in block["bbox"]]
+    ys = [p[1] for p in block["bbox"]]
+    return min(xs), min(ys), max(xs), max(ys), block["center_x"], block["center_y"]
+
+
+def naive_same_row(blocks, position):
+    x1, y1, x2, y2, cx, cy = rect(blocks[position])
+    row = []
+    for other, block in enumerate(blocks):
+        o = rect(block)
+        if other != position and abs(o[5] - cy) <= SAME_ROW_RATIO * max(y2 - y1, o[3] - o[1]):
+            row.append(other)
+    return sorted(row, key=lambda other: (rect(blocks[other])[4], rect(blocks[other])[5], other))
+
+
+def naive_below(blocks, position, row_height, max_rows=BELOW_MAX_ROWS):
+    x1, y1, x2, y2, cx, cy = rect(blocks[position])
+    height = max(y2 - y1, row_height)
+    result = []
+    for other, block in enumerate(blocks):
+        o = rect(block)
+        if other == position or not cy <= o[5] <= cy + height * max_rows:
+            continue
+        if o[5] - cy <= SAME_ROW_RATIO * max(y2 - y1, o[3] - o[1]):
+            continue
+        if o[0] <= x2 and o[2] >= x1:
+            result.append(other)
+    return sorted(result, key=lambda other: (rect(blocks[other])[5], rect(blocks[other])[4], other))
+
+
+def test_label_value_pairs():
+    blocks = [
+        make_block("姓名", 10, 10, 60, 30),
+        make_block("张三", 80, 12, 140, 32),
+        make_block("住址", 10, 60, 60, 80),
+        make_block("北京市", 10, 90, 120, 110),
+    ]
+    layout = LayoutIndex(blocks)
+    assert layout.has_geometry
+    assert layout.same_row(0) == [1]
+    assert layout.right_of(0) == [1]
+    assert layout.right_of(1) == []
+    assert layout.below(2) == [3]
+    assert layout.value_of(0, lambda i: True) == 1
+    # 右侧不满足条件时取下方
+    assert layout.value_of(2, lambda i: blocks[i]["text"] != "张三") == 3
+    assert layout.value_of(3, lambda i: True) is None
+
+
+@pytest.mark.parametrize("seed", range(25))
+def test_row_queries_equal_naive(seed):
+    rng = random.Random(seed)
+    blocks = random_blocks(rng, rng.randint(1, 40))
+    layout = LayoutIndex(blocks)
+    for position in range(len(blocks)):
+        row = naive_same_row(blocks, position)
+        assert layout.same_row(position) == row
+        cx = rect(blocks[position])[4]
+        assert layout.right_of(position) == [other for other in row if rect(blocks[other])[4] > cx]
+        assert layout.below(position) == naive_below(blocks, position, layout.row_height)
+
+
+def test_without_geometry_blocks_are_rows_in_list_order():
+    layout = LayoutIndex([{"text": "姓名"}, {"text": "张三"}, {"text": "性别"}])
+    assert not layout.has_geometry
+    assert layout.row_height == VIRTUAL_ROW_HEIGHT
+    assert layout.same_row(0) == []
+    assert layout.right_of(0) == []
+    assert layout.below(0) == [1, 2]
+    assert layout.value_of(0, lambda i: True) == 1
+
+
+def test_empty_and_as_layout():
+    layout = LayoutIndex([])
+    assert len(layout) == 0
+    assert not layout.has_geometry
+    assert as_layout(layout) is layout
+    assert isinstance(as_layout([make_block("a", 0, 0, 10, 10)]), LayoutIndex)
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+分辨率规划模块测试 - 重新识别优先从已解码的缩小层裁剪，文字仍过小时才完整解码原图
+"""
+
+import cv2
+import numpy as np
+
+from image_context_module import ImageContext
+from resolution_module import REFINE_MIN_TEXT_HEIGHT, plan_resolution, refine_ocr_result
+
+
+class RecordingEngine:
+    """仅识别调用的替身：记录送入的裁剪图，全部返回高置信度结果"""
+
+    def __init__(self):
+        self.crops = []
+
+    def ocr(self, img, det=True, rec=True, cls=True):
+        crops = img[0]
+        self.crops.extend(crops)
+        return [[("1520329", 0.99)] * len(crops)]
+
+
+def large_jpeg(width=4000, height=3000):
+    img = np.full((height, width, 3), 255, dtype=np.uint8)
+    cv2.putText(img, "1520329", (400, 800), cv2.FONT_HERSHEY_SIMPLEX, 8, (0, 0, 0), 16)
+    ok, buf = cv2.imencode(".jpg", img)
+    assert ok
+    return buf.tobytes()
+
+
+def box(x, y, w, h):
+    return [[x, y], [x + w, y], [x + w, y + h], [x, y + h]]
+
+
+def test_low_confidence_text_is_refined_from_reduced_level():
+    context = ImageContext(image_bytes=large_jpeg())
+    plan = plan_resolution(context, "general")
+    assert plan.scale < 1.0
+    engine = RecordingEngine()
+    result = refine_ocr_result(engine, plan, [[[box(160, 260, 400, 40), ("152O329", 0.6)]]])
+    # 从 1/2 缩小解码层裁剪（是工作图像的 1.25 倍），整图没有完整解码
+    assert not context._decoded
+    assert len(engine.crops) == 1
+    assert engine.crops[0].shape[0] >= 40 * 1.25 - 2
+    text_box, (text, score) = result[0][0]
+    assert (text, score) == ("1520329", 0.99)
+    # 文本框映射回原图坐标
+    assert text_box[0] == [400.0, 650.0]
+
+
+def test_text_still_too_small_falls_back_to_full_decode():
+    context = ImageContext(image_bytes=large_jpeg())
+    plan = plan_resolution(context, "general")
+    engine = RecordingEngine()
+    # 工作图像上高 10 像素，1/2 缩小层上 12.5 像素，仍低于最小高度
+    height = 10
+    assert height * 1.25 < REFINE_MIN_TEXT_HEIGHT
+    refine_ocr_result(engine, plan, [[[box(160, 260, 100, height), ("1520329", 0.95)]]])
+    assert context._decoded
+    assert engine.crops[0].shape[0] >= height / plan.scale - 2
+
+
+def test_unscaled_plan_is_not_refined():
+    img = np.full((400, 600, 3), 255, dtype=np.uint8)
+    plan = plan_resolution(img, "general")
+    engine = RecordingEngine()
+    result = refine_ocr_result(engine, plan, [[[box(10, 10, 100, 8), ("abc", 0.5)]]])
+    assert engine.crops == []
+    assert result[0][0][1] == ("abc", 0.5)
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+识别结果缓存模块测试 - 内存层按字节数的LRU淘汰、磁盘层的内存索引与淘汰顺序
+"""
+
+import json
+import os
+import random
+import time
+from collections import OrderedDict
+
+import pytest
+
+from result_cache_module import ResultCache, compute_fingerprint
+
+
+def entry_size(value):
+    return len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+
+
+def disk_keys(directory):
+    return sorted(name[:-len(".json")] for name in os.listdir(directory) if name.endswith(".json"))
+
+
+class NaiveLRU:
+    """逐条记录字节数、超出上限时删除最久未使用条目的参考实现"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.items = OrderedDict()
+
+    def get(self, key):
+        if key not in self.items:
+            return None
+        self.items.move_to_end(key)
+        return self.items[key][0]
+
+    def put(self, key, value):
+        size = entry_size(value)
+        if size > self.limit:
+            return
+        self.items.pop(key, None)
+        self.items[key] = (value, size)
+        while sum(size for _, size in self.items.values()) > self.limit:
+            self.items.popitem(last=False)
+
+
+def test_roundtrip_and_stats():
+    cache = ResultCache()
+    key = ResultCache.make_key("eartag", "digest", compute_fingerprint({"engine": "eartag"}))
+    assert cache.get(key) is None
+    cache.put(key, {"ear_tag_7digit": "1520329", "score": 0.98})
+    assert cache.get(key) == {"ear_tag_7digit": "1520329", "score": 0.98}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["memory_entries"]) == (1, 1, 1)
+    assert stats["memory_bytes"] == entry_size({"ear_tag_7digit": "1520329", "score": 0.98})
+
+
+def test_fingerprint_is_order_independent_for_dicts():
+    assert compute_fingerprint({"a": 1, "b": 2}) == compute_fingerprint({"b": 2, "a": 1})
+    assert compute_fingerprint({"a": 1}) != compute_fingerprint({"a": 2})
+
+
+def test_unserializable_value_is_skipped():
+    cache = ResultCache()
+    cache.put("k", {"value": object()})
+    assert cache.get("k") is None
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_memory_lru_equals_naive(seed):
+    rng = random.Random(seed)
+    limit = 200
+    cache, naive = ResultCache(max_memory_bytes=limit), NaiveLRU(limit)
+    for _ in range(300):
+        key = f"k{rng.randint(0, 12)}"
+        if rng.random() < 0.5:
+            value = {"text": "猪" * rng.randint(0, 40)}
+            cache.put(key, value)
+            naive.put(key, value)
+        else:
+            assert cache.get(key) == naive.get(key)
+        assert list(cache._memory) == list(naive.items)
+        assert cache.stats()["memory_bytes"] == sum(size for _, size in naive.items.values())
+        assert cache.stats()["memory_bytes"] <= limit
+
+
+def test_disk_layer_survives_restart(tmp_path):
+    cache = ResultCache(disk_dir=str(tmp_path))
+    cache.put("a", [1, 2, 3])
+    restarted = ResultCache(disk_dir=str(tmp_path))
+    assert restarted.stats()["disk_entries"] == 1
+    assert restarted.get("a") == [1, 2, 3]
+    # 从磁盘读回后进入内存层
+    assert restarted.stats()["memory_entries"] == 1
+
+
+def test_disk_eviction_removes_least_recently_used(tmp_path):
+    value = {"text": "x" * 50}
+    size = entry_size(value)
+    cache = ResultCache(max_memory_bytes=0, disk_dir=str(tmp_path), max_disk_bytes=size * 3)
+    for key in ("a", "b", "c"):
+        cache.put(key, value)
+    # 读取 a 使其成为最近使用，下一次写入淘汰 b
+    assert cache.get("a") == value
+    cache.put("d", value)
+    assert disk_keys(tmp_path) == ["a", "c", "d"]
+    assert cache.stats()["disk_bytes"] == size * 3
+    assert cache.stats()["disk_entries"] == 3
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_disk_index_matches_directory(seed, tmp_path):
+    rng = random.Random(seed)
+    cache = ResultCache(max_memory_bytes=0, disk_dir=str(tmp_path), max_disk_bytes=400)
+    for _ in range(100):
+        key = f"k{rng.randint(0, 15)}"
+        if rng.random() < 0.6:
+            cache.put(key, {"text": "y" * rng.randint(0, 80)})
+        else:
+            cache.get(key)
+        files = disk_keys(tmp_path)
+        assert sorted(cache._disk_index) == files
+        assert cache.stats()["disk_bytes"] == sum(os.path.getsize(tmp_path / f"{key}.json") for key in files)
+        assert cache.stats()["disk_bytes"] <= 400
+
+
+def test_restart_scan_orders_by_access_time_and_evicts(tmp_path):
+    value = {"text": "z" * 30}
+    size = entry_size(value)
+    cache = ResultCache(max_memory_bytes=0, disk_dir=str(tmp_path))
+    now = time.time()
+    for offset, key in enumerate(("old", "mid", "new")):
+        cache.put(key, value)
+        os.utime(tmp_path / f"{key}.json", (now + offset, now + offset))
+    restarted = ResultCache(max_memory_bytes=0, disk_dir=str(tmp_path), max_disk_bytes=size * 2)
+    assert disk_keys(tmp_path) == ["mid", "new"]
+    assert list(restarted._disk_index) == ["mid", "new"]
+
+
+def test_externally_deleted_file_leaves_index(tmp_path):
+    cache = ResultCache(max_memory_bytes=0, disk_dir=str(tmp_path))
+    cache.put("a", [1])
+    os.remove(tmp_path / "a.json")
+    assert cache.get("a") is None
+    assert cache.stats()["disk_entries"] == 0
+    assert cache.stats()["disk_bytes"] == 0
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+文本索引模块测试 - 关键词位置索引和正则窗口查询与逐块扫描的结果一致
+"""
+
+import random
+import re
+
+import pytest
+
+from text_index_module import TextIndex, as_text_index, first_between
+
+DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+AMOUNT_PATTERN = re.compile(r"\d+\.\d{2}")
+
+
+def random_texts(rng, count):
+    pieces = ["金额", "日期", "2024-01-02", "12.50", "备注", "abc", "7.00", ""]
+    return ["".join(rng.choice(pieces) for _ in range(rng.randint(0, 3))) for _ in range(count)]
+
+
+def naive_matches(texts, pattern):
+    return [(i, pattern.search(text)) for i, text in enumerate(texts) if pattern.search(text)]
+
+
+def test_positions_prebuilt_and_on_demand():
+    texts = ["交易金额", "12.50", "交易日期", "2024-01-02", "金额合计"]
+    index = TextIndex([{"text": t} for t in texts], keywords=["金额", "日期"])
+    assert len(index) == 5
+    assert index.positions("金额") == [0, 4]
+    assert index.positions("日期") == [2]
+    # 未预建索引的关键词首次查询时补建
+    assert index.positions("合计") == [4]
+    assert index.positions("金额", "日期") == [0, 2, 4]
+    assert index.positions("不存在") == []
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_queries_equal_naive(seed):
+    rng = random.Random(seed)
+    texts = random_texts(rng, rng.randint(0, 25))
+    index = TextIndex(texts, keywords=["金额", "日期"])
+    for keyword in ("金额", "日期", "备注"):
+        assert index.positions(keyword) == [i for i, text in enumerate(texts) if keyword in text]
+
+    for pattern in (DATE_PATTERN, AMOUNT_PATTERN):
+        expected = naive_matches(texts, pattern)
+        found = index.matches(pattern)
+        assert [(i, m.group()) for i, m in found] == [(i, m.group()) for i, m in expected]
+        first = index.first_match(pattern)
+        assert (first.group() if first else None) == (expected[0][1].group() if expected else None)
+        for position in range(-2, len(texts) + 2):
+            match = index.match_at(pattern, position)
+            naive = pattern.search(texts[position]) if 0 <= position < len(texts) else None
+            assert (match.group() if match else None) == (naive.group() if naive else None)
+            before, after = rng.randint(0, 3), rng.randint(0, 3)
+            window = [(i, m) for i, m in expected if position - before <= i <= position + after]
+            assert [i for i, _ in index.in_window(pattern, position, before, after)] == [i for i, _ in window]
+            first_in = index.first_in_window(pattern, position, before, after)
+            assert (first_in[0] if first_in else None) == (window[0][0] if window else None)
+
+
+def test_matches_are_cached_per_pattern():
+    index = TextIndex(["2024-01-02"])
+    assert index.matches(DATE_PATTERN) is index.matches(DATE_PATTERN)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_first_between_equals_naive(seed):
+    rng = random.Random(seed)
+    positions = sorted(rng.sample(range(50), rng.randint(0, 15)))
+    for _ in range(30):
+        low = rng.randint(-5, 55)
+        high = low + rng.randint(-2, 10)
+        expected = next((p for p in positions if low <= p <= high), None)
+        assert first_between(positions, low, high) == expected
+
+
+def test_as_text_index():
+    index = TextIndex(["a"])
+    assert as_text_index(index) is index
+    assert as_text_index(["a", "b"]).texts == ["a", "b"]
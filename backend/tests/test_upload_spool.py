@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""
+上传落盘模块测试 - 流式 multipart 解析（任意分块方式结果一致）、像素预算的先到先得和上传内容的使用期
+"""
+
+import asyncio
+import os
+import random
+import threading
+
+import pytest
+
+from upload_spool_module import (
+    MultipartSpooler,
+    PixelBudget,
+    UploadError,
+    UploadLease,
+    bind_to_upload,
+    current_upload,
+    map_file,
+    open_upload,
+    parse_boundary,
+)
+
+BOUNDARY = b"----orcPigBoundary7MA4YWxkTrZu0gW"
+
+
+def build_body(parts, boundary=BOUNDARY):
+    """parts: [(字段名, 文件名或 None, 内容)]，按 multipart/form-data 格式拼接"""
+    body = b""
+    for name, filename, content in parts:
+        disposition = f'form-data; name="{name}"'
+        if filename is not None:
+            disposition += f'; filename="{filename}"'
+        body += b"--" + boundary + b"\r\n"
+        body += f"Content-Disposition: {disposition}\r\n".encode("utf-8")
+        if filename is not None:
+            body += b"Content-Type: image/jpeg\r\n"
+        body += b"\r\n" + content + b"\r\n"
+    return body + b"--" + boundary + b"--\r\n"
+
+
+def spool(body, spool_dir, chunk_sizes=None, **kwargs):
+    spooler = MultipartSpooler(BOUNDARY, str(spool_dir), **kwargs)
+    if chunk_sizes is None:
+        spooler.feed(body)
+    else:
+        offset = 0
+        for size in chunk_sizes:
+            spooler.feed(body[offset:offset + size])
+            offset += size
+        spooler.feed(body[offset:])
+    spooler.close()
+    return spooler
+
+
+def read_files(spooler):
+    return [(f.name, open(f.path, "rb").read()) for f in spooler.files]
+
+
+def random_parts(rng):
+    parts = []
+    for i in range(rng.randint(0, 4)):
+        # 内容中混入换行、"--" 和分隔符的前缀，检查不会被误判为分隔符
+        content = bytes(rng.randrange(256) for _ in range(rng.randint(0, 300)))
+        content += b"\r\n--" + BOUNDARY[:rng.randint(0, len(BOUNDARY) - 1)] + content[:20]
+        parts.append(("files", f"pig{i}.JPG", content))
+    parts.append(("mode", None, "快速".encode("utf-8")))
+    rng.shuffle(parts)
+    return parts
+
+
+@pytest.mark.parametrize("seed", range(15))
+def test_any_chunking_gives_same_result(seed, tmp_path):
+    rng = random.Random(seed)
+    parts = random_parts(rng)
+    body = build_body(parts)
+    expected = [(filename, content) for name, filename, content in parts if filename is not None]
+
+    whole = spool(body, tmp_path)
+    assert read_files(whole) == expected
+    assert whole.form == {"mode": "快速"}
+
+    for chunk in (1, 7, len(BOUNDARY) + 3):
+        chunked = spool(body, tmp_path, chunk_sizes=[chunk] * (len(body) // chunk))
+        assert read_files(chunked) == expected
+        assert chunked.form == whole.form
+    sizes = [rng.randint(1, 64) for _ in range(len(body) // 16)]
+    assert read_files(spool(body, tmp_path, chunk_sizes=sizes)) == expected
+
+
+def test_preamble_epilogue_and_other_file_fields(tmp_path):
+    body = b"preamble\r\n" + build_body([("files", "a.jpg", b"A"), ("other", "b.jpg", b"B")]) + b"epilogue"
+    spooler = spool(body, tmp_path)
+    assert read_files(spooler) == [("a.jpg", b"A")]
+    # 非文件字段之外的其他文件字段不落盘
+    assert len(os.listdir(tmp_path)) == 1
+
+
+def test_rfc5987_filename(tmp_path):
+    body = (
+        b"--" + BOUNDARY + b"\r\n"
+        b"Content-Disposition: form-data; name=\"files\"; filename=\"x.jpg\"; filename*=utf-8''%E7%8C%AA.jpg\r\n\r\n"
+        b"data\r\n--" + BOUNDARY + b"--\r\n"
+    )
+    assert read_files(spool(body, tmp_path)) == [("猪.jpg", b"data")]
+
+
+def test_limits(tmp_path):
+    body = build_body([("files", f"{i}.jpg", b"x") for i in range(3)])
+    with pytest.raises(UploadError):
+        spool(body, tmp_path, max_files=2)
+    with pytest.raises(UploadError):
+        spool(build_body([("files", "big.jpg", b"x" * 101)]), tmp_path, max_file_bytes=100)
+    assert len(spool(build_body([("files", "ok.jpg", b"x" * 100)]), tmp_path, max_file_bytes=100).files) == 1
+
+
+def test_truncated_and_malformed_bodies(tmp_path):
+    body = build_body([("files", "a.jpg", b"abc")])
+    with pytest.raises(UploadError):
+        spool(body[:-10], tmp_path)
+    spooler = MultipartSpooler(BOUNDARY, str(tmp_path))
+    with pytest.raises(UploadError):
+        spooler.feed(b"--" + BOUNDARY + b"XX")
+
+
+def test_parse_boundary():
+    assert parse_boundary("multipart/form-data; boundary=abc") == b"abc"
+    assert parse_boundary('multipart/form-data; boundary="a b"; charset=utf-8') == b"a b"
+    assert parse_boundary("application/json") is None
+    assert parse_boundary(None) is None
+    assert parse_boundary("multipart/form-data") is None
+
+
+def test_map_and_open_upload(tmp_path):
+    path = tmp_path / "a.jpg"
+    path.write_bytes(b"\xff\xd8data")
+    mapped = map_file(str(path))
+    assert mapped[:] == b"\xff\xd8data"
+    mapped.close()
+    empty = tmp_path / "empty.jpg"
+    empty.write_bytes(b"")
+    assert map_file(str(empty)) == b""
+
+    class InMemory:
+        body = b"bytes"
+
+    assert open_upload(InMemory()) == b"bytes"
+
+
+def run_budget_scenario(limit, requests):
+    """requests: [(名称, 像素数, 持有秒数)] 依次发起预留，返回获得预算的顺序"""
+    async def scenario():
+        budget = PixelBudget(limit)
+        order = []
+
+        async def job(name, pixels, hold):
+            async with budget.reserve(pixels):
+                order.append(name)
+                assert budget.in_use <= limit
+                await asyncio.sleep(hold)
+
+        tasks = []
+        for name, pixels, hold in requests:
+            tasks.append(asyncio.create_task(job(name, pixels, hold)))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        assert budget.in_use == 0
+        return order
+
+    return asyncio.run(scenario())
+
+
+def test_pixel_budget_is_fifo():
+    # big 排队后，后到的 small 即使当前预算够用也不能插队
+    order = run_budget_scenario(10, [("a", 6, 0.02), ("big", 8, 0), ("small", 1, 0)])
+    assert order == ["a", "big", "small"]
+
+
+def test_pixel_budget_oversized_image_runs_alone():
+    order = run_budget_scenario(10, [("a", 4, 0.01), ("huge", 100, 0.01), ("b", 4, 0)])
+    assert order == ["a", "huge", "b"]
+
+
+def test_pixel_budget_cancelled_waiter_releases_queue():
+    async def scenario():
+        budget = PixelBudget(10)
+        order = []
+        release_a = asyncio.Event()
+
+        async def job(name, pixels, gate=None):
+            async with budget.reserve(pixels):
+                order.append(name)
+                if gate is not None:
+                    await gate.wait()
+
+        a = asyncio.create_task(job("a", 6, release_a))
+        await asyncio.sleep(0)
+        big = asyncio.create_task(job("big", 8))
+        await asyncio.sleep(0)
+        small = asyncio.create_task(job("small", 2))
+        await asyncio.sleep(0)
+        assert order == ["a"]
+        # 队首取消后，后面够用的等待者立即获得预算
+        big.cancel()
+        await asyncio.sleep(0)
+        await small
+        assert order == ["a", "small"]
+        release_a.set()
+        await a
+        with pytest.raises(asyncio.CancelledError):
+            await big
+        assert budget.in_use == 0
+        assert not budget._waiters
+
+    asyncio.run(scenario())
+
+
+def test_upload_lease_waits_for_running_calls():
+    class Content:
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    async def scenario():
+        content = Content()
+        lease = UploadLease(content)
+        started, finish = threading.Event(), threading.Event()
+
+        def read():
+            started.set()
+            finish.wait(5)
+            return content.closed
+
+        loop = asyncio.get_running_loop()
+        async with lease:
+            assert current_upload.get() is lease
+            future = loop.run_in_executor(None, bind_to_upload(read))
+            await loop.run_in_executor(None, started.wait)
+            release = asyncio.create_task(lease.release())
+            await asyncio.sleep(0.01)
+            # 调用仍在运行，映射不能关闭
+            assert not content.closed
+            finish.set()
+            assert await future is False
+            await release
+        assert content.closed
+        assert current_upload.get() is None
+        # 释放之后新的调用被拒绝
+        with pytest.raises(UploadError):
+            lease.bind(read)()
+
+    asyncio.run(scenario())
+
+
+def test_bind_to_upload_without_lease_returns_function():
+    def fn():
+        return 1
+
+    assert bind_to_upload(fn) is fn
@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+文本索引模块 - 独立模块
+对一次OCR结果的文本块只遍历一遍（多关键词自动机），建立 关键词 -> 文本块位置 的索引；
+正则匹配结果按（预编译的）模式缓存，"关键词附近第 N 行以内的日期/金额"等查询用二分查找回答，
+字段提取的开销与文本块数量成线性关系
+"""
+
+import bisect
+import logging
+from keyword_matcher_module import keyword_matcher
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+
+class TextIndex:
+    """一组OCR文本块的位置索引"""
+
+    def __init__(self, texts, keywords=()):
+        """texts: 文本列表（或 texts_with_boxes）；keywords: 一次遍历即建立位置索引的关键词"""
+        self.texts = [t["text"] if isinstance(t, dict) else t for t in texts]
+        self._positions = {}
+        self._matches = {}
+        if keywords:
+            # 全部关键词由同一个（按关键词表缓存的）Aho–Corasick 自动机一次匹配
+            hits = keyword_matcher(tuple(keywords), ignore_case=False).scan(self.texts)
+            self._positions = {keyword: hits.blocks(keyword) for keyword in keywords}
+
+    def __len__(self):
+        return len(self.texts)
+
+    def positions(self, *keywords):
+        """包含任一关键词的文本块位置（升序）；未预先建立索引的关键词首次查询时补建"""
+        merged = set()
+        for keyword in keywords:
+            positions = self._positions.get(keyword)
+            if positions is None:
+                positions = self._positions[keyword] = [i for i, text in enumerate(self.texts) if keyword in text]
+            if len(keywords) == 1:
+                return positions
+            merged.update(positions)
+        return sorted(merged)
+
+    def matches(self, pattern):
+        """预编译正则在各文本块上的首个匹配 [(位置, match)]（升序），每个模式只计算一次"""
+        found = self._matches.get(pattern)
+        if found is None:
+            found = []
+            for i, text in enumerate(self.texts):
+                match = pattern.search(text)
+                if match:
+                    found.append((i, match))
+            self._matches[pattern] = found
+        return found
+
+    def first_match(self, pattern):
+        """第一个匹配该模式的文本块的 match，没有时为 None"""
+        found = self.matches(pattern)
+        return found[0][1] if found else None
+
+    def match_at(self, pattern, position):
+        """指定文本块上的匹配（与 matches 共用缓存），没有时为 None"""
+        found = self.matches(pattern)
+        index = bisect.bisect_left(found, position, key=lambda item: item[0])
+        if index < len(found) and found[index][0] == position:
+            return found[index][1]
+        return None
+
+    def first_in_window(self, pattern, position, before, after):
+        """[position-before, position+after] 范围内第一个匹配的 (位置, match)，没有时为 None"""
+        found = self.matches(pattern)
+        index = bisect.bisect_left(found, position - before, key=lambda item: item[0])
+        if index < len(found) and found[index][0] <= position + after:
+            return found[index]
+        return None
+
+    def in_window(self, pattern, position, before, after):
+        """[position-before, position+after] 范围内全部匹配的 [(位置, match)]"""
+        found = self.matches(pattern)
+        start = bisect.bisect_left(found, position - before, key=lambda item: item[0])
+        end = bisect.bisect_right(found, position + after, key=lambda item: item[0])
+        return found[start:end]
+
+
+def first_between(positions, low, high):
+    """升序位置列表中第一个落在 [low, high] 内的位置，没有时为 None"""
+    index = bisect.bisect_left(positions, low)
+    if index < len(positions) and positions[index] <= high:
+        return positions[index]
+    return None
+
+
+def as_text_index(texts, keywords=()):
+    """把文本列表、texts_with_boxes 或 TextIndex 统一为 TextIndex"""
+    if isinstance(texts, TextIndex):
+        return texts
+    return TextIndex(texts, keywords)
@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+"""
+上传落盘模块 - 独立模块
+把 multipart/form-data 请求体边接收边写入临时目录（不在内存中保留整批图片），
+识别时以内存映射方式交给 cv2.imdecode；并按图片头部的宽高估算像素数，
+用全局和单请求的在途像素预算控制同时解码的图片，避免突发的大批量请求耗尽内存
+"""
+
+import asyncio
+import contextvars
+import logging
+import mmap
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, suppress
+from urllib.parse import unquote
+
+# 设置日志
+logger = logging.getLogger(__name__)
+
+# 表单普通字段（非文件）的最大字节数
+MAX_FORM_FIELD_BYTES = 64 * 1024
+
+
+class UploadError(Exception):
+    """上传请求不合法（格式错误、文件过多或过大）"""
+
+
+class SpooledUpload:
+    """已落盘的上传文件，接口与 Sanic 的上传文件对象一致（name/body），另有 path"""
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+
+    @property
+    def body(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+
+def map_file(path):
+    """只读内存映射文件内容（可直接用于 np.frombuffer/hashlib），空文件返回 b"" """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def open_upload(file):
+    """上传文件的内容：已落盘的文件（带 path）内存映射，否则为内存中的字节"""
+    path = getattr(file, "path", None)
+    return map_file(path) if path else file.body
+
+
+def close_upload(content):
+    """释放 open_upload 返回的内存映射"""
+    close = getattr(content, "close", None)
+    if close is not None:
+        try:
+            close()
+        except BufferError:
+            # 仍有数组引用该映射时交给垃圾回收释放
+            pass
+
+
+class UploadLease:
+    """一个上传文件内容的使用期：线程池中读取内容的调用先登记，释放时等这些调用全部结束后才关闭内存映射
+
+    请求被取消时 asyncio 只取消等待，已在线程中运行的调用不会中断，直接关闭映射会让它们读到已释放的内存
+    """
+
+    def __init__(self, content):
+        self.content = content
+        self._users = 0
+        self._released = False
+        self._idle = None          # 释放时仍有调用在运行：(事件循环, 等待其结束的 future)
+        self._cond = threading.Condition()
+        self._token = None
+
+    def bind(self, fn):
+        """包装在线程池中执行的函数：执行期间登记为使用者；内容已释放时不再执行"""
+        def run(*args):
+            with self._cond:
+                if self._released:
+                    raise UploadError("上传内容已释放，调用已取消")
+                self._users += 1
+            try:
+                return fn(*args)
+            finally:
+                with self._cond:
+                    self._users -= 1
+                    idle = self._idle if self._users == 0 else None
+                if idle is not None:
+                    loop, waiter = idle
+                    loop.call_soon_threadsafe(lambda: waiter.done() or waiter.set_result(None))
+        return run
+
+    async def release(self):
+        """不再接受新调用，等已开始的调用结束后关闭内存映射（可重复调用）"""
+        with self._cond:
+            if self._released:
+                return
+            self._released = True
+            if self._users:
+                loop = asyncio.get_event_loop()
+                self._idle = (loop, loop.create_future())
+        if self._idle is None:
+            close_upload(self.content)
+            return
+        waiter = self._idle[1]
+        waiter.add_done_callback(lambda _: close_upload(self.content))
+        # 等待本身被再次取消时，调用结束后仍由回调关闭映射
+        await asyncio.shield(waiter)
+
+    async def __aenter__(self):
+        self._token = current_upload.set(self)
+        return self.content
+
+    async def __aexit__(self, *exc_info):
+        current_upload.reset(self._token)
+        await self.release()
+
+
+# 当前正在识别的文件的 UploadLease（每个文件的识别任务各自设置）
+current_upload = contextvars.ContextVar("current_upload", default=None)
+
+
+def bind_to_upload(fn):
+    """把要提交到线程池的函数登记到当前文件的上传内容，没有时原样返回"""
+    lease = current_upload.get()
+    return fn if lease is None else lease.bind(fn)
+
+
+def _parse_disposition(value):
+    """解析 Content-Disposition 中的参数（name、filename）"""
+    params = {}
+    for match in re.finditer(r';\s*([\w*]+)=("(?:[^"\\]|\\.)*"|[^;]*)', value):
+        key, raw = match.group(1).lower(), match.group(2).strip()
+        if raw.startswith('"'):
+            raw = raw[1:-1].replace('\\"', '"')
+        params[key] = raw
+    if "filename*" in params:
+        # RFC 5987: utf-8''%E4%B8%AD.jpg
+        charset, _, encoded = params["filename*"].partition("''")
+        params["filename"] = unquote(encoded, encoding=charset or "utf-8")
+    return params
+
+
+class MultipartSpooler:
+    """增量解析 multipart/form-data：文件字段写入 spool_dir，普通字段保存在内存"""
+
+    def __init__(self, boundary, spool_dir, file_field="files", max_files=50, max_file_bytes=30 * 1024 * 1024):
+        self.delimiter = b"\r\n--" + boundary
+        self.spool_dir = spool_dir
+        self.file_field = file_field
+        self.max_files = max_files
+        self.max_file_bytes = max_file_bytes
+        self.files = []
+        self.form = {}
+        # 请求体以 "--boundary" 开头，前面补一个换行使第一个分隔符与后续格式一致
+        self._buffer = bytearray(b"\r\n")
+        self._state = "preamble"
+        self._part = None
+
+    def feed(self, chunk):
+        """写入一段请求体"""
+        self._buffer += chunk
+        try:
+            while self._step():
+                pass
+        except UploadError:
+            self._abort_part()
+            raise
+
+    def close(self):
+        """请求体接收完毕，检查是否完整"""
+        if self._state != "done":
+            self._abort_part()
+            raise UploadError("multipart 请求体不完整")
+
+    def _step(self):
+        """尽可能推进一步解析，数据不足时返回 False"""
+        buffer = self._buffer
+        if self._state == "preamble":
+            index = buffer.find(self.delimiter)
+            if index < 0:
+                del buffer[:max(0, len(buffer) - len(self.delimiter))]
+                return False
+            del buffer[:index + len(self.delimiter)]
+            self._state = "boundary"
+            return True
+
+        if self._state == "boundary":
+            # 分隔符之后是 "--"（结束）或 "\r\n"（下一个字段）
+            if len(buffer) < 2:
+                return False
+            if buffer[:2] == b"--":
+                self._state = "done"
+                buffer.clear()
+                return False
+            if buffer[:2] != b"\r\n":
+                raise UploadError("multipart 分隔符格式错误")
+            del buffer[:2]
+            self._state = "headers"
+            return True
+
+        if self._state == "headers":
+            index = buffer.find(b"\r\n\r\n")
+            if index < 0:
+                if len(buffer) > MAX_FORM_FIELD_BYTES:
+                    raise UploadError("multipart 字段头过长")
+                return False
+            self._start_part(bytes(buffer[:index]))
+            del buffer[:index + 4]
+            self._state = "body"
+            return True
+
+        if self._state == "body":
+            index = buffer.find(self.delimiter)
+            if index < 0:
+                # 保留可能是分隔符开头的尾部，其余写出
+                keep = len(self.delimiter) - 1
+                if len(buffer) > keep:
+                    self._write_part(buffer[:len(buffer) - keep])
+                    del buffer[:len(buffer) - keep]
+                return False
+            self._write_part(buffer[:index])
+            del buffer[:index + len(self.delimiter)]
+            self._finish_part()
+            self._state = "boundary"
+            return True
+
+        # done：忽略结束分隔符之后的内容
+        buffer.clear()
+        return False
+
+    def _start_part(self, raw_headers):
+        headers = {}
+        for line in raw_headers.decode("utf-8", errors="replace").split("\r\n"):
+            key, _, value = line.partition(":")
+            headers[key.strip().lower()] = value.strip()
+        params = _parse_disposition(headers.get("content-disposition", ""))
+        name = params.get("name", "")
+        filename = params.get("filename")
+        part = {"name": name, "filename": filename, "size": 0, "file": None, "data": None, "path": None}
+        if filename is not None:
+            if name == self.file_field:
+                if len(self.files) >= self.max_files:
+                    raise UploadError(f"最多上传 {self.max_files} 张图片")
+                fd, path = tempfile.mkstemp(dir=self.spool_dir, suffix=".upload")
+                part["file"] = os.fdopen(fd, "wb")
+                part["path"] = path
+            # 其他文件字段直接丢弃
+        else:
+            part["data"] = bytearray()
+        self._part = part
+
+    def _write_part(self, data):
+        part = self._part
+        if not data or part is None:
+            return
+        part["size"] += len(data)
+        if part["file"] is not None:
+            if part["size"] > self.max_file_bytes:
+                raise UploadError(f"文件 {part['filename']} 超过 {self.max_file_bytes // (1024 * 1024)}MB")
+            part["file"].write(data)
+        elif part["data"] is not None:
+            if part["size"] > MAX_FORM_FIELD_BYTES:
+                raise UploadError(f"表单字段 {part['name']} 过长")
+            part["data"] += data
+
+    def _finish_part(self):
+        part, self._part = self._part, None
+        if part["file"] is not None:
+            part["file"].close()
+            self.files.append(SpooledUpload(part["filename"], part["path"]))
+        elif part["data"] is not None:
+            self.form.setdefault(part["name"], part["data"].decode("utf-8", errors="replace"))
+
+    def _abort_part(self):
+        if self._part is not None and self._part["file"] is not None:
+            self._part["file"].close()
+        self._part = None
+
+
+def parse_boundary(content_type):
+    """从 Content-Type 中取出 multipart 分隔符，不是 multipart/form-data 时返回 None"""
+    if not content_type or not content_type.lower().startswith("multipart/form-data"):
+        return None
+    match = re.search(r'boundary=("?)([^";]+)\1', content_type)
+    return match.group(2).encode("latin-1") if match else None
+
+
+class UploadSpool:
+    """单个请求的上传落盘目录，结束时整体删除"""
+
+    def __init__(self, root=None):
+        if root:
+            os.makedirs(root, exist_ok=True)
+        self.dir = tempfile.mkdtemp(prefix="upload-", dir=root)
+        self.files = []
+        self.form = {}
+
+    async def receive(self, request, file_field="files", max_files=50, max_file_bytes=30 * 1024 * 1024):
+        """从流式请求中边接收边落盘（Sanic 路由需声明 stream=True）"""
+        boundary = parse_boundary(request.headers.get("content-type"))
+        if boundary is None:
+            raise UploadError("请求必须为 multipart/form-data")
+        spooler = MultipartSpooler(boundary, self.dir, file_field, max_files, max_file_bytes)
+        while True:
+            chunk = await request.stream.read()
+            if chunk is None:
+                break
+            spooler.feed(chunk)
+        spooler.close()
+        self.files = spooler.files
+        self.form = spooler.form
+        return self.files
+
+    def cleanup(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+class PixelBudget:
+    """在途像素预算：预留的像素数之和不超过上限，超过时按先来后到排队等待已有图片处理完成
+
+    单张图片超过上限时按上限计（等到预算全部空闲后独占执行），保证不会永久等待；
+    已有等待者时新的预留排在其后（即使当前预算够用），大图不会被后到的小图一直插队
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_use = 0
+        self._waiters = deque()   # (像素数, future)，先到先得
+
+    @asynccontextmanager
+    async def reserve(self, pixels):
+        pixels = max(0, min(int(pixels), self.limit))
+        if self._waiters or self.in_use + pixels > self.limit:
+            waiter = asyncio.get_event_loop().create_future()
+            entry = (pixels, waiter)
+            self._waiters.append(entry)
+            try:
+                await waiter
+            except BaseException:
+                if waiter.done() and not waiter.cancelled():
+                    # 已分到预算但调用方随即被取消：归还
+                    self._release(pixels)
+                else:
+                    with suppress(ValueError):
+                        self._waiters.remove(entry)
+                    # 队首离开后，后面的等待者可能已经够用
+                    self._wake()
+                raise
+        else:
+            self.in_use += pixels
+        try:
+            yield
+        finally:
+            # 同步释放并按顺序唤醒等待者，取消时也不会泄漏预算
+            self._release(pixels)
+
+    def _release(self, pixels):
+        self.in_use -= pixels
+        self._wake()
+
+    def _wake(self):
+        """按排队顺序把预算分给队首的等待者；队首不够时后面的都继续等待"""
+        while self._waiters:
+            pixels, waiter = self._waiters[0]
+            if waiter.done():
+                self._waiters.popleft()
+                continue
+            if self.in_use + pixels > self.limit:
+                break
+            self._waiters.popleft()
+            self.in_use += pixels
+            waiter.set_result(None)
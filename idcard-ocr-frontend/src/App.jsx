@@ -70,6 +70,46 @@ export default function App() {
     setPreviewSrc("");
   };
 
+  // 把识别结果填入表单（已有值的字段只在识别到新值时覆盖）
+  // 后端对未识别的字段返回占位 "未识别"：部分结果中的占位不覆盖已显示的值，
+  // 最终结果只在字段仍为空时填入占位
+  const PLACEHOLDER = "未识别";
+  const applyFormData = (data, final = false) => {
+    const pick = (value, prevValue) => {
+      if (!value) return prevValue;
+      if (value === PLACEHOLDER) return final && !prevValue ? value : prevValue;
+      return value;
+    };
+    const pickList = (value, prevValue) => {
+      const list = (Array.isArray(value) ? value : value ? [value] : []).filter(
+        (item) => item && item !== PLACEHOLDER
+      );
+      return list.length ? list : prevValue;
+    };
+    setForm((prev) => ({
+      ...prev,
+      idNumber: pick(data.idNumber, prev.idNumber),
+      insuredPerson: pick(data.insuredPerson, prev.insuredPerson),
+      bankName: pick(data.bankName, prev.bankName),
+      cardNumber: pick(data.cardNumber, prev.cardNumber),
+      // 系统截图信息
+      policyNumber: pick(data.policyNumber, prev.policyNumber),
+      claimNumber: pick(data.claimNumber, prev.claimNumber),
+      insuredName: pick(data.insuredName, prev.insuredName),
+      insuranceSubject: pickList(data.insuranceSubject, prev.insuranceSubject),
+      coveragePeriod: pick(data.coveragePeriod, prev.coveragePeriod),
+      incidentDate: pick(data.incidentDate, prev.incidentDate),
+      incidentLocation: pick(data.incidentLocation, prev.incidentLocation),
+      reportTime: pick(data.reportTime, prev.reportTime),
+      inspectionTime: pick(data.inspectionTime, prev.inspectionTime),
+      inspectionMethod: pick(data.inspectionMethod, prev.inspectionMethod),
+      estimatedLoss: pick(data.estimatedLoss, prev.estimatedLoss),
+      incidentCause: pick(data.incidentCause, prev.incidentCause),
+      remarks: pick(data.remarks, prev.remarks),
+      phone: pick(data.phone, prev.phone),
+    }));
+  };
+
   // OCR 识别
   const parseImages = async () => {
     if (files.length === 0) return alert("请上传图片");
@@ -84,61 +124,67 @@ export default function App() {
     try {
       console.log("开始发送请求到后端...");
 
-      // 创建一个Promise来处理超时
-      const timeoutPromise = new Promise((_, reject) => {
-        setTimeout(() => reject(new Error("请求超时")), 60000); // 60秒超时
-      });
-
-      const fetchPromise = fetch("http://localhost:8011/parse-docs", {
-        method: "POST",
-        body: formData,
-      });
-
-      const res = await Promise.race([fetchPromise, timeoutPromise]);
-
-      console.log("响应状态:", res.status);
-      console.log("响应头:", res.headers);
-
-      if (!res.ok) {
-        const errorText = await res.text();
-        console.error("响应错误:", errorText);
-        throw new Error(`HTTP ${res.status}: ${res.statusText} - ${errorText}`);
+      // 流式接口：每张图片识别完成即返回一行JSON，60秒内没有新结果视为超时
+      const controller = new AbortController();
+      let idleTimer = setTimeout(() => controller.abort(), 60000);
+      const resetIdleTimer = () => {
+        clearTimeout(idleTimer);
+        idleTimer = setTimeout(() => controller.abort(), 60000);
+      };
+
+      try {
+        const res = await fetch("http://localhost:8011/parse-docs/stream", {
+          method: "POST",
+          body: formData,
+          signal: controller.signal,
+        });
+
+        console.log("响应状态:", res.status);
+        console.log("响应头:", res.headers);
+
+        if (!res.ok) {
+          const errorText = await res.text();
+          console.error("响应错误:", errorText);
+          throw new Error(`HTTP ${res.status}: ${res.statusText} - ${errorText}`);
+        }
+
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder("utf-8");
+        let buffer = "";
+        for (;;) {
+          const { done, value } = await reader.read();
+          if (done) break;
+          resetIdleTimer();
+          buffer += decoder.decode(value, { stream: true });
+          const lines = buffer.split("\n");
+          buffer = lines.pop();
+          for (const line of lines) {
+            if (!line.trim()) continue;
+            const message = JSON.parse(line);
+            if (message.type === "file") {
+              console.log(
+                `识别完成 (${message.completed}/${message.total}):`,
+                message.name,
+                message.doc_type
+              );
+            } else {
+              console.log("OCR 结果:", message.form);
+            }
+            applyFormData(message.form, message.type === "result");
+          }
+        }
+      } catch (err) {
+        if (err.name === "AbortError") throw new Error("请求超时");
+        throw err;
+      } finally {
+        clearTimeout(idleTimer);
       }
 
-      const data = await res.json();
-      console.log("OCR 结果:", data);
       console.log(
         "识别的文件:",
         files.map((f) => f.name)
       );
 
-      setForm((prev) => ({
-        ...prev,
-        idNumber: data.idNumber || prev.idNumber,
-        insuredPerson: data.insuredPerson || prev.insuredPerson,
-        bankName: data.bankName || prev.bankName,
-        cardNumber: data.cardNumber || prev.cardNumber,
-        // 系统截图信息
-        policyNumber: data.policyNumber || prev.policyNumber,
-        claimNumber: data.claimNumber || prev.claimNumber,
-        insuredName: data.insuredName || prev.insuredName,
-        insuranceSubject: Array.isArray(data.insuranceSubject)
-          ? data.insuranceSubject
-          : data.insuranceSubject
-          ? [data.insuranceSubject]
-          : prev.insuranceSubject,
-        coveragePeriod: data.coveragePeriod || prev.coveragePeriod,
-        incidentDate: data.incidentDate || prev.incidentDate,
-        incidentLocation: data.incidentLocation || prev.incidentLocation,
-        reportTime: data.reportTime || prev.reportTime,
-        inspectionTime: data.inspectionTime || prev.inspectionTime,
-        inspectionMethod: data.inspectionMethod || prev.inspectionMethod,
-        estimatedLoss: data.estimatedLoss || prev.estimatedLoss,
-        incidentCause: data.incidentCause || prev.incidentCause,
-        remarks: data.remarks || prev.remarks,
-        phone: data.phone || prev.phone,
-      }));
-
       // 显示成功消息
     } catch (err) {
       console.error("详细错误信息:", err);